@@ -0,0 +1,263 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+import ccxt
+import websockets
+from loguru import logger
+
+OKX_PRIVATE_URL = 'wss://ws.okx.com:8443/ws/v5/private'
+
+OPEN_ORDER_STATES = ('live', 'partially_filled')
+
+
+def login_args(api_key, secret, passphrase, timestamp=None):
+    """OKX WebSocket 登录参数：sign = Base64(HMAC-SHA256(timestamp + 'GET' + '/users/self/verify'))"""
+    timestamp = timestamp or str(int(time.time()))
+    digest = hmac.new(secret.encode(), f'{timestamp}GET/users/self/verify'.encode(), hashlib.sha256).digest()
+    return {'apiKey': api_key, 'passphrase': passphrase, 'timestamp': timestamp,
+            'sign': base64.b64encode(digest).decode()}
+
+
+def okx_snapshot(exchange, inst_type='SWAP'):
+    """返回用 REST 获取 (持仓列表, 挂单列表) 的函数，数据为 OKX 原始格式，与私有频道推送一致"""
+    def fetch():
+        positions = exchange.private_get_account_positions({'instType': inst_type})['data']
+        orders = exchange.private_get_trade_orders_pending({'instType': inst_type})['data']
+        return positions, orders
+    return fetch
+
+
+class AccountCache:
+    """账户级持仓和挂单缓存
+
+    启动时用一次 REST 快照初始化，之后由 OKX 私有 positions/orders 频道推送更新；
+    每 reconcile_interval 秒以及每次重连后用 REST 快照对账。策略读取时不发起网络请求。
+    """
+
+    def __init__(self, api_key, secret, passphrase, fetch_snapshot=None, private_url=OKX_PRIVATE_URL,
+                 inst_type='SWAP', reconcile_interval=300, reconnect_delay=1, max_reconnect_delay=30,
+                 ping_interval=25):
+        self.api_key = api_key
+        self.secret = secret
+        self.passphrase = passphrase
+        if fetch_snapshot is None:
+            rest = ccxt.okx({'apiKey': api_key, 'secret': secret, 'password': passphrase})
+            fetch_snapshot = okx_snapshot(rest, inst_type)
+        self.fetch_snapshot = fetch_snapshot
+        self.private_url = private_url
+        self.inst_type = inst_type
+        self.reconcile_interval = reconcile_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ping_interval = ping_interval
+        self.mismatches = 0  # 对账时发现与推送状态不一致的次数
+        self._positions = {}  # (instId, posSide) -> 原始持仓数据
+        self._orders = {}  # ordId -> 原始挂单数据
+        self._order_listeners = []  # 订单推送回调（在推送线程中调用）
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        """获取初始快照并启动后台推送线程"""
+        self.reconcile()
+        self._thread = threading.Thread(target=self._run_thread, name='okx-account', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止推送"""
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def position_sides(self, inst_id):
+        """返回 (多头, 空头)，有持仓时为 'long'/'short'，否则为 None"""
+        long_pos = short_pos = None
+        with self._lock:
+            for (pos_inst, pos_side), item in self._positions.items():
+                if pos_inst != inst_id:
+                    continue
+                contracts = float(item.get('pos') or 0)
+                side = pos_side if pos_side != 'net' else ('long' if contracts > 0 else 'short')
+                if contracts == 0:
+                    continue
+                if side == 'long':
+                    long_pos = 'long'
+                else:
+                    short_pos = 'short'
+        return long_pos, short_pos
+
+    def position(self, inst_id):
+        """当前持仓方向（'long', 'short', None）"""
+        long_pos, short_pos = self.position_sides(inst_id)
+        return long_pos or short_pos
+
+    def entry_price(self, inst_id, side='long'):
+        """持仓均价，无持仓时返回 None"""
+        with self._lock:
+            for (pos_inst, pos_side), item in self._positions.items():
+                if pos_inst == inst_id and pos_side in (side, 'net') and float(item.get('pos') or 0):
+                    return float(item['avgPx']) if item.get('avgPx') else None
+        return None
+
+    def add_order_listener(self, callback):
+        """注册订单推送回调，callback(原始订单数据)"""
+        self._order_listeners.append(callback)
+
+    def open_orders(self, inst_id=None):
+        """未完成的挂单（OKX 原始格式）"""
+        with self._lock:
+            return [item for item in self._orders.values()
+                    if self._order_open(item) and (inst_id is None or item['instId'] == inst_id)]
+
+    def reconcile(self):
+        """用 REST 快照对账：保留更新时间更晚的记录，删除快照中已不存在的旧记录"""
+        requested = int(time.time() * 1000)
+        positions, orders = self.fetch_snapshot()
+        snapshot_positions = {(item['instId'], item.get('posSide', 'net')): item for item in positions}
+        snapshot_orders = {item['ordId']: item for item in orders}
+        with self._lock:
+            self._positions = self._merge(self._positions, snapshot_positions, requested,
+                                          self._position_state, self._position_open)
+            self._orders = self._merge(self._orders, snapshot_orders, requested, self._order_state, self._order_open)
+        logger.info(f"Account snapshot: {len(snapshot_positions)} positions, {len(snapshot_orders)} open orders")
+
+    def _merge(self, current, snapshot, requested, state, is_open):
+        merged = {}
+        for key, item in snapshot.items():
+            cached = current.get(key)
+            if cached is not None and int(cached.get('uTime') or 0) > int(item.get('uTime') or 0):
+                item = cached  # 请求期间推送了更新
+            elif cached is not None and state(cached) != state(item):
+                self.mismatches += 1
+                logger.warning(f"Account cache out of sync for {key}: {state(cached)} -> {state(item)}")
+            merged[key] = item
+        for key, cached in current.items():
+            if key in snapshot:
+                continue
+            if int(cached.get('uTime') or 0) > requested:
+                merged[key] = cached
+            elif is_open(cached):
+                self.mismatches += 1
+                logger.warning(f"Account cache out of sync for {key}: {state(cached)} -> gone")
+        return merged
+
+    @staticmethod
+    def _position_state(item):
+        return item.get('pos')
+
+    @staticmethod
+    def _order_state(item):
+        return item.get('state'), item.get('accFillSz')
+
+    @staticmethod
+    def _position_open(item):
+        return float(item.get('pos') or 0) != 0
+
+    @staticmethod
+    def _order_open(item):
+        return item.get('state') in OPEN_ORDER_STATES
+
+    def _on_position(self, item):
+        # 平仓后保留 pos 为 0 的记录，避免对账时被更早的快照覆盖
+        self._apply(self._positions, (item['instId'], item.get('posSide', 'net')), item)
+
+    def _on_order(self, item):
+        # 已成交/已撤销的订单同样保留到下一次对账
+        self._apply(self._orders, item['ordId'], item)
+        for callback in self._order_listeners:
+            callback(item)
+
+    def _apply(self, records, key, item):
+        with self._lock:
+            cached = records.get(key)
+            if cached is None or int(cached.get('uTime') or 0) <= int(item.get('uTime') or 0):
+                records[key] = item
+
+    def _run_thread(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self.run())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # gather 在第一个子任务取消时就返回，等其余任务（如正在关闭的连接）结束后再关闭事件循环
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    async def run(self):
+        """维护私有频道连接，并定期对账"""
+        await asyncio.gather(self._stream(), self._reconcile_periodically())
+
+    async def _reconcile_periodically(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            await self._reconcile_async()
+
+    async def _reconcile_async(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.reconcile)
+        except Exception as e:
+            logger.error(f"Account reconciliation failed: {e}")
+
+    async def _stream(self):
+        delay = self.reconnect_delay
+        connected_before = False
+        handlers = {'positions': self._on_position, 'orders': self._on_order}
+        while True:
+            try:
+                async with websockets.connect(self.private_url, ping_interval=None) as ws:
+                    await self._login(ws)
+                    args = [{'channel': channel, 'instType': self.inst_type} for channel in handlers]
+                    await ws.send(json.dumps({'op': 'subscribe', 'args': args}))
+                    logger.info(f"Subscribed to private positions/orders channels ({self.inst_type})")
+                    if connected_before:
+                        # 断线期间可能错过推送，重连后立即对账
+                        await self._reconcile_async()
+                    connected_before = True
+                    delay = self.reconnect_delay
+                    await self._receive(ws, handlers)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Private WebSocket disconnected: {e}, reconnecting in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _login(self, ws):
+        await ws.send(json.dumps({'op': 'login', 'args': [login_args(self.api_key, self.secret, self.passphrase)]}))
+        message = json.loads(await asyncio.wait_for(ws.recv(), timeout=10))
+        if message.get('event') != 'login' or message.get('code') not in (None, '0'):
+            raise ConnectionError(f"Login failed: {message.get('msg')}")
+
+    async def _receive(self, ws, handlers):
+        while True:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=self.ping_interval)
+            except asyncio.TimeoutError:
+                # OKX 要求 30 秒内无消息时发送 ping 保活
+                await ws.send('ping')
+                continue
+            if raw == 'pong':
+                continue
+            message = json.loads(raw)
+            if message.get('event') == 'error':
+                raise ConnectionError(f"Subscribe failed: {message.get('msg')}")
+            handler = handlers.get(message.get('arg', {}).get('channel'))
+            if handler is None:
+                continue
+            for item in message.get('data', []):
+                handler(item)
@@ -7,6 +7,9 @@ import psutil  # 用于查找和终止子进程
 import requests  # 用于发送飞书消息
 import json
 import toml  # 用于加载 TOML 配置文件
+from control import send_command  # 策略进程的控制通道
+from log_tailer import LogHub  # 共享的日志跟踪
+import metrics  # Prometheus 文本格式
 
 app = Flask(__name__)
 
@@ -20,6 +23,9 @@ FEISHU_WEBHOOK_URL = feishu_config['webhook_url']
 # 全局变量，用于存储交易程序的进程
 trading_process = None
 
+# 各日志文件的共享跟踪线程，/stream_logs 的客户端都订阅这里
+log_hub = LogHub({'strategy': 'strategy.log', 'new_client': 'strategy_new_client.log'})
+
 def send_feishu_message(message):
     """发送飞书消息"""
     headers = {"Content-Type": "application/json"}
@@ -40,48 +46,116 @@ def send_feishu_message(message):
 def index():
     return render_template('index.html')
 
+def send_control(command):
+    """通过控制通道向所有运行中的策略发送命令，返回 (是否全部确认, 各策略的确认)"""
+    acks = send_command(command)
+    return bool(acks) and all(ack['ok'] for ack in acks), acks
+
+def describe_acks(acks):
+    if not acks:
+        return '没有运行中的策略'
+    return '\n'.join(f"{ack['strategy']}: {ack.get('state') if ack['ok'] else ack.get('error')}" for ack in acks)
+
 @app.route('/start', methods=['POST'])
 def start_trading():
     try:
-        # 写入开始信号到文件
-        with open('control_signal.txt', 'w') as f:
-            f.write('start')
-        
+        # 发送开始命令并等待各策略确认
+        ok, acks = send_control('start')
+
         # 发送飞书消息
         start_time = time.strftime("%Y-%m-%d %H:%M:%S")
-        message = f"交易策略已启动\n时间: {start_time}\n状态: 成功写入开始信号"
+        message = f"交易策略已启动\n时间: {start_time}\n状态:\n{describe_acks(acks)}"
         send_feishu_message(message)
 
-        return jsonify({'status': 'success', 'message': 'Trading strategy start signal sent'})
+        return jsonify({'status': 'success' if ok else 'error', 'message': 'Trading strategy start command sent',
+                        'acks': acks})
     except Exception as e:
         # 发送飞书消息（异常情况）
         start_time = time.strftime("%Y-%m-%d %H:%M:%S")
         message = f"交易策略启动失败\n时间: {start_time}\n错误: {str(e)}"
         send_feishu_message(message)
 
-        return jsonify({'status': 'error', 'message': f'Failed to send start signal: {str(e)}'})
+        return jsonify({'status': 'error', 'message': f'Failed to send start command: {str(e)}'})
 
 
 @app.route('/stop', methods=['POST'])
 def stop_trading():
     try:
-        # 写入停止信号到文件
-        with open('control_signal.txt', 'w') as f:
-            f.write('stop')
-        
+        # 发送停止命令并等待各策略确认
+        ok, acks = send_control('stop')
+
         # 发送飞书消息
         stop_time = time.strftime("%Y-%m-%d %H:%M:%S")
-        message = f"交易策略已停止\n时间: {stop_time}\n状态: 成功写入停止信号"
+        message = f"交易策略已停止\n时间: {stop_time}\n状态:\n{describe_acks(acks)}"
         send_feishu_message(message)
 
-        return jsonify({'status': 'success', 'message': 'Trading strategy stop signal sent'})
+        return jsonify({'status': 'success' if ok else 'error', 'message': 'Trading strategy stop command sent',
+                        'acks': acks})
     except Exception as e:
         # 发送飞书消息（异常情况）
         stop_time = time.strftime("%Y-%m-%d %H:%M:%S")
         message = f"交易策略停止失败\n时间: {stop_time}\n错误: {str(e)}"
         send_feishu_message(message)
 
-        return jsonify({'status': 'error', 'message': f'Failed to send stop signal: {str(e)}'})
+        return jsonify({'status': 'error', 'message': f'Failed to send stop command: {str(e)}'})
+
+@app.route('/flatten', methods=['POST'])
+def flatten_positions():
+    try:
+        # 停止开仓并平掉全部持仓，各策略平仓完成后才返回
+        ok, acks = send_control('flatten')
+
+        # 发送飞书消息
+        flatten_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        message = f"交易策略已平仓并停止\n时间: {flatten_time}\n状态:\n{describe_acks(acks)}"
+        send_feishu_message(message)
+
+        return jsonify({'status': 'success' if ok else 'error', 'message': 'Flatten command sent', 'acks': acks})
+    except Exception as e:
+        flatten_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        message = f"交易策略平仓失败\n时间: {flatten_time}\n错误: {str(e)}"
+        send_feishu_message(message)
+
+        return jsonify({'status': 'error', 'message': f'Failed to send flatten command: {str(e)}'})
+
+@app.route('/status')
+def strategy_status():
+    """各运行中策略的状态"""
+    return jsonify({'acks': send_command('status')})
+
+@app.route('/metrics')
+def strategy_metrics():
+    """Prometheus 指标：通过控制通道收集各策略进程的指标，按 strategy 标签区分"""
+    acks = send_command('metrics', timeout=5)
+    up = metrics.Gauge('strategy_up', 'Whether the strategy process answered the metrics request', ('strategy',))
+    for ack in acks:
+        up.set(1 if ack['ok'] else 0, ack['strategy'])
+    snapshots = [({}, {up.name: up.snapshot()})]
+    snapshots += [({'strategy': ack['strategy']}, ack['result']) for ack in acks if ack['ok']]
+    return Response(metrics.render(snapshots), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces')
+def strategy_traces():
+    """各策略最近几轮的分阶段耗时；min_ms 只看慢于该值的轮次，strategy 只看指定策略"""
+    names = request.args.get('strategy')
+    acks = send_command('traces', timeout=5, names=names.split(',') if names else None,
+                        limit=request.args.get('limit', 50, type=int),
+                        min_duration=request.args.get('min_ms', 0, type=float) / 1000)
+    return jsonify({ack['strategy']: ack['result'] if ack['ok'] else {'error': ack.get('error')} for ack in acks})
+
+@app.route('/profile', methods=['POST'])
+def profile_strategies():
+    """对运行中的策略采样 seconds 秒，返回折叠栈文件（flamegraph.pl / speedscope 可直接读取）"""
+    seconds = min(request.args.get('seconds', 10, type=float), 300)
+    names = request.args.get('strategy')
+    acks = send_command('profile', timeout=seconds + 10, names=names.split(',') if names else None,
+                        seconds=seconds, interval=request.args.get('interval', 0.01, type=float))
+    failed = [ack for ack in acks if not ack['ok']]
+    if not acks or len(failed) == len(acks):
+        return jsonify({'status': 'error', 'message': describe_acks(acks)}), 503
+    filename = time.strftime('profile-%Y%m%d-%H%M%S.folded')
+    return Response(''.join(ack['result'] for ack in acks if ack['ok']), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 @app.route('/test', methods=['POST'])
 def test():
@@ -99,24 +173,26 @@ def serve_static(filename):
 
 @app.route('/stream_logs')
 def stream_logs():
+    """SSE 日志推送：所有客户端共享每个日志文件的一个跟踪线程
+
+    参数：source=strategy,new_client 选择日志文件，level=WARNING 最低级别，backlog=100 先发送最近的若干行。
+    strategy= 匹配消息开头的 [策略名]（ma25 为 ma60.py，ma60 为 ma60_new.py 及托管进程中的同名策略）、
+    日志来源名或 loguru 模块名（如 new_client）。
+    """
+    sources = request.args.get('source')
+    subscription = log_hub.subscribe(sources.split(',') if sources else None, request.args.get('level'),
+                                     request.args.get('strategy'), request.args.get('backlog', 0, type=int))
+
     def generate():
         try:
-            with open('strategy.log', 'r') as f:
-                f.seek(0, 2)  # 移动到文件末尾
-                while True:
-                    line = f.readline()
-                    if not line:
-                        try:
-                            time.sleep(0.1)  # 等待新日志
-                        except (SystemExit, KeyboardInterrupt):
-                            print("Log streaming interrupted. Exiting gracefully.")
-                            break
-                        continue
+            while True:
+                lines = subscription.get(timeout=15)
+                if not lines:
+                    yield ": keepalive\n\n"  # 保持连接，同时及时发现客户端已断开
+                for line in lines:
                     yield f"data: {line}\n\n"
-        except FileNotFoundError:
-            yield "data: Log file not found.\n\n"
-        except Exception as e:
-            yield f"data: Error reading log file: {str(e)}\n\n"
+        finally:
+            log_hub.unsubscribe(subscription)
     return Response(generate(), mimetype='text/event-stream')
 
 @app.route('/run_ma60', methods=['POST'])
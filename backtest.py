@@ -0,0 +1,241 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from bar_store import BarStore
+from ema_store import EMA_LENGTHS, OHLCV_COLUMNS
+from signals import LOOKBACK, rolling_max
+
+FEE_RATE = 0.0005  # 单边手续费率（OKX 永续吃单）
+
+
+def load_ohlcv(path, symbol=None, interval='5m'):
+    """读取本地K线文件（csv 或 parquet），列为 timestamp, open, high, low, close, volume
+
+    指定 symbol 时 path 为 BarStore 目录。
+    """
+    if symbol is not None:
+        return pd.DataFrame(BarStore(path).load(symbol, interval), columns=OHLCV_COLUMNS)
+    if str(path).endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+    return df[OHLCV_COLUMNS].sort_values('timestamp').drop_duplicates('timestamp').reset_index(drop=True)
+
+
+def sma(close, window):
+    """与 ta.sma 一致的简单均线"""
+    return pd.Series(close).rolling(window).mean().to_numpy()
+
+
+def ema(close, length):
+    """与 ta.ema 一致的指数均线：前 length 根的 SMA 作为初值，之后 adjust=False 递推"""
+    seeded = pd.Series(close, dtype=float)
+    if len(seeded) >= length:
+        seeded.iloc[length - 1] = seeded.iloc[:length].mean()
+    seeded.iloc[:length - 1] = np.nan
+    return seeded.ewm(span=length, adjust=False).mean().to_numpy()
+
+
+def cached(cache, key, compute):
+    """参数扫描时复用指标数组：cache 为 None 时直接计算"""
+    if cache is None:
+        return compute()
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def _window_count(mask, window):
+    """count[j] = mask[j-window+1 .. j] 中 True 的数量（前 window-1 根为部分窗口）"""
+    total = np.cumsum(mask, dtype=np.int64)
+    count = total.copy()
+    count[window:] -= total[:-window]
+    return count
+
+
+def _lagged(values, fill):
+    """整体后移一根"""
+    return np.concatenate(([fill], values[:-1]))
+
+
+def ma_cross_signals(low, high, close, ma):
+    """MA25/MA60 穿越信号：第 i 根收盘后 1 为开多，-1 为开空，0 为无信号（多单优先）"""
+    prev_low, prev_high, prev_ma = _lagged(low, np.nan), _lagged(high, np.nan), _lagged(ma, np.nan)
+    long_ = (low >= ma) & (close > ma) & (prev_low <= prev_ma)
+    short = (close < ma) & (high < ma) & (prev_high >= prev_ma)
+    return np.where(long_, 1, np.where(short, -1, 0))
+
+
+def scanner_signals(open_, high, low, close, emas):
+    """new_client 两套开仓条件：第 i 根收盘后 1 为原策略，2 为新策略，0 为无信号"""
+    e5, e10, e24, e50, e150 = (emas[length] for length in EMA_LENGTHS)
+    n = len(close)
+    index = np.arange(n)
+    others = np.maximum.reduce([e5, e10, e24, e50])
+    lowest = np.minimum.reduce([e5, e10, e24, e50])
+
+    # 原策略：条件1、2 在第 i 根，条件3 检查第 i-51 到 i-1 根
+    above = e150 > others
+    history_above = _lagged(_window_count(above, LOOKBACK - 2), 0) == LOOKBACK - 2
+    original = above & (high < e150) & (open_ < lowest) & (close > others) & history_above
+    original &= index >= LOOKBACK - 2
+
+    # 新策略：多头排列 + 53根内唯一的新高形态 + 53根内出现过最低价低于EMA150
+    highs = np.full(n, np.nan)
+    if n >= LOOKBACK:
+        highs[LOOKBACK - 1:] = rolling_max(close, LOOKBACK)
+    pattern = (open_ < e5) & (close == highs)
+    unique = pattern & (_lagged(_window_count(pattern, LOOKBACK - 1), 0) == 0)
+    below = _window_count(low < e150, LOOKBACK) > 0
+    new = (e5 > e10) & (e10 > e24) & (e24 > e150) & unique & below
+    new &= index >= 2 * (LOOKBACK - 1) + 1
+
+    return np.where(original, 1, np.where(new, 2, 0))
+
+
+def _find_exit(high, low, close, start, direction, take_profit, stop_loss, close_exit):
+    """从 start 根开始找第一次触发止盈/止损的K线，返回 (K线序号, 成交价, 原因)"""
+    n = len(close)
+    block = 64
+    while start < n:
+        end = min(n, start + block)
+        h, l, c = high[start:end], low[start:end], close[start:end]
+        if direction > 0:
+            stop_hit = l <= stop_loss
+            take_hit = h >= take_profit
+        else:
+            stop_hit = h >= stop_loss
+            take_hit = l <= take_profit
+        close_hit = np.zeros(len(c), dtype=bool)
+        if close_exit is not None:
+            trigger, line = close_exit
+            close_hit = (c > trigger) & (c < line[start:end])
+        hits = np.flatnonzero(stop_hit | take_hit | close_hit)
+        if len(hits):
+            k = hits[0]
+            # 同一根K线同时触及时按止损处理（保守）
+            if stop_hit[k]:
+                return start + k, stop_loss, 'stop_loss'
+            if take_hit[k]:
+                return start + k, take_profit, 'take_profit'
+            return start + k, c[k], 'take_profit_close'
+        start = end
+        block *= 4
+    return n - 1, close[-1], 'open'
+
+
+def run_trades(df, signals, levels, fee=FEE_RATE):
+    """按信号逐笔模拟：信号K线的下一根开盘价入场，持仓期间不再开仓
+
+    levels(i, direction, entry) 返回 (止盈价, 止损价, 收盘价止盈条件或 None)。
+    """
+    open_, high, low, close = (df[col].to_numpy(dtype=float) for col in ('open', 'high', 'low', 'close'))
+    timestamps = df['timestamp'].to_numpy()
+    trades = []
+    free_from = 0
+    for i in np.flatnonzero(signals):
+        entry_bar = i + 1
+        if i < free_from or entry_bar >= len(close):
+            continue
+        direction = 1 if signals[i] > 0 else -1
+        entry = open_[entry_bar]
+        take_profit, stop_loss, close_exit = levels(i, signals[i], entry)
+        exit_bar, exit_price, reason = _find_exit(high, low, close, entry_bar, direction,
+                                                  take_profit, stop_loss, close_exit)
+        pnl = direction * (exit_price - entry) - fee * (entry + exit_price)
+        trades.append((timestamps[entry_bar], timestamps[exit_bar], int(signals[i]), entry, exit_price,
+                       reason, pnl, pnl / entry))
+        free_from = exit_bar
+    return pd.DataFrame(trades, columns=['entry_time', 'exit_time', 'signal', 'entry', 'exit',
+                                         'reason', 'pnl', 'return'])
+
+
+def backtest_ma25(df, window=25, take_profit_points=2000, stop_window=144, fee=FEE_RATE, cache=None):
+    """ma60.py：MA25 穿越，止盈为固定点数，止损为过去144根K线的最低/最高价"""
+    low, high, close = (df[col].to_numpy(dtype=float) for col in ('low', 'high', 'close'))
+    open_ = df['open'].to_numpy(dtype=float)
+    signals = cached(cache, ('ma_cross', window),
+                     lambda: ma_cross_signals(low, high, close, sma(close, window)))
+    # 入场时最后一根K线刚开盘，止损窗口为信号K线及之前 stop_window-1 根加上入场K线的开盘价
+    lowest = cached(cache, ('lowest', stop_window),
+                    lambda: pd.Series(low).rolling(stop_window - 1).min().to_numpy())
+    highest = cached(cache, ('highest', stop_window),
+                     lambda: pd.Series(high).rolling(stop_window - 1).max().to_numpy())
+
+    def levels(i, signal, entry):
+        if signal > 0:
+            return entry + take_profit_points, min(lowest[i], open_[i + 1]), None
+        return entry - take_profit_points, max(highest[i], open_[i + 1]), None
+    return run_trades(df, signals, levels, fee)
+
+
+def backtest_ma60(df, window=60, take_profit_points=750, stop_loss_points=3000, fee=FEE_RATE, cache=None):
+    """ma60_new.py：MA60 穿越，止盈止损均为固定点数"""
+    low, high, close = (df[col].to_numpy(dtype=float) for col in ('low', 'high', 'close'))
+    signals = cached(cache, ('ma_cross', window),
+                     lambda: ma_cross_signals(low, high, close, sma(close, window)))
+
+    def levels(i, signal, entry):
+        if signal > 0:
+            return entry + take_profit_points, entry - stop_loss_points, None
+        return entry - take_profit_points, entry + stop_loss_points, None
+    return run_trades(df, signals, levels, fee)
+
+
+def backtest_scanner(df, original_tp=0.04, original_sl=0.02, new_tp=0.20, new_sl=0.05, fee=FEE_RATE, cache=None):
+    """new_client.py：原策略 4%止盈/2%止损；新策略 5%止损，涨幅超20%且收盘跌破EMA5时止盈"""
+    open_, high, low, close = (df[col].to_numpy(dtype=float) for col in ('open', 'high', 'low', 'close'))
+    emas = cached(cache, ('emas',), lambda: {length: ema(close, length) for length in EMA_LENGTHS})
+    signals = cached(cache, ('scanner',), lambda: scanner_signals(open_, high, low, close, emas))
+
+    def levels(i, signal, entry):
+        if signal == 1:
+            return entry * (1 + original_tp), entry * (1 - original_sl), None
+        return np.inf, entry * (1 - new_sl), (entry * (1 + new_tp), emas[5])
+    return run_trades(df, signals, levels, fee)
+
+
+STRATEGIES = {
+    'ma25': backtest_ma25,
+    'ma60': backtest_ma60,
+    'scanner': backtest_scanner,
+}
+
+
+def summarize(trades):
+    """汇总收益、成交次数和最大回撤"""
+    equity = trades['pnl'].cumsum()
+    drawdown = (equity.cummax().clip(lower=0) - equity).max() if len(trades) else 0.0
+    return {
+        'trades': len(trades),
+        'fills': 2 * len(trades) - int((trades['reason'] == 'open').sum()),
+        'win_rate': float((trades['pnl'] > 0).mean()) if len(trades) else 0.0,
+        'pnl': float(trades['pnl'].sum()),
+        'return': float(trades['return'].sum()),
+        'max_drawdown': float(drawdown),
+        'exits': trades['reason'].value_counts().to_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回测 ma60.py / ma60_new.py / new_client.py 的开仓规则')
+    parser.add_argument('path', help='5m K线文件（csv 或 parquet），指定 --symbol 时为 BarStore 目录')
+    parser.add_argument('--symbol', help='从 BarStore 读取的币种，例如 BTC/USDT:USDT')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='ma25')
+    parser.add_argument('--fee', type=float, default=FEE_RATE)
+    args = parser.parse_args()
+
+    df = load_ohlcv(args.path, args.symbol)
+    started = time.perf_counter()
+    trades = STRATEGIES[args.strategy](df, fee=args.fee)
+    elapsed = time.perf_counter() - started
+    print(f"{args.strategy}: {len(df)} bars in {elapsed:.3f}s")
+    for key, value in summarize(trades).items():
+        print(f"{key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class BarBuffer:
+    """固定容量的环形K线缓冲区
+
+    每个值同时写在 i 和 i + capacity 两个位置，因此最近 capacity 根K线
+    始终是一段连续内存，读取返回零拷贝视图；追加和更新最后一根都是 O(1)。
+    """
+
+    def __init__(self, fields=OHLCV_FIELDS, capacity=200):
+        self.fields = list(fields)
+        self.capacity = capacity
+        self._columns = {field: i for i, field in enumerate(self.fields)}
+        self._data = np.full((len(self.fields), 2 * capacity), np.nan)
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._head = capacity - 1  # 最新一根K线的位置
+        self._size = 0
+
+    @classmethod
+    def from_frame(cls, df, capacity=200, fields=None):
+        """从 fetch_historical_klines 返回的 DataFrame 初始化"""
+        buffer = cls(fields or list(df.columns), capacity)
+        timestamps = [int(ts.timestamp() * 1000) for ts in df.index]
+        for ts, values in zip(timestamps, df[buffer.fields].to_numpy(dtype=float)):
+            buffer.append(ts, values)
+        return buffer
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, field):
+        """某个字段最近的K线，按时间顺序排列的只读视图"""
+        end = self._head + self.capacity + 1
+        view = self._data[self._columns[field], end - self._size:end]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def timestamps(self):
+        """K线时间戳(ms)只读视图"""
+        end = self._head + self.capacity + 1
+        view = self._timestamps[end - self._size:end]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def last_timestamp(self):
+        return int(self._timestamps[self._head]) if self._size else None
+
+    def row(self, i):
+        """第 i 根K线（支持负索引），返回 {字段: 值}"""
+        return {field: self[field][i] for field in self.fields}
+
+    def append(self, timestamp, values):
+        """追加一根新K线，超出容量时覆盖最旧的一根"""
+        self._head = (self._head + 1) % self.capacity
+        for pos in (self._head, self._head + self.capacity):
+            self._timestamps[pos] = timestamp
+            self._data[:, pos] = values
+        self._size = min(self._size + 1, self.capacity)
+
+    def update_last(self, **values):
+        """原地更新最后一根K线的字段"""
+        for field, value in values.items():
+            column = self._columns[field]
+            self._data[column, self._head] = value
+            self._data[column, self._head + self.capacity] = value
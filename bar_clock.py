@@ -0,0 +1,64 @@
+import time
+
+from loguru import logger
+
+
+class BarCloseScheduler:
+    """按交易所服务器时间对齐K线收盘的调度器
+
+    用 fetch_time 测量本地与服务器的时钟偏差（取往返中点），在每根K线收盘后
+    settle_ms 毫秒唤醒；每 resync_every 根K线重新校准一次。
+    """
+
+    def __init__(self, interval_ms, fetch_server_time, settle_ms=300, resync_every=12):
+        self.interval_ms = interval_ms
+        self.fetch_server_time = fetch_server_time
+        self.settle_ms = settle_ms
+        self.resync_every = resync_every
+        self.offset_ms = 0.0  # 服务器时间 - 本地时间
+        self.last_close = None  # 最近一次唤醒对应的收盘时间（即新K线的开盘时间）
+        self._closes_since_sync = None
+
+    def sync(self):
+        """测量服务器时间偏差"""
+        start = time.time() * 1000
+        server = self.fetch_server_time()
+        end = time.time() * 1000
+        self.offset_ms = server - (start + end) / 2
+        self._closes_since_sync = 0
+        logger.info(f"Server time offset: {self.offset_ms:.1f} ms (round trip {end - start:.1f} ms)")
+
+    def now_ms(self):
+        """按服务器时间计算的当前毫秒时间戳"""
+        return time.time() * 1000 + self.offset_ms
+
+    def next_close(self):
+        """下一次K线收盘的时间戳（收盘后 settle_ms 内仍返回这次收盘，提前唤醒时不会跳过）"""
+        close = int(((self.now_ms() - self.settle_ms) // self.interval_ms + 1) * self.interval_ms)
+        if self.last_close is not None and close <= self.last_close:
+            close = self.last_close + self.interval_ms
+        return close
+
+    def wait(self, max_wait=5, sleep=time.sleep):
+        """最多等待 max_wait 秒；到达收盘时间返回 True，否则返回 False 以便调用方处理控制信号
+
+        sleep 可换成 ControlChannel.wait，收到命令时提前返回 False。
+        """
+        if self._closes_since_sync is None or self._closes_since_sync >= self.resync_every:
+            self.sync()
+        if self.last_close is None:
+            # 启动时立即检测一次当前已收盘的K线
+            self.last_close = int(self.now_ms() // self.interval_ms * self.interval_ms)
+            return True
+        close = self.next_close()
+        remaining = (close + self.settle_ms - self.now_ms()) / 1000
+        if remaining > max_wait:
+            sleep(max_wait)
+            return False
+        if remaining > 0:
+            sleep(remaining)
+            if self.now_ms() < close + self.settle_ms:
+                return False  # 被提前唤醒，下次调用继续等待同一根K线收盘
+        self.last_close = close
+        self._closes_since_sync += 1
+        return True
@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import fcntl
+import os
+import re
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+from loguru import logger
+
+COLUMNS = (('timestamp', np.int64), ('open', np.float64), ('high', np.float64),
+           ('low', np.float64), ('close', np.float64), ('volume', np.float64))
+
+
+def closed_klines(klines, interval_ms, now_ms):
+    """只保留已收盘的K线"""
+    return [k for k in klines if k[0] + interval_ms <= now_ms]
+
+
+class BarStore:
+    """本地列式K线存储
+
+    每个 (币种, 周期) 一个目录，每列一个只追加的二进制文件，读取时内存映射，
+    启动时毫秒级读出历史，只需从交易所获取缺失的部分。只保存已收盘的K线。
+    写入时对目录旁的 .lock 文件加 flock，多个进程可以同时写同一币种。
+    """
+
+    def __init__(self, root='bars'):
+        self.root = root
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, interval, re.sub(r'[^A-Za-z0-9]+', '-', symbol).strip('-'))
+
+    def _columns(self, path):
+        if not os.path.isdir(path):
+            return None
+        columns = {}
+        for name, dtype in COLUMNS:
+            file = os.path.join(path, name)
+            size = os.path.getsize(file) if os.path.exists(file) else 0
+            count = size // np.dtype(dtype).itemsize
+            columns[name] = np.memmap(file, dtype=dtype, mode='r', shape=(count,)) if count else np.empty(0, dtype)
+        # 写入中断时各列长度可能不同，以最短的为准
+        length = min(len(column) for column in columns.values())
+        return {name: column[:length] for name, column in columns.items()}
+
+    @contextmanager
+    def _lock(self, path):
+        # 锁文件放在目录外，prepend 替换整个目录后仍是同一把锁
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def first_timestamp(self, symbol, interval):
+        """最早一根已保存K线的时间戳，没有数据时返回 None"""
+        columns = self._columns(self._dir(symbol, interval))
+        if not columns or not len(columns['timestamp']):
+            return None
+        return int(columns['timestamp'][0])
+
+    def last_timestamp(self, symbol, interval):
+        """最后一根已保存K线的时间戳，没有数据时返回 None"""
+        columns = self._columns(self._dir(symbol, interval))
+        if not columns or not len(columns['timestamp']):
+            return None
+        return int(columns['timestamp'][-1])
+
+    def load(self, symbol, interval, limit=None, since=None):
+        """读取K线列表 [[ts, o, h, l, c, vol], ...]，可按起始时间和数量截取"""
+        columns = self._columns(self._dir(symbol, interval))
+        if not columns:
+            return []
+        timestamps = columns['timestamp']
+        start = int(np.searchsorted(timestamps, since)) if since is not None else 0
+        if limit is not None:
+            start = max(start, len(timestamps) - limit)
+        values = np.column_stack([columns[name][start:] for name, _ in COLUMNS[1:]])
+        return [[ts, *row] for ts, row in zip(timestamps[start:].tolist(), values.tolist())]
+
+    def append(self, symbol, interval, klines):
+        """追加比已保存数据更新的K线，返回写入的数量"""
+        path = self._dir(symbol, interval)
+        with self._lock(path):
+            # 多个进程可能写同一币种，加锁后重新读取最后时间戳
+            os.makedirs(path, exist_ok=True)
+            last = self.last_timestamp(symbol, interval)
+            rows = [k for k in sorted(klines, key=lambda k: k[0]) if last is None or k[0] > last]
+            rows = [k for i, k in enumerate(rows) if i == 0 or k[0] > rows[i - 1][0]]
+            if not rows:
+                return 0
+            # 先截断到一致长度，时间戳列最后写入
+            length = len(self._columns(path)['timestamp'])
+            for k, (name, dtype) in reversed(list(enumerate(COLUMNS))):
+                with open(os.path.join(path, name), 'ab') as f:
+                    f.truncate(length * np.dtype(dtype).itemsize)
+                    f.write(np.array([row[k] for row in rows], dtype=dtype).tobytes())
+        return len(rows)
+
+    def prepend(self, symbol, interval, klines):
+        """在已保存数据之前补入更早的K线，返回写入的数量
+
+        列文件只能追加，补入旧数据时在临时目录写出完整的列再替换整个目录；
+        已打开的内存映射仍指向旧文件，不受影响。
+        """
+        path = self._dir(symbol, interval)
+        with self._lock(path):
+            first = self.first_timestamp(symbol, interval)
+            if first is None:
+                return self._write(path, klines)
+            rows = [k for k in sorted(klines, key=lambda k: k[0]) if k[0] < first]
+            rows = [k for i, k in enumerate(rows) if i == 0 or k[0] > rows[i - 1][0]]
+            if not rows:
+                return 0
+            columns = self._columns(path)
+            tmp, old = path + '.tmp', path + '.old'
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            for k, (name, dtype) in enumerate(COLUMNS):
+                with open(os.path.join(tmp, name), 'wb') as f:
+                    f.write(np.array([row[k] for row in rows], dtype=dtype).tobytes())
+                    f.write(np.ascontiguousarray(columns[name]).tobytes())
+            shutil.rmtree(old, ignore_errors=True)
+            os.rename(path, old)
+            os.rename(tmp, path)
+            shutil.rmtree(old)
+        return len(rows)
+
+    def _write(self, path, klines):
+        # 已持有锁：目录为空时 prepend 等同于 append
+        rows = sorted(klines, key=lambda k: k[0])
+        rows = [k for i, k in enumerate(rows) if i == 0 or k[0] > rows[i - 1][0]]
+        if not rows:
+            return 0
+        os.makedirs(path, exist_ok=True)
+        for k, (name, dtype) in reversed(list(enumerate(COLUMNS))):
+            with open(os.path.join(path, name), 'wb') as f:
+                f.write(np.array([row[k] for row in rows], dtype=dtype).tobytes())
+        return len(rows)
+
+
+def _page(fetch, since, until, interval_ms):
+    """从 since 开始向后分页获取K线，直到 until（毫秒）或没有更多数据"""
+    klines = []
+    while since <= until:
+        batch = [k for k in fetch(since) if not klines or k[0] > klines[-1][0]]
+        if not batch:
+            break
+        klines.extend(batch)
+        since = batch[-1][0] + interval_ms
+    return klines
+
+
+def missing_before(stored, fetched, limit, interval_ms):
+    """本地数据不足 limit 根时需要补齐的更早区间 (since, until)，不需要时返回 None"""
+    missing = limit - len(stored) - len(fetched)
+    if not stored or missing <= 0:
+        return None
+    first = stored[0][0]
+    return first - missing * interval_ms, first - interval_ms
+
+
+def fetch_with_store(exchange, store, symbol, interval, limit):
+    """同步版本：先读本地K线，只从交易所分页获取缺失的部分，返回最近 limit 根（含未收盘K线）"""
+    interval_ms = exchange.parse_timeframe(interval) * 1000
+    now = exchange.milliseconds()
+    stored = store.load(symbol, interval, limit)
+
+    def fetch(since):
+        return exchange.fetch_ohlcv(symbol, interval, since=since, limit=300)
+
+    # 从最后一根已保存K线之后开始获取，补齐停机期间的缺口
+    since = stored[-1][0] + interval_ms if stored else now - limit * interval_ms
+    klines = _page(fetch, since, now, interval_ms)
+    # 本地数据不足 limit 根时，从最早一根已保存K线往前补齐
+    older = []
+    older_range = missing_before(stored, klines, limit, interval_ms)
+    if older_range is not None:
+        older = [k for k in _page(fetch, *older_range, interval_ms) if k[0] <= older_range[1]]
+    written = store.prepend(symbol, interval, older) + store.append(symbol, interval,
+                                                                     closed_klines(klines, interval_ms, now))
+    logger.info(f"Loaded {len(stored)} K-lines from disk, fetched {len(older) + len(klines)}, stored {written}")
+    return (older + stored + klines)[-limit:]
+
+
+async def backfill(loader, symbols, bars):
+    """并发回填多个币种的历史K线到本地存储（分页和限速由 loader 负责）"""
+    results = await asyncio.gather(*[loader.fetch_history(symbol, bars) for symbol in symbols],
+                                   return_exceptions=True)
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            logger.error(f"Backfill failed for {symbol}: {result}")
+    return results
+
+
+async def _backfill_main(args):
+    import ccxt.async_support as ccxt
+    from market_loader import KlineLoader
+    from rate_limit import RateLimiter
+
+    exchange = ccxt.okx({'enableRateLimit': False})
+    try:
+        limiter = RateLimiter()
+        symbols = args.symbols
+        if not symbols:
+            markets = await limiter.call('market', exchange.load_markets)
+            symbols = [s for s in markets if s.endswith(':USDT') and markets[s].get('swap')]
+        loader = KlineLoader(exchange, limiter, None, args.interval, store=BarStore(args.root))
+        bars = args.days * 86400000 // (exchange.parse_timeframe(args.interval) * 1000)
+        await backfill(loader, symbols, bars)
+    finally:
+        await exchange.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回填本地K线存储')
+    parser.add_argument('symbols', nargs='*', help='币种，例如 BTC/USDT:USDT；为空时回填全部USDT永续合约')
+    parser.add_argument('--root', default='bars')
+    parser.add_argument('--interval', default='5m')
+    parser.add_argument('--days', type=int, default=30)
+    asyncio.run(_backfill_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
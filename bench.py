@@ -0,0 +1,348 @@
+import argparse
+import gc
+import json
+import platform
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from backtest import ema, load_ohlcv, sma
+from bar_buffer import BarBuffer, OHLCV_FIELDS
+from ema_store import EMA_LENGTHS, OHLCV_COLUMNS, EmaStore
+from indicators import StreamingSMA, StopLossLevels
+
+INTERVAL_MS = 300000  # 5m
+
+
+def synthetic_ohlcv(bars, seed=0, start_price=30000.0):
+    """可复现的随机游走K线，列与 fetch_historical_klines 返回的一致"""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.002, bars)))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.001, bars)) * close
+    timestamps = 1700000000000 + np.arange(bars, dtype=np.int64) * INTERVAL_MS
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.uniform(10, 1000, bars),
+    })
+
+
+def to_frame(df):
+    """timestamp 列转为 fetch_historical_klines 同样的时区索引"""
+    df = df[OHLCV_COLUMNS].copy()
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True).dt.tz_convert('Asia/Shanghai')
+    return df.set_index('timestamp')
+
+
+def with_emas(df):
+    """加上 new_client 检测条件用到的 EMA 列（与 ta.ema 一致，不依赖 pandas_ta）"""
+    df = df.copy()
+    for length in EMA_LENGTHS:
+        df[f'EMA{length}'] = ema(df['close'].to_numpy(), length)
+    return df.fillna(0)
+
+
+def to_klines(df):
+    """to_frame 的逆变换：[[timestamp(ms), o, h, l, c, v], ...]"""
+    timestamps = (df.index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+    return np.column_stack([timestamps, df[OHLCV_COLUMNS[1:]].to_numpy(dtype=float)])
+
+
+def make_frames(bars, symbols, source=None, seed=0):
+    """每个币种一段 bars 根K线：录制数据按不同偏移截取，否则用不同种子生成"""
+    frames = []
+    for i in range(symbols):
+        if source is None:
+            df = synthetic_ohlcv(bars, seed + i)
+        else:
+            if len(source) < bars:
+                raise ValueError(f"recorded data has {len(source)} bars, need {bars}")
+            offset = (i * 97) % (len(source) - bars + 1)
+            df = source.iloc[offset:offset + bars].reset_index(drop=True)
+        frames.append(to_frame(df))
+    return frames
+
+
+class ReplayExchange:
+    """update_klines 用的交易所替身：交替返回新K线（追加）和同一根K线（用 fetch_ticker 原地更新）"""
+
+    def __init__(self, df):
+        self.klines = df.reset_index()[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=float)
+        self.timestamp = int(df.index[-1].timestamp() * 1000)
+        self.calls = 0
+
+    def fetch_ohlcv(self, symbol, interval, since=None, limit=None):
+        self.calls += 1
+        if self.calls % 2:
+            self.timestamp += INTERVAL_MS
+        return [[self.timestamp, *self.klines[self.calls % len(self.klines)]]]
+
+    def fetch_ticker(self, symbol):
+        return {'last': float(self.klines[self.calls % len(self.klines)][3])}
+
+
+def _ma60_state(df):
+    """按 ma60.main 的方式准备单币种的缓冲区和增量指标"""
+    import ma60
+    df = df.copy()
+    df['MA25'] = sma(df['close'].to_numpy(), 25)
+    ma60.ma_engine = StreamingSMA(window=25)
+    ma60.ma_engine.seed(df['close'])
+    ma60.stop_levels = StopLossLevels(windows=(48, 96, 144, 288))
+    ma60.stop_levels.seed(df['low'], df['high'])
+    ma60.feed = None
+    ma60.exchange = ReplayExchange(df)
+    return ma60, BarBuffer.from_frame(df, capacity=len(df), fields=[*OHLCV_FIELDS, 'MA25'])
+
+
+def bench_calculate_ma(frames):
+    from ma60 import calculate_ma
+    return lambda: [calculate_ma(df.copy()) for df in frames]
+
+
+def bench_calculate_stop_loss_price(frames):
+    ma60, bars = _ma60_state(frames[0])
+    return lambda: (ma60.calculate_stop_loss_price(bars, 144, 'long'), ma60.calculate_stop_loss_price(bars, 144, 'short'))
+
+
+def bench_calculate_stop_loss_price_scan(frames):
+    # 不在增量维护窗口内的窗口，走切片求最值
+    ma60, bars = _ma60_state(frames[0])
+    window = min(len(bars), 200)
+    return lambda: (ma60.calculate_stop_loss_price(bars, window, 'long'),
+                    ma60.calculate_stop_loss_price(bars, window, 'short'))
+
+
+def bench_update_klines(frames):
+    ma60, bars = _ma60_state(frames[0])
+    return lambda: ma60.update_klines(bars, 'BTC/USDT:USDT', '5m')
+
+
+def bench_apply_kline(frames):
+    # update_klines 去掉交易所请求后的部分：StreamingSMA/StopLossLevels 增量更新并写入 BarBuffer，对比 calculate_ma 全量重算
+    ma60, bars = _ma60_state(frames[0])
+    klines = frames[0].reset_index()[['open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=float)
+    calls = [0]
+
+    def step():
+        calls[0] += 1
+        kline = klines[calls[0] % len(klines)]
+        if calls[0] % 2:
+            ma60.apply_kline(bars, [bars.last_timestamp + INTERVAL_MS, *kline])
+        else:
+            ma60.apply_price(bars, float(kline[3]))
+    return step
+
+
+def bench_calculate_indicators(frames):
+    from new_client import calculate_indicators
+    return lambda: [calculate_indicators(df.copy()) for df in frames]
+
+
+def bench_ema_store_update(frames):
+    # 每次调用折叠一根新收盘K线并输出带EMA列的 DataFrame，对比 calculate_indicators 全量重算
+    store = EmaStore(keep=len(frames[0]), interval_ms=INTERVAL_MS)
+    series = {}
+    for i, df in enumerate(frames):
+        klines = [[int(k[0]), *k[1:]] for k in to_klines(df).tolist()]
+        store.warm_up(i, klines)
+        series[i] = klines
+
+    def step():
+        for i, klines in series.items():
+            closed = store.last_closed(i) + INTERVAL_MS
+            kline = klines[(closed // INTERVAL_MS) % len(klines)]
+            store.update(i, [[closed, *kline[1:]], [closed + INTERVAL_MS, *kline[1:]]])
+    return step
+
+
+def bench_check_original_entry_conditions(frames):
+    from new_client import check_original_entry_conditions
+    frames = [with_emas(df) for df in frames]
+    return lambda: [check_original_entry_conditions(df) for df in frames]
+
+
+def bench_check_unique_pattern(frames):
+    from new_client import check_unique_pattern
+    frames = [with_emas(df) for df in frames]
+    return lambda: [check_unique_pattern(df, len(df) - 2) for df in frames]
+
+
+def bench_check_new_entry_conditions(frames):
+    from new_client import check_new_entry_conditions
+    frames = [with_emas(df) for df in frames]
+    return lambda: [check_new_entry_conditions(df) for df in frames]
+
+
+def bench_evaluate_entry(frames):
+    from signals import evaluate_entry
+    frames = [with_emas(df) for df in frames]
+    return lambda: [evaluate_entry(df) for df in frames]
+
+
+def bench_panel_evaluate_entries(frames):
+    from panel import FIELDS, SymbolPanel
+    panel = SymbolPanel(list(range(len(frames))), bars=len(frames[0]))
+    for i, df in enumerate(with_emas(df) for df in frames):
+        panel.load(i, np.column_stack([to_klines(df)[:, 0], df[FIELDS].to_numpy(dtype=float)]))
+    return panel.evaluate_entries
+
+
+# 名称 -> (准备函数, 是否按币种数扫描)；ma60 的函数依赖单币种的模块状态，只在 1 个币种下测
+# 全量计算的旧函数作为基准线，紧跟其后的是实盘使用的增量/批量实现
+BENCHMARKS = {
+    'calculate_ma': (bench_calculate_ma, True),
+    'apply_kline': (bench_apply_kline, False),
+    'update_klines': (bench_update_klines, False),
+    'calculate_stop_loss_price': (bench_calculate_stop_loss_price, False),
+    'calculate_stop_loss_price[scan]': (bench_calculate_stop_loss_price_scan, False),
+    'calculate_indicators': (bench_calculate_indicators, True),
+    'EmaStore.update': (bench_ema_store_update, True),
+    'check_original_entry_conditions': (bench_check_original_entry_conditions, True),
+    'check_unique_pattern': (bench_check_unique_pattern, True),
+    'check_new_entry_conditions': (bench_check_new_entry_conditions, True),
+    'evaluate_entry': (bench_evaluate_entry, True),
+    'SymbolPanel.evaluate_entries': (bench_panel_evaluate_entries, True),
+}
+
+
+def measure(func, repeat=5, min_time=0.1):
+    """先预热一次并确定每轮调用次数（每轮至少 min_time 秒），返回每次调用耗时（秒）的中位数和最小值
+
+    与 timeit 一样计时期间关闭垃圾回收。
+    """
+    func()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _measure(func, repeat, min_time)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _measure(func, repeat, min_time):
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(min_time / elapsed) + 1)
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+    return statistics.median(timings), min(timings)
+
+
+def run(names, bar_counts, symbol_counts, source=None, repeat=5, min_time=0.1):
+    """运行基准，返回 {"名称|K线数|币种数": 结果}；缺少依赖的基准记为 skipped"""
+    results = {}
+    for name in names:
+        prepare, per_symbol = BENCHMARKS[name]
+        for bars in bar_counts:
+            for symbols in (symbol_counts if per_symbol else [1]):
+                key = f"{name}|{bars}|{symbols}"
+                try:
+                    func = prepare(make_frames(bars, symbols, source))
+                    median, best = measure(func, repeat, min_time)
+                except ImportError as e:
+                    results[key] = {'skipped': str(e)}
+                    continue
+                results[key] = {'median': median, 'min': best, 'per_symbol': median / symbols}
+                logger.info(f"{key}: {median * 1e6:.1f}us")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基准线比较，返回 DataFrame，regression 为慢于基准线超过 threshold 的项
+
+    比较各轮的最小值：共享机器上的干扰只会让耗时变长，最小值比中位数稳定。
+    """
+    rows = []
+    for key, result in results.items():
+        name, bars, symbols = key.split('|')
+        row = {'benchmark': name, 'bars': int(bars), 'symbols': int(symbols)}
+        if 'skipped' in result:
+            rows.append({**row, 'status': 'skipped', 'note': result['skipped']})
+            continue
+        row.update(median_us=result['median'] * 1e6, min_us=result['min'] * 1e6,
+                   per_symbol_us=result['per_symbol'] * 1e6)
+        base = baseline.get(key)
+        if base is None or 'min' not in base:
+            rows.append({**row, 'status': 'new'})
+            continue
+        change = result['min'] / base['min'] - 1
+        status = 'REGRESSION' if change > threshold else 'faster' if change < -threshold else 'ok'
+        rows.append({**row, 'baseline_us': base['min'] * 1e6, 'change': f"{change:+.1%}", 'status': status})
+    return pd.DataFrame(rows)
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def parse_counts(text):
+    return [int(v) for v in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='指标和开仓条件热路径的基准测试')
+    parser.add_argument('--path', help='录制的5m K线文件（csv 或 parquet），指定 --symbol 时为 BarStore 目录；默认用合成数据')
+    parser.add_argument('--symbol', help='从 BarStore 读取的币种')
+    parser.add_argument('--bench', action='append', choices=sorted(BENCHMARKS), help='只运行指定基准，可重复')
+    parser.add_argument('--bars', type=parse_counts, default=[200, 1000, 5000], help='K线数量，例如 200,1000')
+    parser.add_argument('--symbols', type=parse_counts, default=[1, 50, 200], help='币种数量，例如 1,50,200')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.1, help='每轮最少运行秒数')
+    parser.add_argument('--baseline', default='bench_baseline.json')
+    parser.add_argument('--save', action='store_true', help='把本次结果写入基准线文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='最小耗时变慢超过该比例视为回退')
+    args = parser.parse_args()
+
+    logger.remove()  # 被测函数的日志不计入耗时
+    source = load_ohlcv(args.path, args.symbol) if args.path else None
+    names = args.bench or list(BENCHMARKS)
+    started = time.perf_counter()
+    results = run(names, args.bars, args.symbols, source, args.repeat, args.min_time)
+
+    try:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        saved = {'results': {}}
+    report = compare(results, saved['results'], args.threshold)
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+    print(f"{len(results)} benchmarks in {time.perf_counter() - started:.1f}s")
+    recorded = {k: v for k, v in saved.get('environment', {}).items() if k != 'time'}
+    current = {k: v for k, v in environment().items() if k != 'time'}
+    if recorded and recorded != current:
+        print(f"Baseline recorded on a different environment: {recorded}")
+
+    if args.save:
+        saved['results'].update(results)
+        saved['environment'] = environment()
+        with open(args.baseline, 'w') as f:
+            json.dump(saved, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    regressions = report[report['status'] == 'REGRESSION']
+    if len(regressions):
+        print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
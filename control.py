@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+from loguru import logger
+
+import metrics
+import tracing
+
+CONTROL_DIR = 'control'  # 各策略进程的 socket 所在目录
+COMMANDS = ('start', 'stop', 'flatten', 'status', 'metrics', 'traces', 'profile')
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            params = json.loads(line)
+            reply = self.server.channel.handle(params.pop('command'), **params)
+        except Exception as e:
+            reply = {'ok': False, 'strategy': self.server.channel.name, 'error': str(e)}
+        self.wfile.write((json.dumps(reply, default=str) + '\n').encode())
+
+
+class ControlChannel:
+    """本地控制通道
+
+    每个策略进程在 control/<name>.sock 上监听，收到 start/stop/flatten/status 命令后立即切换状态并回复确认；
+    flatten 先停止开仓，再由主循环执行平仓，平仓完成后才回复；metrics 返回本进程的指标快照，
+    traces 返回最近几轮的耗时记录，profile 采样本进程 seconds 秒并返回折叠栈。
+    运行状态保存在 state_file（默认 control_<name>.state，每个策略一份）中，重启后保持。
+    """
+
+    def __init__(self, name, state_file=None, directory=CONTROL_DIR, flatten_timeout=30):
+        self.name = name
+        self.state_file = state_file or f'control_{name}.state'
+        self.path = os.path.join(directory, f'{name}.sock')
+        self.flatten_timeout = flatten_timeout
+        self.running = threading.Event()
+        if self._read_state() != 'stop':
+            self.running.set()
+        self._wakeup = threading.Event()  # 收到命令时唤醒主循环
+        self._listeners = []  # 收到命令时额外调用，唤醒阻塞在其他队列上的主循环
+        self._flattens = queue.Queue()  # 等待主循环执行的平仓请求
+        self._server = None
+
+    def start(self):
+        """在后台线程中监听 socket"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # 上次退出时残留的 socket 文件
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, _Handler)
+        self._server.daemon_threads = True
+        self._server.channel = self
+        threading.Thread(target=self._server.serve_forever, name=f'control-{self.name}', daemon=True).start()
+        logger.info(f"Control channel listening on {self.path} (state: {self.state})")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            os.remove(self.path)
+
+    @property
+    def state(self):
+        return 'running' if self.running.is_set() else 'stopped'
+
+    def is_running(self):
+        return self.running.is_set()
+
+    def wait(self, timeout):
+        """代替 sleep：最多等待 timeout 秒，收到命令时立即返回 True"""
+        return self._wakeup.wait(timeout)
+
+    def on_command(self, callback):
+        """收到 start/stop/flatten 命令时调用 callback（例如让 WebSocket 推送的 drain 立即返回）"""
+        self._listeners.append(callback)
+        return self
+
+    def process(self, flatten):
+        """主循环中执行等待中的平仓请求"""
+        self._wakeup.clear()
+        for future in self._drain():
+            try:
+                future.set_result(flatten())
+            except Exception as e:
+                future.set_exception(e)
+
+    async def process_async(self, flatten):
+        """process 的异步版本，flatten 为协程函数"""
+        self._wakeup.clear()
+        for future in self._drain():
+            try:
+                future.set_result(await flatten())
+            except Exception as e:
+                future.set_exception(e)
+
+    def handle(self, command, **params):
+        """处理一条命令（在 socket 线程中执行），返回确认"""
+        if command not in COMMANDS:
+            raise ValueError(f"unknown command: {command}")
+        # 诊断命令只读取状态，不唤醒主循环
+        if command == 'metrics':
+            return self._reply(command, metrics.registry.snapshot())
+        if command == 'traces':
+            return self._reply(command, tracing.tracer.recent(params.get('limit', 50), params.get('min_duration', 0.0)))
+        if command == 'profile':
+            return self._reply(command, tracing.profile(params.get('seconds', 10), params.get('interval', 0.01),
+                                                        root=self.name))
+        result = None
+        if command == 'start':
+            self._set_running(True)
+        elif command in ('stop', 'flatten'):
+            self._set_running(False)
+        if command == 'flatten':
+            future = Future()
+            self._flattens.put(future)
+            self._wake()
+            result = future.result(timeout=self.flatten_timeout)
+        self._wake()
+        return self._reply(command, result)
+
+    def _wake(self):
+        self._wakeup.set()
+        for callback in self._listeners:
+            callback()
+
+    def _reply(self, command, result):
+        return {'ok': True, 'strategy': self.name, 'command': command, 'state': self.state, 'result': result}
+
+    def _set_running(self, running):
+        if running == self.running.is_set():
+            return
+        if running:
+            self.running.set()
+            logger.critical("### 交易策略恢复运行\n策略: {}\n时间: {}\n状态: 收到开始信号".format(
+                self.name, pd.Timestamp.now()))
+        else:
+            self.running.clear()
+            logger.critical("### 交易策略停止\n策略: {}\n时间: {}\n状态: 收到停止信号".format(
+                self.name, pd.Timestamp.now()))
+        with open(self.state_file, 'w') as f:
+            f.write('start' if running else 'stop')
+
+    def _read_state(self):
+        try:
+            with open(self.state_file) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return 'start'
+
+    def _drain(self):
+        while True:
+            try:
+                yield self._flattens.get_nowait()
+            except queue.Empty:
+                return
+
+
+def _request(path, command, timeout, params):
+    name = os.path.basename(path)[:-len('.sock')]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall((json.dumps({'command': command, **params}) + '\n').encode())
+            line = sock.makefile().readline()
+        return json.loads(line)
+    except (ConnectionRefusedError, FileNotFoundError):
+        # 进程已退出，清理残留的 socket 文件
+        if os.path.exists(path):
+            os.remove(path)
+        return {'ok': False, 'strategy': name, 'error': 'not running'}
+    except (OSError, ValueError) as e:
+        return {'ok': False, 'strategy': name, 'error': str(e) or type(e).__name__}
+
+
+def send_command(command, directory=CONTROL_DIR, timeout=40, names=None, **params):
+    """向所有运行中的策略进程（或 names 指定的策略）并发发送命令，返回各进程的确认"""
+    paths = sorted(glob.glob(os.path.join(directory, '*.sock')))
+    if names:
+        paths = [path for path in paths if os.path.basename(path)[:-len('.sock')] in names]
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        return list(pool.map(lambda path: _request(path, command, timeout, params), paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='向运行中的策略发送控制命令')
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('--dir', default=CONTROL_DIR)
+    parser.add_argument('--strategy', action='append', help='只发送给指定策略，可重复')
+    parser.add_argument('--seconds', type=float, default=10, help='profile 采样时长')
+    args = parser.parse_args()
+    if args.command == 'profile':
+        # 折叠栈直接输出，可重定向给 flamegraph.pl
+        acks = send_command('profile', args.dir, args.seconds + 10, args.strategy, seconds=args.seconds)
+        for ack in acks:
+            if ack['ok']:
+                sys.stdout.write(ack['result'])
+            else:
+                print(f"{ack['strategy']}: {ack.get('error')}", file=sys.stderr)
+        return
+    acks = send_command(args.command, args.dir, names=args.strategy)
+    if not acks:
+        print('No running strategies')
+    for ack in acks:
+        print(json.dumps(ack, ensure_ascii=False, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from indicators import StreamingEMA
+
+EMA_LENGTHS = (5, 10, 24, 50, 150)
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+class _SymbolEma:
+    """单个币种的EMA状态和最近的已收盘K线"""
+
+    def __init__(self, lengths, keep):
+        self.emas = {length: StreamingEMA(length) for length in lengths}
+        self.rows = deque(maxlen=keep)  # [timestamp, o, h, l, c, v, EMA...]
+        self.last_ts = None  # 最后一根已收盘K线的时间戳(ms)
+
+    def fold(self, kline):
+        """折叠一根已收盘K线"""
+        close = kline[4]
+        values = [ema.close_bar(close) for ema in self.emas.values()]
+        self.rows.append(list(kline[:6]) + values)
+        self.last_ts = kline[0]
+
+    def peek(self, kline):
+        """未收盘K线的临时行"""
+        close = kline[4]
+        return list(kline[:6]) + [ema.peek(close) for ema in self.emas.values()]
+
+
+class EmaStore:
+    """按币种持久化EMA状态，每轮只折叠新收盘的K线和当前未收盘K线"""
+
+    def __init__(self, lengths=EMA_LENGTHS, keep=200, interval_ms=300000):
+        self.lengths = tuple(lengths)
+        self.keep = keep
+        self.interval_ms = interval_ms
+        self.columns = OHLCV_COLUMNS + [f'EMA{length}' for length in self.lengths]
+        self._states = {}
+
+    def is_warm(self, symbol):
+        """该币种是否已经用深度历史预热"""
+        return symbol in self._states
+
+    def reset(self, symbol):
+        """丢弃该币种的状态，下一轮重新预热"""
+        self._states.pop(symbol, None)
+
+    def warm_up(self, symbol, klines, frame=True):
+        """用深度历史初始化EMA（最后一根视为未收盘K线，不折叠）"""
+        state = _SymbolEma(self.lengths, self.keep - 1)  # 留一行给未收盘K线
+        for kline in klines[:-1]:
+            state.fold(kline)
+        self._states[symbol] = state
+        return self._output(state, klines[-1], frame)
+
+    def last_closed(self, symbol):
+        """最后一根已收盘K线的时间戳(ms)，增量获取K线的起点"""
+        return self._states[symbol].last_ts
+
+    def update(self, symbol, klines, frame=True):
+        """折叠新收盘的K线并返回带EMA列的 DataFrame（frame=False 时返回数组）
+
+        K线必须紧接最后一根已收盘K线且按周期连续，出现缺口或乱序时丢弃状态并返回 None。
+        """
+        state = self._states[symbol]
+        if not klines or state.last_ts is None:
+            self.reset(symbol)
+            return None
+        fresh = [k for k in klines if k[0] > state.last_ts]
+        expected = state.last_ts + self.interval_ms
+        for kline in fresh:
+            if kline[0] != expected:
+                break
+            expected += self.interval_ms
+        else:
+            if fresh and fresh[-1] is klines[-1]:
+                for kline in fresh[:-1]:
+                    state.fold(kline)
+                return self._output(state, fresh[-1], frame)
+        # 数据出现缺口或乱序，需要重新预热
+        self.reset(symbol)
+        return None
+
+    def _output(self, state, forming, frame):
+        rows = list(state.rows)
+        if forming[0] > (state.last_ts or -1):
+            rows.append(state.peek(forming))
+        if not frame:
+            # 按 self.columns 排列的 (K线数, 列数) 数组，NaN 与 DataFrame 路径一样置 0
+            data = np.array(rows, dtype=float).reshape(len(rows), len(self.columns))
+            data[np.isnan(data)] = 0.0
+            return data
+        df = pd.DataFrame(rows, columns=self.columns)
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+        df.set_index('timestamp', inplace=True)
+        df.fillna(0, inplace=True)
+        return df
@@ -0,0 +1,176 @@
+import math
+from collections import deque
+
+
+class StreamingSMA:
+    """增量滑动平均：在固定窗口内维护累加和，追加和修正最后一根K线都是 O(1)"""
+
+    def __init__(self, window=25):
+        self.window = window
+        self._values = deque(maxlen=window)
+        self._sum = 0.0
+        self._updates = 0  # 累计更新次数，用于定期重算累加和以消除浮点误差
+
+    def seed(self, closes):
+        """用历史收盘价初始化窗口"""
+        self._values.clear()
+        self._values.extend(float(c) for c in list(closes)[-self.window:])
+        self._resync()
+        return self.value
+
+    def append(self, close):
+        """追加一根新K线的收盘价"""
+        close = float(close)
+        if len(self._values) == self.window:
+            self._sum -= self._values[0]
+        self._values.append(close)
+        self._sum += close
+        self._tick()
+        return self.value
+
+    def revise(self, close):
+        """修正当前（未收盘）K线的收盘价"""
+        if not self._values:
+            return self.append(close)
+        close = float(close)
+        self._sum += close - self._values[-1]
+        self._values[-1] = close
+        self._tick()
+        return self.value
+
+    @property
+    def value(self):
+        """当前均线值，窗口未填满时返回 NaN（与 pandas_ta.sma 一致）"""
+        if len(self._values) < self.window:
+            return float('nan')
+        return self._sum / self.window
+
+    def _tick(self):
+        self._updates += 1
+        if self._updates >= self.window:
+            self._resync()
+
+    def _resync(self):
+        # 每 window 次更新重算一次，摊销后仍为 O(1)
+        self._sum = math.fsum(self._values)
+        self._updates = 0
+
+
+class StreamingEMA:
+    """增量EMA：与 pandas_ta.ema 相同，以前 length 根收盘价的SMA作为初值"""
+
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2 / (length + 1)
+        self._seed = []
+        self._ema = None  # 最后一根已收盘K线的EMA
+
+    def close_bar(self, close):
+        """折叠一根已收盘的K线，返回该K线的EMA"""
+        close = float(close)
+        if self._ema is None:
+            self._seed.append(close)
+            if len(self._seed) < self.length:
+                return float('nan')
+            self._ema = math.fsum(self._seed) / self.length
+            self._seed = []
+        else:
+            self._ema += self.alpha * (close - self._ema)
+        return self._ema
+
+    def peek(self, close):
+        """计算未收盘K线的临时EMA，不改变状态"""
+        close = float(close)
+        if self._ema is None:
+            if len(self._seed) + 1 < self.length:
+                return float('nan')
+            return (math.fsum(self._seed) + close) / self.length
+        return self._ema + self.alpha * (close - self._ema)
+
+    @property
+    def value(self):
+        """最后一根已收盘K线的EMA"""
+        return float('nan') if self._ema is None else self._ema
+
+
+class RollingExtremum:
+    """单调队列滑动最小/最大值，摊销 O(1)
+
+    队列只保存已收盘的K线，未收盘K线单独保存，因此修正最后一根K线时不会丢失被它挤出队列的旧值。
+    """
+
+    def __init__(self, window, mode='min'):
+        self.window = window
+        self._better = (lambda a, b: a <= b) if mode == 'min' else (lambda a, b: a >= b)
+        self._closed = deque()  # (序号, 值)，从队首到队尾单调
+        self._forming = None
+        self._count = 0  # 已追加的K线数量（含未收盘K线）
+
+    def seed(self, values):
+        """用历史值初始化，最后一个值视为未收盘K线"""
+        for value in values:
+            self.append(value)
+        return self.value
+
+    def append(self, value):
+        """新K线开始：上一根未收盘K线收盘并入队"""
+        if self._forming is not None:
+            index = self._count - 1
+            while self._closed and self._better(self._forming, self._closed[-1][1]):
+                self._closed.pop()
+            self._closed.append((index, self._forming))
+        self._forming = float(value)
+        self._count += 1
+        # 移除窗口之外的K线（窗口包含未收盘K线）
+        oldest = self._count - self.window
+        while self._closed and self._closed[0][0] < oldest:
+            self._closed.popleft()
+        return self.value
+
+    def revise(self, value):
+        """修正未收盘K线的值"""
+        if self._forming is None:
+            return self.append(value)
+        self._forming = float(value)
+        return self.value
+
+    @property
+    def value(self):
+        """窗口内的最小/最大值，K线不足 window 根时返回 NaN"""
+        if self._count < self.window:
+            return float('nan')
+        if self._closed and self._better(self._closed[0][1], self._forming):
+            return self._closed[0][1]
+        return self._forming
+
+
+class StopLossLevels:
+    """多个窗口的止损价：多单取最低价的滑动最小值，空单取最高价的滑动最大值"""
+
+    def __init__(self, windows=(48, 96, 144, 288)):
+        self.windows = tuple(windows)
+        self._lows = {window: RollingExtremum(window, 'min') for window in self.windows}
+        self._highs = {window: RollingExtremum(window, 'max') for window in self.windows}
+
+    def seed(self, lows, highs):
+        """用历史K线初始化"""
+        for low, high in zip(lows, highs):
+            self.append(low, high)
+
+    def append(self, low, high):
+        """追加一根新K线"""
+        for window in self.windows:
+            self._lows[window].append(low)
+            self._highs[window].append(high)
+
+    def revise(self, low, high):
+        """修正未收盘K线的最低价和最高价"""
+        for window in self.windows:
+            self._lows[window].revise(low)
+            self._highs[window].revise(high)
+
+    def price(self, window=144, posSide='long'):
+        """指定窗口和方向的止损价"""
+        if posSide == 'long':
+            return self._lows[window].value
+        return self._highs[window].value
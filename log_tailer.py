@@ -0,0 +1,271 @@
+import ctypes
+import ctypes.util
+import os
+import queue
+import re
+import select
+import threading
+from collections import deque
+
+from loguru import logger
+
+# loguru 默认格式：2024-01-01 12:00:00.000 | INFO     | module:function:line - message
+HEADER = re.compile(r'^\d{4}-\d{2}-\d{2} [\d:.]+ \| (\w+)\s*\| ([\w.]+):\S* - (?:\[([\w.-]+)\])?')
+LEVELS = {'TRACE': 5, 'DEBUG': 10, 'INFO': 20, 'SUCCESS': 25, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+
+
+def strategy_format(name):
+    """loguru 文件格式：默认格式的消息前加上 [策略名]，供 strategy= 过滤（脚本直接运行时模块名是 __main__）"""
+    return "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - [" + name + "] {message}"
+
+
+class _Inotify:
+    """监听目录变化（Linux inotify，通过 libc 调用，不依赖第三方包）"""
+
+    MASK = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200  # MODIFY, CLOSE_WRITE, MOVED_FROM/TO, CREATE, DELETE
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+
+    def wait(self, timeout):
+        """等待目录中有文件变化，最多 timeout 秒"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Subscription:
+    """一个 SSE 客户端：有界队列，服务端按级别和策略过滤；客户端过慢时丢弃并计数"""
+
+    def __init__(self, level=None, strategy=None, queue_size=1000):
+        self.min_level = LEVELS.get((level or '').upper(), 0)
+        self.strategy = strategy
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+
+    def accepts(self, record):
+        level, tags, _ = record
+        return level >= self.min_level and (self.strategy is None or self.strategy in tags)
+
+    def offer(self, record):
+        if not self.accepts(record):
+            return
+        try:
+            self._queue.put_nowait(record[2])
+        except queue.Full:
+            self.dropped += 1
+
+    def get(self, timeout=15):
+        """等待第一行（最多 timeout 秒），然后取出队列中的全部行"""
+        try:
+            lines = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            lines = []
+        while True:
+            try:
+                lines.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if self.dropped:
+            lines.insert(0, f"[{self.dropped} log lines dropped: client too slow]")
+            self.dropped = 0
+        return lines
+
+
+class LogTailer:
+    """单个日志文件的共享跟踪线程
+
+    inotify 通知文件变化（不可用时每 poll_interval 秒检查一次），新行广播给全部订阅者；
+    loguru 轮转后先读完旧文件和中间轮转出的文件，再切换到新文件。多行消息的后续行沿用第一行的级别和策略。
+    """
+
+    def __init__(self, path, source, poll_interval=1.0, history=500):
+        self.path = path
+        self.source = source
+        self.poll_interval = poll_interval
+        self.history = deque(maxlen=history)  # 最近的记录，供新订阅者回看
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self._inode = None
+        self._partial = ''
+        self._context = (LEVELS['INFO'], frozenset([source]))
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """启动跟踪线程"""
+        self._thread = threading.Thread(target=self._run, name=f'log-tailer-{self.source}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def subscribe(self, subscription, backlog=0):
+        with self._lock:
+            if backlog:
+                for record in list(self.history)[-backlog:]:
+                    subscription.offer(record)
+            self._subscribers.add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def _run(self):
+        try:
+            watcher = _Inotify(os.path.dirname(os.path.abspath(self.path)))
+        except (OSError, AttributeError, TypeError) as e:
+            logger.warning(f"inotify unavailable for {self.path} ({e}), polling every {self.poll_interval}s")
+            watcher = None
+        self._open(backlog=True)
+        while not self._stopped.is_set():
+            try:
+                self._read()
+                self._check_rotation()
+            except Exception as e:
+                logger.warning(f"Log tailer for {self.path} failed: {e}")
+                self._file = None
+            if watcher is not None:
+                # 没有事件时仍定期检查，避免漏掉事件
+                watcher.wait(self.poll_interval * 5)
+            else:
+                self._stopped.wait(self.poll_interval)
+        if watcher is not None:
+            watcher.close()
+
+    def _open(self, backlog=False):
+        try:
+            file = open(self.path, 'r', errors='replace')
+        except FileNotFoundError:
+            return
+        self._file = file
+        self._inode = os.fstat(file.fileno()).st_ino
+        self._partial = ''
+        if backlog:
+            # 启动时从文件末尾开始，只读取最后一段填充 history
+            size = file.seek(0, os.SEEK_END)
+            file.seek(max(0, size - 256 * 1024))
+            lines = file.read().splitlines()[1 if size > 256 * 1024 else 0:]
+            for line in lines[-self.history.maxlen:]:
+                self.history.append(self._record(line))
+
+    def _check_rotation(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self._file is None:
+            self._open()
+        elif st.st_ino != self._inode:
+            # 已轮转：读完旧文件剩余的内容，先打开新文件，再补读两次检查之间轮转出的中间文件
+            self._read()
+            old_mtime = os.fstat(self._file.fileno()).st_mtime
+            skip = {self._inode}
+            self._file.close()
+            self._open()
+            current = self._file
+            new_mtime = float('inf')
+            if current is not None:
+                skip.add(self._inode)
+                new_mtime = os.fstat(current.fileno()).st_mtime
+            for path in self._rotated_between(old_mtime, new_mtime, skip):
+                with open(path, 'r', errors='replace') as self._file:
+                    self._partial = ''
+                    self._read()
+            self._file = current
+            self._partial = ''
+            self._read()
+        elif st.st_size < self._file.tell():
+            # 文件被截断
+            self._file.seek(0)
+            self._partial = ''
+
+    def _rotated_between(self, start, end, skip):
+        """修改时间在 [start, end] 之间的 loguru 轮转文件（如 strategy.2024-01-01_12-00-00_000000.log），按时间排序"""
+        directory, name = os.path.split(os.path.abspath(self.path))
+        stem, ext = os.path.splitext(name)
+        rotated = []
+        for entry in os.scandir(directory):
+            if entry.name == name or not (entry.name.startswith(stem + '.') and entry.name.endswith(ext)):
+                continue
+            st = entry.stat()
+            if st.st_ino not in skip and start <= st.st_mtime <= end:
+                rotated.append((st.st_mtime, entry.path))
+        return [path for _, path in sorted(rotated)]
+
+    def _read(self):
+        if self._file is None:
+            return
+        data = self._file.read()
+        if not data:
+            return
+        lines = (self._partial + data).split('\n')
+        self._partial = lines.pop()  # 最后一段还没写完整
+        records = [self._record(line) for line in lines if line]
+        with self._lock:
+            self.history.extend(records)
+            subscribers = list(self._subscribers)
+        for record in records:
+            for subscription in subscribers:
+                subscription.offer(record)
+
+    def _record(self, line):
+        match = HEADER.match(line)
+        if match:
+            level, module, tag = match.groups()
+            tags = {self.source, module}
+            if tag:
+                tags.add(tag)
+            self._context = (LEVELS.get(level, 0), frozenset(tags))
+        return (*self._context, line)
+
+
+class LogHub:
+    """按来源管理共享的日志跟踪线程，第一个订阅者出现时启动"""
+
+    def __init__(self, sources, poll_interval=1.0):
+        self.sources = dict(sources)  # 来源名 -> 日志文件
+        self.poll_interval = poll_interval
+        self._tailers = {}
+        self._lock = threading.Lock()
+
+    def tailer(self, source):
+        with self._lock:
+            tailer = self._tailers.get(source)
+            if tailer is None:
+                tailer = self._tailers[source] = LogTailer(self.sources[source], source,
+                                                           self.poll_interval).start()
+            return tailer
+
+    def subscribe(self, sources=None, level=None, strategy=None, backlog=0, queue_size=1000):
+        """订阅一个或多个来源，返回 Subscription"""
+        subscription = Subscription(level, strategy, queue_size)
+        subscription.sources = [source for source in (sources or self.sources) if source in self.sources]
+        for source in subscription.sources:
+            self.tailer(source).subscribe(subscription, backlog)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for source in subscription.sources:
+            self.tailer(source).unsubscribe(subscription)
@@ -1,38 +1,66 @@
-import ccxt
 import time
+_started = time.perf_counter()  # 进程启动时间，用于统计首次检测耗时
+
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import toml
 from loguru import logger
-import requests
-import pandas_ta as ta  # 导入 pandas_ta 库
-
-# 配置loguru日志记录
-logger.add("strategy.log", rotation="500MB", retention=3, level="INFO")
-logger.add(lambda msg: send_feishu_notification(msg), level="CRITICAL")
-
-# 加载配置文件
-config = toml.load('config.toml')
-okx_config = config['okx']
-feishu_config = config['feishu']
-trading_config = config['trading']
-
-# 获取飞书 Webhook URL
-FEISHU_WEBHOOK = feishu_config['webhook_url']
-
-# 获取交易对、杠杆倍数和合约张数
-symbol = trading_config['symbol'] + ':USDT'  # 永续合约交易对，例如 BTC/USDT:USDT
-leverage = trading_config['leverage']
-contract_amount = trading_config['contract_amount']
-
-# 初始化交易所实例
-exchange = ccxt.okx({
-    'apiKey': okx_config['api_key'],
-    'secret': okx_config['api_secret'],
-    'password': okx_config['passphrase'],
-})
-
-# 设置杠杆倍数
-exchange.set_leverage(leverage, symbol)
+from indicators import StreamingSMA
+from bar_buffer import BarBuffer, OHLCV_FIELDS
+from bar_clock import BarCloseScheduler
+from notifier import FeishuNotifier
+from bar_store import BarStore, fetch_with_store
+from control import ControlChannel
+from metrics import StageTimer, instrument
+from tracing import span
+from log_tailer import strategy_format
+
+# 以下配置和实例在 setup() 中初始化，导入模块时不做任何 I/O
+config = okx_config = feishu_config = trading_config = None
+notifier = None  # 飞书后台通知
+symbol = leverage = contract_amount = None
+market_data = 'rest'  # 行情来源：rest 轮询或 websocket 推送
+schedule = 'poll'  # 检测节奏：poll 每5秒，bar_close 每根K线收盘时
+account_stream = False  # 持仓由私有频道推送维护，不再每次 REST 查询
+bar_store = ''  # 本地K线存储目录，为空时不使用
+exchange = None  # 交易所实例
+
+
+def setup(config_path='config.toml'):
+    """注册日志、加载配置并创建交易所实例"""
+    global config, okx_config, feishu_config, trading_config, notifier, symbol, leverage, contract_amount
+    global market_data, schedule, account_stream, bar_store, exchange
+    import ccxt  # 延迟导入，导入本模块时不加载 ccxt
+
+    # 配置loguru日志记录
+    logger.add("strategy.log", rotation="500MB", retention=3, level="INFO", format=strategy_format('ma60'))
+    # 飞书通知只有这一条发送路径：需要通知的内容用 logger.critical 完整记录一次
+    logger.add(lambda msg: send_feishu_notification(msg.record['message']), level="CRITICAL")
+
+    # 加载配置文件
+    config = toml.load(config_path)
+    okx_config = config['okx']
+    feishu_config = config['feishu']
+    trading_config = config['trading']
+
+    # 获取飞书 Webhook URL
+    notifier = FeishuNotifier(feishu_config['webhook_url']).start()  # 后台发送，重复消息去重
+
+    # 获取交易对、杠杆倍数和合约张数
+    symbol = trading_config['symbol'] + ':USDT'  # 永续合约交易对，例如 BTC/USDT:USDT
+    leverage = trading_config['leverage']
+    contract_amount = trading_config['contract_amount']
+    market_data = trading_config.get('market_data', 'rest')
+    schedule = trading_config.get('schedule', 'poll')
+    account_stream = trading_config.get('account_stream', False)
+    bar_store = trading_config.get('bar_store', '')
+
+    # 初始化交易所实例（杠杆在 main 中与其他启动请求并发设置）
+    exchange = instrument(ccxt.okx({  # 交易所接口计时，供 /metrics 使用
+        'apiKey': okx_config['api_key'],
+        'secret': okx_config['api_secret'],
+        'password': okx_config['passphrase'],
+    }))
 
 # 定义时间间隔
 interval = '5m'
@@ -41,6 +69,12 @@ limit = 200  # 获取最近200根K线
 # 全局变量
 long_position = None  # 当前多单持仓状态
 short_position = None  # 当前空单持仓状态
+ma_engine = StreamingSMA(window=60)  # MA60 增量计算
+feed = None  # WebSocket 行情推送（websocket 模式）
+bar_confirmed = False  # 最后一根K线已收盘定稿，之后的成交价属于下一根K线，不再写入
+scheduler = None  # K线收盘对齐调度器（bar_close 模式）
+account = None  # 账户持仓和挂单缓存（account_stream 模式）
+control = None  # 控制通道，接收 start/stop/flatten 命令
 
 def fetch_usdt_balance():
     """获取账户 USDT 余额"""
@@ -56,25 +90,18 @@ def fetch_usdt_balance():
         return None
 
 def send_feishu_notification(message):
-    """发送飞书通知"""
-    headers = {
-        "Content-Type": "application/json"
-    }
-    data = {
-        "msg_type": "text",
-        "content": {
-            "title": "交易通知",
-            "text": message
-        }
-    }
-    response = requests.post(FEISHU_WEBHOOK, headers=headers, json=data)
-    if response.status_code != 200:
-        logger.error(f"Failed to send notification to Feishu: {response.text}")
+    """发送飞书通知（放入后台队列，不阻塞交易流程）"""
+    if not notifier.send(message):
+        logger.warning("Feishu notification queue is full, message dropped")
 
 def fetch_historical_klines(symbol, interval, limit):
     """获取历史K线数据"""
     logger.info(f"Fetching historical K-lines for {symbol} with interval {interval}...")
-    klines = exchange.fetch_ohlcv(symbol, interval, limit=limit)
+    if bar_store:
+        # 从本地存储读取，只获取缺失的尾部
+        klines = fetch_with_store(exchange, BarStore(bar_store), symbol, interval, limit)
+    else:
+        klines = exchange.fetch_ohlcv(symbol, interval, limit=limit)
     df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
     df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms', utc=True).dt.tz_convert('Asia/Shanghai')
     df.set_index('timestamp', inplace=True)
@@ -84,6 +111,7 @@ def fetch_historical_klines(symbol, interval, limit):
 def calculate_ma(df, window=60):
     """计算MA60"""
     logger.info(f"Calculating MA{window}...")
+    import pandas_ta as ta  # 延迟导入，只在计算初始均线时需要
     df[f'MA{window}'] = ta.sma(df['close'], length=window)  # 使用 pandas_ta 计算 SMA
     logger.info(f"MA{window} calculated for {len(df)} K-lines.")
     return df
@@ -103,7 +131,11 @@ def calculate_stop_loss(entry_price, stop_loss_points=3000, posSide='long'):
         return entry_price + stop_loss_points
 
 def fetch_open_positions(symbol):
-    """获取当前持仓"""
+    """获取当前持仓（account_stream 模式下直接读取缓存）"""
+    if account is not None:
+        long_pos, short_pos = account.position_sides(exchange.market_id(symbol))
+        logger.info(f"Current positions - Long: {long_pos}, Short: {short_pos}")
+        return long_pos, short_pos
     logger.info(f"Fetching open positions for {symbol}...")
     positions = exchange.fetch_positions([symbol])
     long_pos = None
@@ -118,7 +150,11 @@ def fetch_open_positions(symbol):
     return long_pos, short_pos
 
 def get_current_price(symbol):
-    """获取当前价格"""
+    """获取当前价格（WebSocket 模式下优先使用推送的最新价）"""
+    if feed is not None:
+        price = feed.fresh_price()
+        if price is not None:
+            return price
     ticker = exchange.fetch_ticker(symbol)
     return float(ticker['last'])
 
@@ -165,135 +201,227 @@ def place_market_order(symbol, side, amount, leverage=10, posSide='long'):
     logger.info(f"Placed {side} {order_type} order: {order}")
     return order['id']
 
-def update_klines(df, symbol, interval):
-    """更新K线数据并重新计算MA60"""
+def flatten_positions():
+    """撤销挂单并市价平掉全部持仓（控制通道 flatten 命令），返回平掉的持仓"""
+    for order in exchange.fetch_open_orders(symbol):
+        exchange.cancel_order(order['id'], symbol)
+        logger.info(f"Cancelled order: {order['id']}")
+    closed = []
+    for pos in exchange.fetch_positions([symbol]):
+        contracts = float(pos['contracts'] or 0)
+        if pos['symbol'] == symbol and contracts > 0:
+            side = 'sell' if pos['side'] == 'long' else 'buy'
+            order = exchange.create_market_order(symbol, side, contracts, {'posSide': pos['side'], 'reduceOnly': True})
+            logger.info(f"Flattened {pos['side']} position of {contracts} contracts: {order['id']}")
+            closed.append({'side': pos['side'], 'contracts': contracts})
+    return closed
+
+def apply_kline(bars, kline):
+    """写入一根K线：新K线追加，同一根K线原地更新；返回是否追加了新K线"""
+    timestamp, open_, high, low, close, volume = kline[:6]
+    if timestamp > bars.last_timestamp:
+        ma_engine.append(close)
+        bars.append(timestamp, [open_, high, low, close, volume, ma_engine.value])
+        return True
+    if timestamp == bars.last_timestamp:
+        ma_engine.revise(close)
+        bars.update_last(open=open_, high=high, low=low, close=close, volume=volume, MA60=ma_engine.value)
+    return False
+
+def apply_price(bars, current_price):
+    """用最新成交价更新最后一根K线"""
+    high = max(bars['high'][-1], current_price)
+    low = min(bars['low'][-1], current_price)
+    ma_engine.revise(current_price)
+    bars.update_last(close=current_price, high=high, low=low, MA60=ma_engine.value)
+
+def update_klines(bars, symbol, interval):
+    """更新K线数据并增量更新MA60"""
     global long_position, short_position
 
     logger.info("Fetching latest K-line...")
     new_klines = exchange.fetch_ohlcv(symbol, interval, limit=1)
     current_price = get_current_price(symbol)
-    if new_klines and new_klines[-1][0] > df.index[-1].timestamp() * 1000:
-        # 添加新的 K 线
-        new_df = pd.DataFrame(new_klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        new_df['timestamp'] = pd.to_datetime(new_df['timestamp'], unit='ms', utc=True).dt.tz_convert('Asia/Shanghai')
-        new_df.set_index('timestamp', inplace=True)
-        df = pd.concat([df, new_df])
-        df = df[~df.index.duplicated(keep='last')]
-    else:
-        # 更新最后一根 K 线
-        df.iloc[-1, df.columns.get_loc('close')] = current_price
-        df.iloc[-1, df.columns.get_loc('high')] = max(df.iloc[-1]['high'], current_price)
-        df.iloc[-1, df.columns.get_loc('low')] = min(df.iloc[-1]['low'], current_price)
-
-    # 重新计算MA60
-    df = calculate_ma(df, window=60)
-
-    return df
+    with span('indicator'):
+        if new_klines and new_klines[-1][0] > bars.last_timestamp:
+            # 添加新的 K 线，缓冲区满时覆盖最旧的一根
+            apply_kline(bars, new_klines[-1])
+        else:
+            # 原地更新最后一根 K 线
+            apply_price(bars, current_price)
+
+    return bars
+
+def apply_market_events(bars, symbol, interval, timeout=5):
+    """应用 WebSocket 推送，直到出现新K线、收到控制命令或等待满 timeout 秒"""
+    global bar_confirmed
+    deadline = time.time() + timeout
+    new_bar = woken = False
+    while not new_bar and not woken:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        for event in feed.drain(remaining):
+            if event[0] == 'candle':
+                new_bar = apply_kline(bars, event[1]) or new_bar
+                if event[1][0] == bars.last_timestamp:
+                    bar_confirmed = event[2]
+            elif event[0] == 'ticker':
+                # 收盘定稿后、下一根K线推送前的成交价不能改写已收盘的K线
+                if not bar_confirmed:
+                    apply_price(bars, event[1])
+            elif event[0] == 'gap' and event[1] is not None:
+                # 重连后用 REST 补齐断线期间的K线
+                logger.info(f"Backfilling K-lines since {event[1]}...")
+                for kline in exchange.fetch_ohlcv(symbol, interval, since=event[1]):
+                    new_bar = apply_kline(bars, kline) or new_bar
+                bar_confirmed = False  # REST 返回的最后一根K线未收盘
+            elif event[0] == 'wakeup':
+                woken = True  # 控制命令，回到主循环处理
+    return bars
+
+def confirm_closed_bars(bars, symbol, interval, close_ts, retries=5):
+    """确认刚收盘的K线已定稿：新K线出现后写入从最后一根K线开始的全部数据"""
+    for _ in range(retries):
+        klines = exchange.fetch_ohlcv(symbol, interval, since=bars.last_timestamp)
+        if klines and klines[-1][0] >= close_ts:
+            for kline in klines:
+                apply_kline(bars, kline)
+            return True
+        time.sleep(0.5)
+    logger.warning(f"K-line closing at {close_ts} not confirmed by exchange")
+    return False
 
 def main():
-    global long_position, short_position
-    # 获取当前 USDT 余额
-    usdt_balance = fetch_usdt_balance()
+    global long_position, short_position, feed, scheduler, account, control
+    setup()
+
+    # 启动时的网络请求并发执行：设置杠杆、查询余额、获取历史K线，同时预先导入 pandas_ta
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        pool.submit(__import__, 'pandas_ta')
+        exchange.load_markets()  # 先加载一次市场信息，避免并发请求各自重复加载
+        leverage_done = pool.submit(exchange.set_leverage, leverage, symbol)
+        balance = pool.submit(fetch_usdt_balance)
+        history = pool.submit(fetch_historical_klines, symbol, interval, limit)
+        leverage_done.result()
+        usdt_balance = balance.result()
+        df = history.result()
 
     # 发送启动交易的飞书通知
     start_message = "### 交易策略启动\n时间: {}\n交易对: {}\n杠杆倍数: {}\n合约张数: {}\n当前 USDT 余额: {}".format(
         pd.Timestamp.now(), symbol, leverage, contract_amount, usdt_balance
     )
-    logger.critical(start_message)
-    send_feishu_notification(start_message)
+    logger.critical(start_message)  # loguru sink 发送飞书通知
 
     # 初始化数据
-    df = fetch_historical_klines(symbol, interval, limit)
     df = calculate_ma(df, window=60)  # 计算 MA60
-
+    ma_engine.seed(df['close'])
+    bars = BarBuffer.from_frame(df, capacity=limit, fields=[*OHLCV_FIELDS, 'MA60'])
+
+    if market_data == 'websocket':
+        from ws_feed import OkxMarketFeed
+        feed = OkxMarketFeed(exchange.market_id(symbol), interval).start()
+    elif schedule == 'bar_close':
+        scheduler = BarCloseScheduler(exchange.parse_timeframe(interval) * 1000, exchange.fetch_time)
+    if account_stream:
+        from account_cache import AccountCache
+        account = AccountCache(okx_config['api_key'], okx_config['api_secret'], okx_config['passphrase']).start()
+    control = ControlChannel('ma60_new').start()
+    if feed is not None:
+        control.on_command(feed.interrupt)
+
+    first_evaluation = True
+    stages = StageTimer()  # 各阶段耗时，供 /metrics 使用
     while True:
         try:
-            # 读取控制信号
-            with open('control_signal.txt', 'r') as f:
-                signal = f.read().strip()
-
-            if signal == 'stop':
-                stop_message = "### 交易策略停止\n时间: {}\n状态: 收到停止信号".format(pd.Timestamp.now())
-                logger.critical(stop_message)
-                send_feishu_notification(stop_message)
-                while True:
-                    with open('control_signal.txt', 'r') as f:
-                        signal = f.read().strip()
-                    if signal == 'start':
-                        start_message = "### 交易策略恢复运行\n时间: {}\n状态: 收到开始信号".format(pd.Timestamp.now())
-                        logger.critical(start_message)
-                        send_feishu_notification(start_message)
-                        break  # 退出等待状态，继续交易逻辑
-                    time.sleep(2)  # 每隔5秒检查一次信号
-
-            # 如果读到开始信号，则继续交易
-            if signal == 'start':
-                # 更新K线数据
-                df = update_klines(df, symbol, interval)
-
-                # 获取前一根和当前根K线
-                prev_kline = df.iloc[-3]
-                current_kline = df.iloc[-2]
-
-                # 获取当前持仓
-                long_position, short_position = fetch_open_positions(symbol)
-
-                # 打印当前K线和MA60的值
-                logger.info(f"Current K-line: Open={current_kline['open']}, High={current_kline['high']}, Low={current_kline['low']}, Close={current_kline['close']}")
-                logger.info(f"Current MA60: {df['MA60'].iloc[-1]}")
-
-                # 只有在没有持仓时才检测开单条件
-                if long_position is None and short_position is None:
-                    # 开多单条件：K线上穿MA60，收盘价在MA60以上
-                    if (current_kline['low'] >= df['MA60'].iloc[-2] and
-                        current_kline['close'] > df['MA60'].iloc[-2] and
-                        prev_kline['low'] <= df['MA60'].iloc[-3]):
-                        # 获取当前价格
-                        current_price = get_current_price(symbol)
-                        message = f"### 开多单\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {contract_amount}张"
-                        logger.critical(message)
-
-                        # 详细日志记录开单条件
-                        condition_message = (
-                            f"开多单条件满足，详细条件如下：\n"
-                            f"前一根K线收盘价: {prev_kline['close']} < MA60: {df['MA60'].iloc[-2]}\n"
-                            f"当前K线收盘价: {current_kline['close']} > MA60: {df['MA60'].iloc[-1]}\n"
-                            f"前一根K线信息: 开盘价={prev_kline['open']}, 最高价={prev_kline['high']}, 最低价={prev_kline['low']}, 收盘价={prev_kline['close']}"
-                        )
-                        logger.info(condition_message)
-
-                        # 发送飞书通知
-                        send_feishu_notification(f"{message}\n\n{condition_message}")
-
-                        # 下限价单并设置止盈止损
-                        place_order_with_tp_sl(symbol, 'buy', contract_amount, current_price, leverage, posSide='long')
-                        long_position = 'long'
-
-                    # 开空单条件：K线跌破MA60
-                    elif (current_kline['close'] < df['MA60'].iloc[-2] and
-                          current_kline['high'] < df['MA60'].iloc[-2] and
-                          prev_kline['high'] >= df['MA60'].iloc[-3]):
-                        # 获取当前价格
-                        current_price = get_current_price(symbol)
-                        message = f"### 开空单\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {contract_amount}张"
-                        logger.critical(message)
-
-                        # 详细日志记录开单条件
-                        condition_message = (
-                            f"开空单条件满足，详细条件如下：\n"
-                            f"前一根K线收盘价: {prev_kline['close']} > MA60: {df['MA60'].iloc[-2]}\n"
-                            f"当前K线收盘价: {current_kline['close']} < MA60: {df['MA60'].iloc[-1]}\n"
-                            f"前一根K线信息: 开盘价={prev_kline['open']}, 最高价={prev_kline['high']}, 最低价={prev_kline['low']}, 收盘价={prev_kline['close']}"
-                        )
-                        logger.info(condition_message)
-
-                        # 发送飞书通知
-                        send_feishu_notification(f"{message}\n\n{condition_message}")
-
-                        # 下限价单并设置止盈止损
-                        place_order_with_tp_sl(symbol, 'sell', contract_amount, current_price, leverage, posSide='short')
-                        short_position = 'short'
-            time.sleep(5)
+            # 执行控制通道的平仓请求；停止时等待命令，收到命令立即唤醒
+            control.process(flatten_positions)
+            if not control.is_running():
+                control.wait(5)
+                continue
+
+            # 更新K线数据：WebSocket 模式下等待推送，新K线出现时立即检测
+            # 等待推送或收盘的时间不计入耗时
+            if feed is not None:
+                bars = apply_market_events(bars, symbol, interval)
+                stages.start()
+            elif scheduler is not None:
+                # 收盘对齐模式：未到收盘时只检查控制信号，收盘后确认K线定稿再检测一次
+                if not scheduler.wait(max_wait=5, sleep=control.wait):
+                    continue
+                stages.start()
+                if not confirm_closed_bars(bars, symbol, interval, scheduler.last_close):
+                    continue
+            else:
+                stages.start()
+                bars = update_klines(bars, symbol, interval)
+            stages.mark('klines')
+
+            # 获取前一根和当前根K线
+            prev_kline = bars.row(-3)
+            current_kline = bars.row(-2)
+
+            # 获取当前持仓
+            long_position, short_position = fetch_open_positions(symbol)
+            stages.mark('positions')
+
+            # 打印当前K线和MA60的值
+            logger.info(f"Current K-line: Open={current_kline['open']}, High={current_kline['high']}, Low={current_kline['low']}, Close={current_kline['close']}")
+            logger.info(f"Current MA60: {bars['MA60'][-1]}")
+
+            if first_evaluation:
+                logger.info(f"Time to first evaluation: {time.perf_counter() - _started:.2f}s")
+                first_evaluation = False
+
+            # 只有在没有持仓且未收到停止命令时才检测开单条件
+            if long_position is None and short_position is None and control.is_running():
+                # 开多单条件：K线上穿MA60，收盘价在MA60以上
+                if (current_kline['low'] >= bars['MA60'][-2] and
+                    current_kline['close'] > bars['MA60'][-2] and
+                    prev_kline['low'] <= bars['MA60'][-3]):
+                    # 获取当前价格
+                    current_price = get_current_price(symbol)
+                    message = f"### 开多单\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {contract_amount}张"
+
+                    # 开单通知附带详细的开单条件
+                    condition_message = (
+                        f"开多单条件满足，详细条件如下：\n"
+                        f"前一根K线收盘价: {prev_kline['close']} < MA60: {bars['MA60'][-2]}\n"
+                        f"当前K线收盘价: {current_kline['close']} > MA60: {bars['MA60'][-1]}\n"
+                        f"前一根K线信息: 开盘价={prev_kline['open']}, 最高价={prev_kline['high']}, 最低价={prev_kline['low']}, 收盘价={prev_kline['close']}"
+                    )
+                    # CRITICAL 日志由 loguru sink 发送飞书通知
+                    logger.critical(f"{message}\n\n{condition_message}")
+
+                    # 下限价单并设置止盈止损
+                    place_order_with_tp_sl(symbol, 'buy', contract_amount, current_price, leverage, posSide='long')
+                    long_position = 'long'
+
+                # 开空单条件：K线跌破MA60
+                elif (current_kline['close'] < bars['MA60'][-2] and
+                      current_kline['high'] < bars['MA60'][-2] and
+                      prev_kline['high'] >= bars['MA60'][-3]):
+                    # 获取当前价格
+                    current_price = get_current_price(symbol)
+                    message = f"### 开空单\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {contract_amount}张"
+
+                    # 开单通知附带详细的开单条件
+                    condition_message = (
+                        f"开空单条件满足，详细条件如下：\n"
+                        f"前一根K线收盘价: {prev_kline['close']} > MA60: {bars['MA60'][-2]}\n"
+                        f"当前K线收盘价: {current_kline['close']} < MA60: {bars['MA60'][-1]}\n"
+                        f"前一根K线信息: 开盘价={prev_kline['open']}, 最高价={prev_kline['high']}, 最低价={prev_kline['low']}, 收盘价={prev_kline['close']}"
+                    )
+                    # CRITICAL 日志由 loguru sink 发送飞书通知
+                    logger.critical(f"{message}\n\n{condition_message}")
+
+                    # 下限价单并设置止盈止损
+                    place_order_with_tp_sl(symbol, 'sell', contract_amount, current_price, leverage, posSide='short')
+                    short_position = 'short'
+            stages.mark('signal')
+            stages.finish()
+            if feed is None and scheduler is None:
+                control.wait(5)
         except Exception as e:
             logger.error(f"An error occurred: {e}")
             time.sleep(5)
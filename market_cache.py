@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import time
+
+from loguru import logger
+
+
+def contract_specs(markets, symbols):
+    """提取交易币种的合约规格"""
+    return {
+        symbol: {
+            'id': markets[symbol]['id'],
+            'contractSize': markets[symbol].get('contractSize'),
+            'precision': markets[symbol].get('precision'),
+            'limits': markets[symbol].get('limits'),
+        }
+        for symbol in symbols
+    }
+
+
+class MarketCache:
+    """市场信息磁盘缓存
+
+    markets、交易币种列表和合约规格保存为 JSON，ttl 秒内重启直接读取，不再下载完整的 load_markets 响应。
+    后台每 check_interval 秒只拉取一次永续合约列表，发现上新/下架或缓存过期时才完整刷新。
+    """
+
+    def __init__(self, exchange, limiter, select, path='markets_cache.json', ttl=3600, check_interval=300,
+                 inst_type='SWAP'):
+        self.exchange = exchange
+        self.limiter = limiter
+        self.select = select  # markets -> 交易币种列表
+        self.path = path
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.inst_type = inst_type
+        self.symbols = []
+        self.specs = {}
+        self.saved_at = 0.0
+
+    async def load(self):
+        """返回交易币种列表：缓存未过期时从磁盘读取，否则下载并写入缓存"""
+        data = self._read()
+        if data is not None and time.time() - data['saved_at'] < self.ttl:
+            self.exchange.set_markets(data['markets'], data.get('currencies'))
+            self.symbols, self.specs, self.saved_at = data['symbols'], data['specs'], data['saved_at']
+            logger.info(f"Loaded {len(self.symbols)} symbols from market cache ({self.path})")
+            return self.symbols
+        return await self.refresh()
+
+    async def refresh(self):
+        """重新下载 markets 并更新缓存"""
+        markets = await self.limiter.call('market', self.exchange.load_markets, True)
+        self.symbols = self.select(markets)
+        self.specs = contract_specs(markets, self.symbols)
+        self.saved_at = time.time()
+        self._write({
+            'saved_at': self.saved_at,
+            'markets': markets,
+            'currencies': self.exchange.currencies,
+            'symbols': self.symbols,
+            'specs': self.specs,
+        })
+        logger.info(f"Refreshed markets: {len(self.symbols)} symbols")
+        return self.symbols
+
+    async def refresh_forever(self):
+        """后台定期检查合约列表，变化或过期时刷新；self.symbols 随之更新"""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                if time.time() - self.saved_at >= self.ttl or await self._listing_changed():
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Market refresh failed: {e}")
+
+    async def _listing_changed(self):
+        response = await self.limiter.call('market', self.exchange.public_get_public_instruments,
+                                           {'instType': self.inst_type})
+        live = {item['instId'] for item in response['data'] if item.get('state') == 'live'}
+        known = {market['id'] for market in self.exchange.markets.values()
+                 if market.get('type') == self.inst_type.lower() and market.get('active', True)}
+        return live != known
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable market cache {self.path}: {e}")
+            return None
+
+    def _write(self, data):
+        # 先写临时文件再替换，避免其他进程读到写了一半的缓存
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp, self.path)
@@ -0,0 +1,72 @@
+from loguru import logger
+
+from bar_store import closed_klines, missing_before
+from tracing import span
+
+
+class KlineLoader:
+    """获取K线并增量更新 EmaStore，首次或出现缺口时用深度历史预热"""
+
+    def __init__(self, exchange, limiter, ema_store, interval='5m', warmup_limit=1000, delta_limit=100, store=None):
+        self.exchange = exchange
+        self.limiter = limiter
+        self.ema_store = ema_store
+        self.interval = interval
+        self.warmup_limit = warmup_limit
+        self.delta_limit = delta_limit
+        self.store = store  # 本地K线存储，设置后只获取缺失的尾部
+
+    async def fetch_history(self, symbol, bars):
+        """分页获取较深的历史K线
+
+        有本地存储时从最后一根已保存K线之后开始获取；本地不足 bars 根时再从最早一根往前补齐。
+        """
+        interval_ms = self.exchange.parse_timeframe(self.interval) * 1000
+        now = self.exchange.milliseconds()
+        stored = self.store.load(symbol, self.interval, bars) if self.store is not None else []
+        since = stored[-1][0] + interval_ms if stored else now - bars * interval_ms
+        klines = await self._page(symbol, since, now, interval_ms)
+        if self.store is None:
+            return klines
+        older = []
+        older_range = missing_before(stored, klines, bars, interval_ms)
+        if older_range is not None:
+            older = [k for k in await self._page(symbol, *older_range, interval_ms) if k[0] <= older_range[1]]
+            self.store.prepend(symbol, self.interval, older)
+        self.store.append(symbol, self.interval, closed_klines(klines, interval_ms, now))
+        return (older + stored + klines)[-bars:]
+
+    async def _page(self, symbol, since, until, interval_ms):
+        """从 since 开始向后分页获取K线，直到 until（毫秒）或没有更多数据"""
+        klines = []
+        while since <= until:
+            batch = await self.limiter.call('market', self.exchange.fetch_ohlcv, symbol, self.interval,
+                                            since=since, limit=300)
+            batch = [k for k in batch if not klines or k[0] > klines[-1][0]]
+            if not batch:
+                break
+            klines.extend(batch)
+            since = batch[-1][0] + interval_ms
+        return klines
+
+    async def load(self, symbol, frame=True):
+        """返回带EMA列的 DataFrame（frame=False 时返回数组）"""
+        if self.ema_store.is_warm(symbol):
+            # 只获取最后一根已收盘K线之后的数据
+            since = self.ema_store.last_closed(symbol)
+            klines = await self.limiter.call('candles', self.exchange.fetch_ohlcv, symbol, self.interval,
+                                             since=since, limit=self.delta_limit)
+            if self.store is not None:
+                interval_ms = self.exchange.parse_timeframe(self.interval) * 1000
+                self.store.append(symbol, self.interval,
+                                  closed_klines(klines, interval_ms, self.exchange.milliseconds()))
+            if len(klines) < self.delta_limit:
+                with span('indicator', symbol=symbol):
+                    df = self.ema_store.update(symbol, klines, frame)
+                if df is not None:
+                    return df
+            self.ema_store.reset(symbol)
+            logger.warning(f"Gap detected in K-lines for {symbol}, warming up again")
+        klines = await self.fetch_history(symbol, self.warmup_limit)
+        with span('indicator', symbol=symbol, warm_up=True):
+            return self.ema_store.warm_up(symbol, klines, frame)
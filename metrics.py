@@ -0,0 +1,240 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+import tracing
+
+# 交易所接口耗时的桶（秒）
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 需要计时的交易所接口；create_market_buy_order 等内部调用 create_order，不单独计时
+EXCHANGE_METHODS = ('load_markets', 'fetch_time', 'fetch_balance', 'fetch_ohlcv', 'fetch_ticker', 'fetch_tickers',
+                    'fetch_positions', 'fetch_order', 'fetch_open_orders', 'create_order', 'cancel_order',
+                    'set_leverage')
+SYMBOL_METHODS = ('fetch_ohlcv', 'fetch_ticker', 'fetch_order', 'fetch_open_orders', 'create_order', 'cancel_order')
+
+
+class _Metric:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(labels), value] for labels, value in self._values.items()]
+        return {'type': self.type, 'help': self.help, 'labels': list(self.labelnames), 'samples': samples}
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """固定桶的直方图，每组标签保存各桶计数、总和和次数"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            samples = [[list(labels), [list(counts), total, count]]
+                       for labels, (counts, total, count) in self._values.items()]
+        return {'type': self.type, 'help': self.help, 'labels': list(self.labelnames), 'buckets': list(self.buckets),
+                'samples': samples}
+
+
+class Registry:
+    """进程内的指标集合，snapshot 通过控制通道发给 app.py"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+
+registry = Registry()
+exchange_latency = registry.register(Histogram(
+    'exchange_request_seconds', 'Latency of exchange API calls', ('method',)))
+exchange_errors = registry.register(Counter(
+    'exchange_errors_total', 'Exchange API calls that raised', ('method', 'error')))
+exchange_rate_limited = registry.register(Counter(
+    'exchange_rate_limited_total', 'Exchange API calls rejected by rate limiting (429/50011)', ('method',)))
+stage_latency = registry.register(Histogram(
+    'loop_stage_seconds', 'Duration of each main loop stage', ('stage',)))
+loop_latency = registry.register(Histogram(
+    'loop_iteration_seconds', 'Duration of a full main loop iteration, excluding the idle wait'))
+symbols_scanned = registry.register(Counter(
+    'symbols_scanned_total', 'Symbols evaluated by the scanner'))
+scan_rate = registry.register(Gauge(
+    'symbols_scanned_per_second', 'Symbols evaluated per second in the last scan'))
+
+
+def _errors():
+    try:
+        from ccxt.base.errors import RateLimitExceeded, DDoSProtection
+        return (RateLimitExceeded, DDoSProtection)
+    except ImportError:
+        return ()
+
+
+def _record_error(method, error, rate_limit_errors):
+    if isinstance(error, rate_limit_errors):
+        exchange_rate_limited.inc(method)
+    exchange_errors.inc(method, type(error).__name__)
+
+
+def _done(method, started, args):
+    end = time.perf_counter()
+    exchange_latency.observe(end - started, method)
+    if method in SYMBOL_METHODS and args:
+        # fetch_order/cancel_order 的第一个参数是订单号，其余是交易对
+        tracing.record(method, started, end, kind='exchange', arg=args[0])
+    else:
+        tracing.record(method, started, end, kind='exchange')
+
+
+def _wrap(method, func, rate_limit_errors):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                _record_error(method, e, rate_limit_errors)
+                raise
+            finally:
+                _done(method, started, args)
+    else:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                _record_error(method, e, rate_limit_errors)
+                raise
+            finally:
+                _done(method, started, args)
+    return timed
+
+
+def instrument(exchange, methods=EXCHANGE_METHODS):
+    """给交易所实例的接口方法加上计时和错误计数（同步和 async ccxt 都适用），返回同一个实例"""
+    rate_limit_errors = _errors()
+    for method in methods:
+        func = getattr(exchange, method, None)
+        if func is not None:
+            setattr(exchange, method, _wrap(method, func, rate_limit_errors))
+    return exchange
+
+
+class StageTimer:
+    """主循环分段计时：start 开始一轮，mark 记录距上次标记的耗时，finish 记录整轮耗时
+
+    每轮同时作为一个 Trace 记入 tracing.tracer，各阶段记为 span。
+    """
+
+    def __init__(self):
+        self._started = self._last = time.perf_counter()
+
+    def start(self):
+        tracing.tracer.begin()
+        self._started = self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        stage_latency.observe(elapsed, stage)
+        tracing.record(stage, self._last, now, kind='stage')
+        self._last = now
+        return elapsed
+
+    def finish(self):
+        loop_latency.observe(time.perf_counter() - self._started)
+        tracing.tracer.finish()
+
+
+def record_scan(count, elapsed):
+    """记录一轮扫描的币种数量和速度"""
+    symbols_scanned.inc(amount=count)
+    if elapsed > 0:
+        scan_rate.set(count / elapsed)
+
+
+def _labels(names, values, extra):
+    pairs = list(extra.items()) + list(zip(names, values))
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return '+Inf' if value == float('inf') else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """把各进程的 snapshot 渲染成 Prometheus 文本格式，snapshots 为 [(附加标签, snapshot)]"""
+    lines = []
+    names = []
+    for _, snapshot in snapshots:
+        names.extend(name for name in snapshot if name not in names)
+    for name in names:
+        header = False
+        for extra, snapshot in snapshots:
+            metric = snapshot.get(name)
+            if metric is None:
+                continue
+            if not header:
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                header = True
+            for values, value in metric['samples']:
+                if metric['type'] != 'histogram':
+                    lines.append(f"{name}{_labels(metric['labels'], values, extra)} {_number(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket in zip([*metric['buckets'], float('inf')], counts):
+                    cumulative += bucket
+                    labels = _labels([*metric['labels'], 'le'], [*values, _number(bound)], extra)
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _labels(metric['labels'], values, extra)
+                lines.append(f"{name}_sum{labels} {_number(total)}")
+                lines.append(f"{name}_count{labels} {count}")
+    return '\n'.join(lines) + '\n'
@@ -1,63 +1,102 @@
-import ccxt.async_support as ccxt
 import time
+_started = time.perf_counter()  # 进程启动时间，用于统计首次检测耗时
+
 import pandas as pd
 import toml
 from loguru import logger
-import requests
-import pandas_ta as ta
 import asyncio
-
-# 配置loguru日志记录
-logger.add("strategy_new_client.log", rotation="500MB", retention=3, level="INFO")
-logger.add(lambda msg: send_feishu_notification(msg), level="CRITICAL")
-
-# 加载配置文件
-config = toml.load('config_new_client.toml')
-okx_config = config['okx']
-feishu_config = config['feishu']
-trading_config = config['trading']
-
-def send_feishu_notification(message):
-    """Send a notification to Feishu (Lark) webhook."""
-    try:
-        headers = {
-            'Content-Type': 'application/json',
-        }
-        payload = {
-            "msg_type": "text",
-            "content": {
-                "text": message
-            }
-        }
-        response = requests.post(FEISHU_WEBHOOK, headers=headers, json=payload)
-        response.raise_for_status()
-        logger.info("Feishu notification sent successfully.")
-    except Exception as e:
-        logger.error(f"Failed to send Feishu notification: {e}")
-
-# 获取飞书 Webhook URL
-FEISHU_WEBHOOK = feishu_config['webhook_url']
-
-# 获取交易参数
-leverage = trading_config['leverage']
-contract_amount = trading_config['contract_amount']
-
-# 初始化交易所实例
-exchange = ccxt.okx({
-    'apiKey': okx_config['api_key'],
-    'secret': okx_config['api_secret'],
-    'password': okx_config['passphrase'],
-})
+from ema_store import EmaStore
+from signals import evaluate_entry
+from panel import SymbolPanel
+from rate_limit import RateLimiter
+from notifier import FeishuNotifier
+from market_loader import KlineLoader
+from shard import ShardPool
+from bar_store import BarStore
+from market_cache import MarketCache
+from control import ControlChannel
+from metrics import StageTimer, instrument, record_scan
+from tracing import span
 
 # 定义时间间隔和K线数量
 interval = '5m'
 limit = 200  # 减少K线数量
+warmup_limit = 1000  # 首次预热EMA使用的K线数量，保证EMA150收敛
+delta_limit = 100  # 增量获取的最大K线数量，返回数量达到上限时视为缺口重新预热
+
+# 以下配置和实例在 setup() 中初始化，导入模块时不做任何 I/O
+config = okx_config = feishu_config = trading_config = None
+notifier = None  # 飞书后台通知
+leverage = contract_amount = None
+panel_mode = False  # 面板模式：全部币种一次批量计算
+shards = 0  # 分片进程数，0 表示在本进程内扫描
+account_stream = False  # 用私有频道推送的持仓校正内存状态
+bar_store = ''  # 本地K线存储目录，为空时不使用
+markets_ttl = 3600  # 市场信息缓存有效期（秒）
+exchange = None  # 交易所实例
+ema_store = None  # 各币种EMA状态
+store = None  # 本地K线存储，启动时从本地读取历史K线
+loader = None  # 增量K线获取
+market_cache = None  # 市场信息磁盘缓存
 
 # 全局变量
 positions = {}  # 当前各币种持仓状态
 entry_prices = {}  # 记录开仓价格
 strategy_types = {}  # 记录开仓使用的策略类型
+limiter = None  # 所有交易所调用的限速调度器
+account = None  # 账户持仓和挂单缓存（account_stream 模式）
+control = None  # 控制通道，接收 start/stop/flatten 命令
+
+def setup(config_path='config_new_client.toml'):
+    """注册日志、加载配置并创建交易所实例"""
+    global config, okx_config, feishu_config, trading_config, notifier, leverage, contract_amount
+    global panel_mode, shards, account_stream, bar_store, markets_ttl, exchange, limiter, ema_store, store, loader
+    global market_cache
+    import ccxt.async_support as ccxt  # 延迟导入，导入本模块时不加载 ccxt
+
+    # 配置loguru日志记录
+    logger.add("strategy_new_client.log", rotation="500MB", retention=3, level="INFO")
+    # 飞书通知只有这一条发送路径：需要通知的内容用 logger.critical 完整记录一次
+    logger.add(lambda msg: send_feishu_notification(msg.record['message']), level="CRITICAL")
+
+    # 加载配置文件
+    config = toml.load(config_path)
+    okx_config = config['okx']
+    feishu_config = config['feishu']
+    trading_config = config['trading']
+
+    # 获取飞书 Webhook URL
+    notifier = FeishuNotifier(feishu_config['webhook_url']).start()  # 后台发送，重复消息去重
+
+    # 获取交易参数
+    leverage = trading_config['leverage']
+    contract_amount = trading_config['contract_amount']
+    panel_mode = trading_config.get('panel_mode', False)
+    shards = trading_config.get('shards', 0)
+    account_stream = trading_config.get('account_stream', False)
+    bar_store = trading_config.get('bar_store', '')
+    markets_ttl = trading_config.get('markets_ttl', 3600)
+
+    # 初始化交易所实例
+    exchange = instrument(ccxt.okx({  # 交易所接口计时，供 /metrics 使用
+        'apiKey': okx_config['api_key'],
+        'secret': okx_config['api_secret'],
+        'password': okx_config['passphrase'],
+        'enableRateLimit': False,  # 由 RateLimiter 按接口类别限速
+    }))
+    limiter = RateLimiter()
+    ema_store = EmaStore(keep=limit, interval_ms=exchange.parse_timeframe(interval) * 1000)
+    store = BarStore(bar_store) if bar_store else None
+    loader = KlineLoader(exchange, limiter, ema_store, interval, warmup_limit, delta_limit, store)
+    market_cache = MarketCache(exchange, limiter, select_symbols, 'markets_cache_new_client.json', markets_ttl)
+
+def send_feishu_notification(message):
+    """Queue a Feishu (Lark) notification without blocking the event loop."""
+    if not notifier.send(message):
+        logger.warning("Feishu notification queue is full, message dropped")
 
+# 以下逐行检查的开仓条件不再用于实盘（实盘使用 signals.evaluate_entry），
+# 保留作为 tests/test_signals.py 的对照实现和 bench.py 的基准线
 def check_original_entry_conditions(df):
     """检查原有的开仓条件"""
     try:
@@ -195,7 +234,7 @@ async def place_order_with_tp_sl(symbol, side, amount, entry_price, df, strategy
             }
 
         # 下单
-        order = await exchange.create_order(symbol, 'market', side, amount, None, params)
+        order = await limiter.call('trade', exchange.create_order, symbol, 'market', side, amount, None, params)
         logger.info(f"Placed {side} order for {symbol} with stop loss at {stop_loss_price}")
         return order['id']
     except Exception as e:
@@ -206,7 +245,7 @@ async def close_position(symbol, amount):
     """平仓"""
     try:
         params = {'posSide': 'long'}
-        order = await exchange.create_order(symbol, 'market', 'sell', amount, None, params)
+        order = await limiter.call('trade', exchange.create_order, symbol, 'market', 'sell', amount, None, params)
         logger.info(f"Closed position for {symbol}")
         return order['id']
     except Exception as e:
@@ -215,6 +254,7 @@ async def close_position(symbol, amount):
 
 def calculate_indicators(df):
     """计算各种均线指标"""
+    import pandas_ta as ta  # 延迟导入，只在此处使用
     # 计算EMA均线
     df['EMA5'] = ta.ema(df['close'], length=5)
     df['EMA10'] = ta.ema(df['close'], length=10)
@@ -226,9 +266,8 @@ def calculate_indicators(df):
 
 import re
 
-async def get_tradeable_symbols():
-    """获取所有可交易的永续合约交易对，并排除带有数字的交易对"""
-    markets = await exchange.load_markets()  # 使用 await 调用异步函数
+def select_symbols(markets):
+    """筛选所有可交易的永续合约交易对，并排除带有数字的交易对"""
     symbols = []
     
     # 正则表达式匹配带有数字的交易对（例如 BTC/USDT:USDT-250117）
@@ -241,74 +280,166 @@ async def get_tradeable_symbols():
     
     return symbols
 
+async def get_tradeable_symbols():
+    """获取所有可交易的永续合约交易对（缓存未过期时不下载 markets）"""
+    return list(await market_cache.load())
+
+def update_universe(symbols):
+    """应用后台刷新后的币种列表：新上线的加入，已下架且无持仓的移除"""
+    latest = set(market_cache.symbols)
+    current = set(symbols)
+    added = [s for s in market_cache.symbols if s not in current]
+    removed = [s for s in symbols if s not in latest and positions[s] is None]
+    if not added and not removed:
+        return symbols
+    for symbol in added:
+        positions[symbol] = None
+        entry_prices[symbol] = None
+        strategy_types[symbol] = None
+    for symbol in removed:
+        del positions[symbol], entry_prices[symbol], strategy_types[symbol]
+        ema_store.reset(symbol)
+    logger.info(f"Universe updated: added {added}, removed {removed}")
+    return [s for s in symbols if s not in removed] + added
+
+async def load_indicators(symbol, frame=True):
+    """获取K线并增量更新EMA，首次或出现缺口时用深度历史预热"""
+    return await loader.load(symbol, frame)
+
+STRATEGY_NAMES = {'original': '原策略', 'new': '新策略'}
+
+async def take_profit(symbol, current_price):
+    """止盈平仓"""
+    strategy = strategy_types[symbol]
+    # 发送止盈通知
+    message = f"### 止盈平仓\n币对: {symbol}\n策略: {strategy}\n时间: {pd.Timestamp.now()}\n入场价: {entry_prices[symbol]}\n当前价: {current_price}"
+    logger.critical(message)  # loguru sink 发送飞书通知
+
+    # 平仓
+    if await close_position(symbol, contract_amount):
+        positions[symbol] = None
+        entry_prices[symbol] = None
+        strategy_types[symbol] = None
+
+async def enter_long(symbol, strategy, df=None):
+    """按策略类型开多单"""
+    if not control.is_running():
+        # 扫描过程中收到停止命令，不再开仓
+        return
+    current_price = float((await limiter.call('market', exchange.fetch_ticker, symbol))['last'])
+
+    message = f"### 开多单({STRATEGY_NAMES[strategy]})\n币对: {symbol}\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {contract_amount}张"
+    logger.critical(message)  # loguru sink 发送飞书通知
+
+    order_id = await place_order_with_tp_sl(symbol, 'buy', contract_amount, current_price, df, strategy, leverage, 'long')
+    if order_id:
+        positions[symbol] = 'long'
+        entry_prices[symbol] = current_price
+        strategy_types[symbol] = strategy
+
+async def flatten_positions():
+    """市价平掉全部持仓（控制通道 flatten 命令），返回平掉的币种"""
+    closed = []
+    for symbol in [s for s, position in positions.items() if position == 'long']:
+        if await close_position(symbol, contract_amount):
+            positions[symbol] = None
+            entry_prices[symbol] = None
+            strategy_types[symbol] = None
+            closed.append(symbol)
+    return closed
+
 async def process_symbol(symbol):
     """处理单个交易对的逻辑"""
     try:
         # 获取K线数据
         logger.info(f"Fetching OHLCV data for {symbol}...")
-        klines = await exchange.fetch_ohlcv(symbol, interval, limit=limit)
+        df = await load_indicators(symbol)
         logger.info(f"Successfully fetched OHLCV data for {symbol}")
 
-        df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df.set_index('timestamp', inplace=True)
-
-        # 计算指标
-        df = calculate_indicators(df)
-
         current_position = positions[symbol]
         
         # 检查止盈条件
         if current_position == 'long':
-            strategy = strategy_types[symbol]
-            if check_take_profit_condition(df, entry_prices[symbol], strategy):
-                # 发送止盈通知
-                message = f"### 止盈平仓\n币对: {symbol}\n策略: {strategy}\n时间: {pd.Timestamp.now()}\n入场价: {entry_prices[symbol]}\n当前价: {df.iloc[-1]['close']}"
-                logger.critical(message)
-                send_feishu_notification(message)
-                
-                # 平仓
-                if await close_position(symbol, contract_amount):
-                    positions[symbol] = None
-                    entry_prices[symbol] = None
-                    strategy_types[symbol] = None
+            with span('signal', symbol=symbol):
+                hit = check_take_profit_condition(df, entry_prices[symbol], strategy_types[symbol])
+            if hit:
+                with span('order', symbol=symbol):
+                    await take_profit(symbol, df.iloc[-1]['close'])
         
-        # 检查开仓条件
+        # 检查开仓条件（先原策略，后新策略）
         elif current_position is None:
-            # 检查原策略条件
-            if check_original_entry_conditions(df):
-                current_price = float((await exchange.fetch_ticker(symbol))['last'])
-                
-                message = f"### 开多单(原策略)\n币对: {symbol}\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {contract_amount}张"
-                logger.critical(message)
-                send_feishu_notification(message)
-
-                order_id = await place_order_with_tp_sl(symbol, 'buy', contract_amount, current_price, df, 'original', leverage, 'long')
-                if order_id:
-                    positions[symbol] = 'long'
-                    entry_prices[symbol] = current_price
-                    strategy_types[symbol] = 'original'
-            
-            # 检查新策略条件
-            elif check_new_entry_conditions(df):
-                current_price = float((await exchange.fetch_ticker(symbol))['last'])
-                
-                message = f"### 开多单(新策略)\n币对: {symbol}\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {contract_amount}张"
-                logger.critical(message)
-                send_feishu_notification(message)
-
-                order_id = await place_order_with_tp_sl(symbol, 'buy', contract_amount, current_price, df, 'new', leverage, 'long')
-                if order_id:
-                    positions[symbol] = 'long'
-                    entry_prices[symbol] = current_price
-                    strategy_types[symbol] = 'new'
+            with span('signal', symbol=symbol):
+                strategy, misses = evaluate_entry(df)
+            logger.debug(f"Entry conditions for {symbol}: {strategy}, misses: {misses}")
+            if strategy is not None:
+                with span('order', symbol=symbol):
+                    await enter_long(symbol, strategy, df)
 
     except Exception as e:
         logger.error(f"Error processing {symbol}: {e}")
 
+async def scan_panel(symbols, panel):
+    """面板模式：先获取全部币种数据，再一次批量计算开仓和止盈条件"""
+    # 请求节奏由 limiter 控制
+    results = await asyncio.gather(*[load_indicators(symbol, frame=False) for symbol in symbols],
+                                   return_exceptions=True)
+    for symbol, rows in zip(symbols, results):
+        if isinstance(rows, Exception):
+            logger.error(f"Error processing {symbol}: {rows}")
+            panel.clear(symbol)
+        elif len(rows):
+            with span('indicator', symbol=symbol):
+                panel.load(symbol, rows)
+
+    holding = {s: entry_prices[s] for s in symbols if positions[s] == 'long'}
+    for symbol in panel.take_profit_hits(holding, strategy_types):
+        await take_profit(symbol, panel.last_close(symbol))
+
+    with span('signal'):
+        decisions = panel.evaluate_entries()
+    for symbol in symbols:
+        if positions[symbol] is None and symbol in decisions:
+            strategy, misses = decisions[symbol]
+            logger.debug(f"Entry conditions for {symbol}: {strategy}, misses: {misses}")
+            if strategy is not None:
+                try:
+                    await enter_long(symbol, strategy)
+                except Exception as e:
+                    logger.error(f"Error processing {symbol}: {e}")
+
+async def scan_shards(pool):
+    """分片模式：各分片进程获取数据并计算信号，本进程只负责下单和持仓状态"""
+    entries, hits = await pool.scan(entry_prices, strategy_types)
+    for symbol, current_price in hits:
+        if positions[symbol] == 'long':
+            await take_profit(symbol, current_price)
+
+    for symbol, (strategy, misses) in entries.items():
+        logger.debug(f"Entry conditions for {symbol}: {strategy}, misses: {misses}")
+        if positions[symbol] is None:
+            try:
+                await enter_long(symbol, strategy)
+            except Exception as e:
+                logger.error(f"Error processing {symbol}: {e}")
+
+def sync_positions(symbols):
+    """用账户缓存校正内存中的持仓状态，交易所侧止损/止盈成交后清除记录"""
+    for symbol in symbols:
+        long_pos, _ = account.position_sides(exchange.market_id(symbol))
+        if positions[symbol] == 'long' and long_pos is None:
+            logger.info(f"Position for {symbol} closed on exchange")
+            positions[symbol] = None
+            entry_prices[symbol] = None
+            strategy_types[symbol] = None
+        elif positions[symbol] is None and long_pos == 'long':
+            # 非本程序开的仓位只阻止重复开仓，不做止盈管理
+            logger.warning(f"Found untracked long position for {symbol}")
+            positions[symbol] = 'long'
+
 async def main():
-    global positions, entry_prices, strategy_types
-    
+    global positions, entry_prices, strategy_types, account, control
+    setup()
+
     symbols = await get_tradeable_symbols()  # 使用 await 调用异步函数
     logger.info(f"Trading on {len(symbols)} symbols")
     logger.info(f"Symbols: {symbols}")  # 打印所有币对的名字
@@ -319,30 +450,67 @@ async def main():
         entry_prices[symbol] = None
         strategy_types[symbol] = None
 
+    panel = SymbolPanel(symbols, bars=limit) if panel_mode else None
+    pool = None
+    if shards > 0:
+        # 分片直接使用已加载的市场信息，不再各自 load_markets
+        settings = {'interval': interval, 'limit': limit, 'warmup_limit': warmup_limit, 'delta_limit': delta_limit,
+                    'bar_store': bar_store, 'markets': exchange.markets, 'currencies': exchange.currencies}
+        pool = ShardPool(symbols, shards, settings).start()
+    if account_stream:
+        # 在分片进程 fork 之后再启动后台线程
+        from account_cache import AccountCache
+        account = AccountCache(okx_config['api_key'], okx_config['api_secret'], okx_config['passphrase']).start()
+
+    control = ControlChannel('new_client', 'control_signal_new_client.txt').start()
+    refresher = asyncio.create_task(market_cache.refresh_forever())  # 后台检查上新/下架
+    try:
+        await run_loop(symbols, panel, pool)
+    finally:
+        refresher.cancel()
+        await asyncio.gather(refresher, return_exceptions=True)
+
+
+async def run_loop(symbols, panel, pool):
+    """主循环：处理控制命令，更新币种列表后扫描全部交易对"""
+    first_evaluation = True
+    stages = StageTimer()  # 各阶段耗时，供 /metrics 使用
     while True:
         try:
-            # 读取控制信号
-            with open('control_signal_new_client.txt', 'r') as f:
-                signal = f.read().strip()
-
-            if signal == 'stop':
-                logger.critical("Strategy stopped by control signal")
-                while True:
-                    with open('control_signal_new_client.txt', 'r') as f:
-                        if f.read().strip() == 'start':
-                            break
-                    await asyncio.sleep(2)
+            # 执行控制通道的平仓请求；停止时等待命令，收到命令立即唤醒
+            await control.process_async(flatten_positions)
+            if not control.is_running():
+                await asyncio.to_thread(control.wait, 5)
                 continue
 
-            # 分批处理交易对
-            batch_size = 10
-            for i in range(0, len(symbols), batch_size):
-                batch_symbols = symbols[i:i + batch_size]
-                tasks = [process_symbol(symbol) for symbol in batch_symbols]
-                await asyncio.gather(*tasks)
-                await asyncio.sleep(1)  # 增加请求间隔
-
-            await asyncio.sleep(5)
+            stages.start()
+            updated = update_universe(symbols)
+            if updated is not symbols:
+                symbols = updated
+                if panel is not None:
+                    panel.resize(symbols)
+                if pool is not None:
+                    pool.resize(symbols, exchange.markets, exchange.currencies)
+
+            if account is not None:
+                sync_positions(symbols)
+            stages.mark('universe')
+
+            if pool is not None:
+                await scan_shards(pool)
+            elif panel is not None:
+                await scan_panel(symbols, panel)
+            else:
+                # 全部交易对并发处理，请求节奏由 limiter 控制
+                await asyncio.gather(*[process_symbol(symbol) for symbol in symbols])
+            record_scan(len(symbols), stages.mark('scan'))
+            stages.finish()
+
+            if first_evaluation:
+                logger.info(f"Time to first evaluation: {time.perf_counter() - _started:.2f}s")
+                first_evaluation = False
+
+            await asyncio.to_thread(control.wait, 5)
 
         except Exception as e:
             logger.error(f"Main loop error: {e}")
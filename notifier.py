@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+
+import requests
+from loguru import logger
+
+from tracing import span
+
+
+class FeishuNotifier:
+    """后台飞书通知
+
+    send 只把消息放入有界队列，不会阻塞交易流程；后台线程复用长连接会话发送，
+    dedup_window 秒内的重复消息只发一次，batch_window 秒内的突发消息合并为一条摘要。
+    """
+
+    def __init__(self, webhook_url, queue_size=1000, dedup_window=60, batch_window=1.0, max_batch=20, timeout=5):
+        self.webhook_url = webhook_url
+        self.dedup_window = dedup_window
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.dropped = 0  # 队列满时丢弃的消息数
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._recent = {}  # 消息 -> 最近一次发送时间
+        self._session = requests.Session()
+        self._thread = None
+
+    def start(self):
+        """启动后台发送线程"""
+        self._thread = threading.Thread(target=self._run, name='feishu-notifier', daemon=True)
+        self._thread.start()
+        return self
+
+    def send(self, message):
+        """非阻塞地提交一条消息，队列已满时丢弃并返回 False"""
+        with span('notify'):
+            try:
+                self._queue.put_nowait(message)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+    def close(self, timeout=5):
+        """发送完队列中的消息后停止"""
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = None in batch
+            messages = self._dedup([message for message in batch if message is not None])
+            if messages:
+                self._post(self._digest(messages))
+            if stop:
+                self._session.close()
+                return
+
+    def _collect(self):
+        """阻塞等待第一条消息，再在 batch_window 秒内收集突发消息"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while batch[-1] is not None and len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dedup(self, messages):
+        now = time.monotonic()
+        self._recent = {m: t for m, t in self._recent.items() if now - t < self.dedup_window}
+        unique = []
+        for message in messages:
+            if message not in self._recent:
+                self._recent[message] = now
+                unique.append(message)
+        return unique
+
+    @staticmethod
+    def _digest(messages):
+        if len(messages) == 1:
+            return messages[0]
+        return f"### 通知汇总（{len(messages)}条）\n\n" + "\n\n---\n\n".join(messages)
+
+    def _post(self, text):
+        payload = {
+            "msg_type": "text",
+            "content": {
+                "text": text
+            }
+        }
+        try:
+            response = self._session.post(self.webhook_url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Failed to send Feishu notification: {e}")
@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from loguru import logger
+
+FINAL_ORDER_STATES = ('filled', 'canceled', 'mmp_canceled')
+
+# ccxt 统一订单状态 -> OKX 订单状态
+CCXT_STATES = {'closed': 'filled', 'canceled': 'canceled', 'expired': 'canceled', 'rejected': 'canceled'}
+
+
+class OrderTracker:
+    """订单状态跟踪
+
+    由 AccountCache 的 orders 推送驱动，成交、部分成交、撤单在推送到达时立即返回；
+    超时仍无推送时用 REST 查询兜底。每笔成交记录从行情（tick）到成交的延迟。
+    """
+
+    def __init__(self, account, fetch_order, history=1000):
+        self.fetch_order = fetch_order
+        self.latencies = deque(maxlen=history)  # 最近的 tick 到成交延迟（毫秒）
+        self._updates = OrderedDict()  # ordId -> 最新推送，下单返回前到达的推送也会保留
+        self._history = history
+        self._condition = threading.Condition()
+        account.add_order_listener(self._on_order)
+
+    def wait(self, order_id, symbol, timeout=2, tick_time=None):
+        """等待订单成交或撤销，返回 {'state', 'filled', 'fill_time'}；超时返回当时的状态"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                item = self._updates.get(order_id)
+                if item is not None and item['state'] in FINAL_ORDER_STATES:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+        if item is None:
+            # 没有收到推送，用 REST 查询
+            status = self._fetch(order_id, symbol)
+        else:
+            status = self._status(item)
+        if status['fill_time'] and tick_time is not None:
+            latency = status['fill_time'] - tick_time * 1000
+            self.latencies.append(latency)
+            logger.info(f"Order {order_id} {status['state']}: tick-to-fill {latency:.0f} ms")
+        return status
+
+    def forget(self, order_id):
+        """不再跟踪该订单"""
+        with self._condition:
+            self._updates.pop(order_id, None)
+
+    def _on_order(self, item):
+        with self._condition:
+            self._updates[item['ordId']] = item
+            self._updates.move_to_end(item['ordId'])
+            while len(self._updates) > self._history:
+                self._updates.popitem(last=False)
+            self._condition.notify_all()
+
+    @staticmethod
+    def _status(item):
+        return {
+            'state': item['state'],
+            'filled': float(item.get('accFillSz') or 0),
+            'fill_time': int(item['fillTime']) if item.get('fillTime') else None,
+        }
+
+    def _fetch(self, order_id, symbol):
+        order = self.fetch_order(order_id, symbol)
+        filled = float(order.get('filled') or 0)
+        state = CCXT_STATES.get(order['status'], 'partially_filled' if filled else 'live')
+        fill_time = order['info'].get('fillTime')
+        return {'state': state, 'filled': filled, 'fill_time': int(fill_time) if fill_time else None}
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from ema_store import EMA_LENGTHS, OHLCV_COLUMNS
+from signals import LOOKBACK, evaluate_entry
+
+FIELDS = OHLCV_COLUMNS[1:] + [f'EMA{length}' for length in EMA_LENGTHS]
+ORIGINAL_CONDITIONS = ['condition1', 'condition2', 'condition3']
+NEW_CONDITIONS = ['bullish_alignment', 'unique_pattern', 'historical_below_ema150']
+
+
+class SymbolPanel:
+    """全部币种的 OHLCV 和 EMA 预分配为 (币种, K线, 字段) 数组，一次批量计算开仓和止盈条件"""
+
+    def __init__(self, symbols, bars=200):
+        self.bars = bars
+        self.symbols = []
+        self.index = {}
+        self.data = np.zeros((0, bars, len(FIELDS)))
+        self.lengths = np.zeros(0, dtype=int)  # 各币种实际K线数量，右对齐存放
+        self.resize(symbols)
+
+    def resize(self, symbols):
+        """调整币种列表，已有币种的数据保留"""
+        data = np.zeros((len(symbols), self.bars, len(FIELDS)))
+        lengths = np.zeros(len(symbols), dtype=int)
+        for row, symbol in enumerate(symbols):
+            old = self.index.get(symbol)
+            if old is not None:
+                data[row] = self.data[old]
+                lengths[row] = self.lengths[old]
+        self.symbols = list(symbols)
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self.data, self.lengths = data, lengths
+
+    def field(self, name):
+        """某个字段的 (币种, K线) 视图，不复制"""
+        return self.data[:, :, FIELDS.index(name)]
+
+    def load(self, symbol, rows):
+        """写入 EmaStore 输出的数组（首列为时间戳），只保留最近 bars 根"""
+        row = self.index[symbol]
+        rows = rows[-self.bars:, 1:]
+        count = len(rows)
+        self.data[row, :self.bars - count] = 0.0
+        self.data[row, self.bars - count:] = rows
+        self.lengths[row] = count
+
+    def clear(self, symbol):
+        """本轮数据获取失败时清空该币种，避免用旧数据判断"""
+        row = self.index[symbol]
+        self.data[row] = 0.0
+        self.lengths[row] = 0
+
+    def evaluate_entries(self):
+        """批量检查两套开仓条件，返回 {币种: (策略类型, 未满足的子条件)}，与 evaluate_entry 一致"""
+        full = self.lengths == self.bars
+        if self.bars < 2 * LOOKBACK + 1:
+            full[:] = False
+        decisions = {}
+        if full.any():
+            decisions.update(self._evaluate_full(np.flatnonzero(full)))
+        # K线不足的币种（新上线）逐个计算
+        for row in np.flatnonzero(~full & (self.lengths > 0)):
+            decisions[self.symbols[row]] = evaluate_entry(self._frame_view(row))
+        return decisions
+
+    def take_profit_hits(self, entry_prices, strategy_types):
+        """批量检查止盈条件，返回需要平仓的币种列表"""
+        rows = [self.index[s] for s, price in entry_prices.items()
+                if price and s in self.index and self.lengths[self.index[s]] > 0]
+        if not rows:
+            return []
+        rows = np.array(rows)
+        entry = np.array([entry_prices[self.symbols[r]] for r in rows], dtype=float)
+        is_original = np.array([strategy_types[self.symbols[r]] == 'original' for r in rows])
+        price = self.field('close')[rows, -1]
+        change = (price - entry) / entry
+        hit = np.where(is_original, change > 0.04,
+                       (change > 0.20) & (price < self.field('EMA5')[rows, -1]))
+        return [self.symbols[r] for r in rows[hit]]
+
+    def last_close(self, symbol):
+        """最新收盘价"""
+        return float(self.field('close')[self.index[symbol], -1])
+
+    def _frame_view(self, row):
+        count = self.lengths[row]
+        return pd.DataFrame(self.data[row, self.bars - count:], columns=FIELDS)
+
+    def _evaluate_full(self, rows):
+        o, h, l, c = (self.field(name)[rows] for name in ('open', 'high', 'low', 'close'))
+        e5, e10, e24, e50, e150 = (self.field(f'EMA{length}')[rows] for length in EMA_LENGTHS)
+        i = self.bars - 2
+
+        # 原策略
+        others = np.maximum.reduce([e5, e10, e24, e50])
+        lowest = np.minimum.reduce([e5[:, i], e10[:, i], e24[:, i], e50[:, i]])
+        lo = self.bars - LOOKBACK
+        original = [
+            (e150[:, i] > others[:, i]) & (h[:, i] < e150[:, i]),
+            (o[:, i] < lowest) & (c[:, i] > others[:, i]),
+            (e150[:, lo:i] > others[:, lo:i]).all(axis=1),
+        ]
+
+        # 新策略
+        start = i - 2 * (LOOKBACK - 1)
+        highs = np.fmax.reduce(sliding_window_view(c[:, start:i + 1], LOOKBACK, axis=1), axis=2)
+        span = slice(i - LOOKBACK + 1, i + 1)
+        pattern = (o[:, span] < e5[:, span]) & (c[:, span] == highs)
+        new = [
+            (e5[:, i] > e10[:, i]) & (e10[:, i] > e24[:, i]) & (e24[:, i] > e150[:, i]),
+            pattern[:, -1] & ~pattern[:, :-1].any(axis=1),
+            (l[:, span] < e150[:, span]).any(axis=1),
+        ]
+
+        original_miss = _first_miss(original, ORIGINAL_CONDITIONS)
+        new_miss = _first_miss(new, NEW_CONDITIONS)
+        decisions = {}
+        for k, row in enumerate(rows):
+            symbol = self.symbols[row]
+            if original_miss[k] is None:
+                decisions[symbol] = ('original', {'original': None})
+            elif new_miss[k] is None:
+                decisions[symbol] = ('new', {'original': original_miss[k], 'new': None})
+            else:
+                decisions[symbol] = (None, {'original': original_miss[k], 'new': new_miss[k]})
+        return decisions
+
+
+def _first_miss(conditions, names):
+    """每个币种第一个未满足的子条件名，全部满足为 None"""
+    return np.select([~cond for cond in conditions], names, default=None)
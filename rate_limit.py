@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from loguru import logger
+
+# OKX 公布的限速（请求数, 秒）：行情 20次/2s，K线 40次/2s，下单 60次/2s，账户 10次/2s
+OKX_RATE_LIMITS = {
+    'market': (20, 2.0),
+    'candles': (40, 2.0),
+    'trade': (60, 2.0),
+    'account': (10, 2.0),
+}
+
+
+class TokenBucket:
+    """令牌桶，触发限速后降低速率，成功请求后逐步恢复"""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.base_rate = capacity / period
+        self.rate = self.base_rate
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, weight=1):
+        """取得令牌，不足时按当前速率等待（先到先得）"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+    def penalize(self):
+        """收到限速错误：清空令牌并减半速率"""
+        self.tokens = 0.0
+        self.rate = max(self.rate / 2, self.base_rate / 8)
+
+    def reward(self):
+        """请求成功：速率逐步恢复到公布的上限"""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """按接口类别限速的请求调度器，所有交易所调用都经过 call"""
+
+    def __init__(self, limits=OKX_RATE_LIMITS, max_retries=3):
+        self.buckets = {category: TokenBucket(*limit) for category, limit in limits.items()}
+        self.max_retries = max_retries
+        self.rate_limited = 0  # 收到限速错误的次数
+        import ccxt.async_support as ccxt  # 延迟导入，导入本模块时不加载 ccxt
+        self._errors = (ccxt.RateLimitExceeded, ccxt.DDoSProtection)  # 429/50011
+
+    async def call(self, category, func, *args, **kwargs):
+        """按类别取得令牌后调用 func，遇到 429/50011 时退避重试"""
+        bucket = self.buckets[category]
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            try:
+                result = await func(*args, **kwargs)
+            except self._errors as e:
+                self.rate_limited += 1
+                bucket.penalize()
+                if attempt == self.max_retries:
+                    raise
+                delay = 2 ** attempt / bucket.rate
+                logger.warning(f"Rate limited on {category} ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            bucket.reward()
+            return result
@@ -0,0 +1,180 @@
+import asyncio
+import multiprocessing
+import queue
+import time
+import zlib
+
+from loguru import logger
+
+from bar_store import BarStore
+from ema_store import EmaStore
+from market_loader import KlineLoader
+from panel import SymbolPanel
+from rate_limit import OKX_RATE_LIMITS, RateLimiter
+
+
+def partition(symbols, shards):
+    """按币种名的稳定哈希把币种分到 shards 个分片"""
+    groups = [[] for _ in range(shards)]
+    for symbol in symbols:
+        groups[zlib.crc32(symbol.encode()) % shards].append(symbol)
+    return groups
+
+
+def run_shard(shard_id, symbols, settings, commands, results):
+    """分片进程入口：拥有自己的事件循环、交易所连接和指标状态"""
+    asyncio.run(_shard_loop(shard_id, symbols, settings, commands, results))
+
+
+async def _shard_loop(shard_id, symbols, settings, commands, results):
+    import ccxt.async_support as ccxt
+
+    # 分片只读取公共行情，不持有 API 密钥；限速按分片数平分
+    exchange = ccxt.okx({'enableRateLimit': False})
+    if settings.get('markets'):
+        # 使用协调器已加载（或从缓存读取）的市场信息，避免首次请求时在限速器之外 load_markets
+        exchange.set_markets(settings['markets'], settings.get('currencies'))
+    shards = settings['shards']
+    limiter = RateLimiter({category: (max(1, count // shards), period)
+                           for category, (count, period) in OKX_RATE_LIMITS.items()})
+    interval_ms = exchange.parse_timeframe(settings['interval']) * 1000
+    store = EmaStore(keep=settings['limit'], interval_ms=interval_ms)
+    bars = BarStore(settings['bar_store']) if settings.get('bar_store') else None
+    loader = KlineLoader(exchange, limiter, store, settings['interval'],
+                         settings['warmup_limit'], settings['delta_limit'], bars)
+    panel = SymbolPanel(symbols, bars=settings['limit'])
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            command = await loop.run_in_executor(None, commands.get)
+            if command is None:
+                break
+            round_id, holding, strategy_types, group, markets = command
+            if markets is not None:
+                # 协调器刷新了市场信息（上新/下架），新币种需要新的 markets 才能请求
+                exchange.set_markets(*markets)
+            if group != symbols:
+                # 币种列表变化（上新/下架）
+                for symbol in set(symbols) - set(group):
+                    store.reset(symbol)
+                symbols = group
+                panel.resize(symbols)
+            started = time.perf_counter()
+            rows = await asyncio.gather(*[loader.load(symbol, frame=False) for symbol in symbols],
+                                        return_exceptions=True)
+            errors = 0
+            for symbol, data in zip(symbols, rows):
+                if isinstance(data, Exception):
+                    logger.error(f"Error processing {symbol}: {data}")
+                    panel.clear(symbol)
+                    errors += 1
+                elif len(data):
+                    panel.load(symbol, data)
+            decisions = panel.evaluate_entries()
+            results.put({
+                'shard': shard_id,
+                'round': round_id,
+                'entries': {symbol: decision for symbol, decision in decisions.items()
+                            if decision[0] is not None and symbol not in holding},
+                'take_profit': [(symbol, panel.last_close(symbol))
+                                for symbol in panel.take_profit_hits(holding, strategy_types)],
+                'errors': errors,
+                'elapsed': time.perf_counter() - started,
+            })
+    finally:
+        await exchange.close()
+
+
+class ShardPool:
+    """协调器侧的分片进程池：每轮下发持仓状态，收集各分片的开仓和止盈信号
+
+    下单、持仓状态和通知都留在协调器进程中。分片进程退出时跳过它本轮的币种并重启，
+    超过 timeout 秒未返回的分片本轮也跳过，迟到的结果按轮次丢弃。
+    """
+
+    def __init__(self, symbols, shards, settings, timeout=120):
+        self.groups = partition(symbols, shards)
+        self.settings = dict(settings, shards=shards)
+        self.timeout = timeout
+        self._context = multiprocessing.get_context('fork')
+        self._results = self._context.Queue()
+        self._commands = []
+        self._processes = []
+        self._stale = []  # 需要随下一条命令收到新 markets 的分片
+        self._round = 0
+
+    def resize(self, symbols, markets=None, currencies=None):
+        """更新币种列表，下一轮扫描时各分片随命令收到新的分组（和刷新后的 markets）"""
+        self.groups = partition(symbols, len(self.groups))
+        if markets is not None:
+            # 重启的分片直接从 settings 取新 markets
+            self.settings['markets'], self.settings['currencies'] = markets, currencies
+            self._stale = [True] * len(self.groups)
+
+    def start(self):
+        """启动分片进程"""
+        for shard_id in range(len(self.groups)):
+            self._commands.append(None)
+            self._processes.append(None)
+            self._stale.append(False)
+            self._spawn(shard_id)
+        return self
+
+    def _spawn(self, shard_id):
+        # 每个进程使用新的命令队列，避免沿用已退出进程可能占着锁的旧队列
+        commands = self._context.Queue()
+        symbols = self.groups[shard_id]
+        process = self._context.Process(target=run_shard, name=f'shard-{shard_id}', daemon=True,
+                                        args=(shard_id, symbols, self.settings, commands, self._results))
+        process.start()
+        self._commands[shard_id] = commands
+        self._processes[shard_id] = process
+        self._stale[shard_id] = False
+        logger.info(f"Shard {shard_id} started with {len(symbols)} symbols (pid {process.pid})")
+
+    def _restart_dead(self, shard_ids):
+        """重启已退出的分片，返回重启的分片编号"""
+        dead = [shard_id for shard_id in shard_ids if not self._processes[shard_id].is_alive()]
+        for shard_id in dead:
+            logger.error(f"Shard {shard_id} exited (code {self._processes[shard_id].exitcode}), "
+                         f"skipping its {len(self.groups[shard_id])} symbols this round and restarting")
+            self._spawn(shard_id)
+        return dead
+
+    async def scan(self, entry_prices, strategy_types):
+        """所有分片完成一轮扫描，返回 (开仓信号, 止盈列表)"""
+        self._round += 1
+        self._restart_dead(range(len(self.groups)))
+        holding = {symbol: price for symbol, price in entry_prices.items() if price}
+        types = {symbol: strategy_types[symbol] for symbol in holding}
+        markets = (self.settings['markets'], self.settings.get('currencies'))
+        for shard_id, (commands, group) in enumerate(zip(self._commands, self.groups)):
+            commands.put((self._round, holding, types, group, markets if self._stale[shard_id] else None))
+            self._stale[shard_id] = False
+        loop = asyncio.get_running_loop()
+        entries, take_profit = {}, []
+        pending = set(range(len(self.groups)))
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            try:
+                result = await loop.run_in_executor(None, self._results.get, True, 1.0)
+            except queue.Empty:
+                pending -= set(self._restart_dead(pending))
+                if pending and time.monotonic() > deadline:
+                    logger.error(f"Shards {sorted(pending)} did not finish within {self.timeout}s, skipping them")
+                    break
+                continue
+            if result['round'] != self._round:
+                continue  # 上一轮超时分片的迟到结果
+            pending.discard(result['shard'])
+            entries.update(result['entries'])
+            take_profit.extend(result['take_profit'])
+            logger.info(f"Shard {result['shard']} scanned in {result['elapsed']:.3f}s ({result['errors']} errors)")
+        return entries, take_profit
+
+    def stop(self):
+        """停止全部分片进程"""
+        for commands in self._commands:
+            commands.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
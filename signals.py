@@ -0,0 +1,114 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+LOOKBACK = 53  # 唯一形态和历史EMA150检查使用的K线数量
+EMA_COLUMNS = ['EMA5', 'EMA10', 'EMA24', 'EMA50', 'EMA150']
+
+
+def rolling_max(values, window):
+    """滑动窗口最大值（忽略 NaN，与 pandas 的 max 一致）"""
+    return np.fmax.reduce(sliding_window_view(values, window), axis=1)
+
+
+def original_entry_miss(open_, high, close, ema5, ema10, ema24, ema50, ema150):
+    """原策略开仓条件，返回第一个未满足的子条件名，全部满足返回 None"""
+    n = len(close)
+    if n < 2:
+        return 'insufficient_bars'
+    i = n - 2
+    emas = (ema5[i], ema10[i], ema24[i], ema50[i])
+
+    # 条件1：EMA150大于其他所有均线和当前K线最高价
+    if not (all(ema150[i] > e for e in emas) and high[i] < ema150[i]):
+        return 'condition1'
+
+    # 条件2：开盘价小于最小EMA，收盘价大于最大EMA
+    if not (open_[i] < min(emas) and close[i] > max(emas)):
+        return 'condition2'
+
+    # 条件3：倒数第3到第53根K线EMA150都大于其他均线
+    if n < LOOKBACK:
+        return 'condition3'
+    lo, hi = n - LOOKBACK, n - 2
+    others = np.maximum.reduce([ema5[lo:hi], ema10[lo:hi], ema24[lo:hi], ema50[lo:hi]])
+    if not (ema150[lo:hi] > others).all():
+        return 'condition3'
+    return None
+
+
+def new_entry_miss(open_, low, close, ema5, ema10, ema24, ema150):
+    """新策略开仓条件，返回第一个未满足的子条件名，全部满足返回 None"""
+    n = len(close)
+    if n < 2:
+        return 'insufficient_bars'
+    if n < 2 * LOOKBACK + 1:
+        # K线不足时索引会回绕，按原逐行逻辑计算
+        return _new_entry_miss_short(open_, low, close, ema5, ema10, ema24, ema150)
+
+    i = n - 2
+    # 1. 均线多头排列
+    if not (ema5[i] > ema10[i] > ema24[i] > ema150[i]):
+        return 'bullish_alignment'
+
+    # 2&3. 当前K线是过去53根中唯一满足"开盘价低于EMA5且收盘价为53根新高"的K线
+    start = i - 2 * (LOOKBACK - 1)
+    highs = rolling_max(close[start:i + 1], LOOKBACK)  # highs[k] 对应第 i-52+k 根
+    span = slice(i - LOOKBACK + 1, i + 1)
+    pattern = (open_[span] < ema5[span]) & (close[span] == highs)
+    if not pattern[-1] or pattern[:-1].any():
+        return 'unique_pattern'
+
+    # 4. 过去53根K线出现过最低价小于EMA150
+    if not (low[span] < ema150[span]).any():
+        return 'historical_below_ema150'
+    return None
+
+
+def _new_entry_miss_short(open_, low, close, ema5, ema10, ema24, ema150):
+    n = len(close)
+
+    def row(i):
+        if not -n <= i < n:
+            raise IndexError(i)
+        return i
+
+    def window_high(i):
+        window = close[i - LOOKBACK + 1:i + 1]
+        return np.fmax.reduce(window) if len(window) else np.nan
+
+    def is_pattern(i):
+        return open_[i] < ema5[i] and close[i] == window_high(i)
+
+    i = n - 2
+    try:
+        bullish = ema5[i] > ema10[i] > ema24[i] > ema150[i]
+        unique = is_pattern(row(i)) and not any(
+            is_pattern(row(j)) for j in range(i - LOOKBACK + 1, i))
+        below = any(low[row(j)] < ema150[j] for j in range(i - LOOKBACK + 1, i + 1))
+    except IndexError:
+        return 'insufficient_bars'
+    if not bullish:
+        return 'bullish_alignment'
+    if not unique:
+        return 'unique_pattern'
+    if not below:
+        return 'historical_below_ema150'
+    return None
+
+
+def evaluate_entry(df):
+    """用原始数组一次性检查两套开仓条件
+
+    返回 (策略类型, 未满足的子条件)，策略类型为 'original'、'new' 或 None；
+    与 check_original_entry_conditions / check_new_entry_conditions 的判断完全一致。
+    """
+    open_, high, low, close = (df[col].to_numpy(dtype=float) for col in ('open', 'high', 'low', 'close'))
+    ema5, ema10, ema24, ema50, ema150 = (df[col].to_numpy(dtype=float) for col in EMA_COLUMNS)
+
+    misses = {'original': original_entry_miss(open_, high, close, ema5, ema10, ema24, ema50, ema150)}
+    if misses['original'] is None:
+        return 'original', misses
+    misses['new'] = new_entry_miss(open_, low, close, ema5, ema10, ema24, ema150)
+    if misses['new'] is None:
+        return 'new', misses
+    return None, misses
@@ -0,0 +1,282 @@
+import abc
+import asyncio
+import time
+
+import pandas as pd
+from loguru import logger
+
+import ma60
+import ma60_new
+import new_client
+from signals import evaluate_entry
+from strategy_host import Strategy
+
+
+class MaCrossStrategy(Strategy, abc.ABC):
+    """K线穿越均线开仓（ma60.py / ma60_new.py 的共同部分），无持仓时才检测开仓条件；子类实现 enter 下单"""
+
+    window = 25
+    bars = 200  # 保留的K线数量
+
+    def __init__(self, host, settings):
+        super().__init__(host, settings)
+        self.symbol = settings['symbol'] + ':USDT'  # 永续合约交易对，例如 BTC/USDT:USDT
+        self.series = None
+
+    def subscribe(self):
+        self.series = self.feed.subscribe(self.symbol, bars=self.bars, sma=(self.window,))
+
+    async def start(self):
+        await self.gateway.set_leverage(self.leverage, self.symbol)
+
+    async def on_tick(self):
+        if not self.series.ready:
+            return
+        bars = self.series.bars
+        ma = bars[f'MA{self.window}']
+        prev_kline = bars.row(-3)
+        current_kline = bars.row(-2)
+
+        long_pos, short_pos = await self.gateway.positions(self.symbol)
+        logger.info(f"[{self.name}] Current K-line: Open={current_kline['open']}, High={current_kline['high']}, "
+                    f"Low={current_kline['low']}, Close={current_kline['close']}, MA{self.window}: {ma[-1]}")
+        if long_pos is not None or short_pos is not None:
+            return
+
+        # 开多单条件：K线上穿均线，收盘价在均线以上
+        if (current_kline['low'] >= ma[-2] and
+                current_kline['close'] > ma[-2] and
+                prev_kline['low'] <= ma[-3]):
+            await self._open('long', current_kline, prev_kline, (
+                f"当前K线最低价: {current_kline['low']} >= MA{self.window}: {ma[-2]}\n"
+                f"当前K线收盘价: {current_kline['close']} > MA{self.window}: {ma[-2]}\n"
+                f"前一根K线最低价: {prev_kline['low']} <= MA{self.window}: {ma[-3]}\n"))
+
+        # 开空单条件：K线跌破均线
+        elif (current_kline['close'] < ma[-2] and
+              current_kline['high'] < ma[-2] and
+              prev_kline['high'] >= ma[-3]):
+            await self._open('short', current_kline, prev_kline, (
+                f"当前K线收盘价: {current_kline['close']} < MA{self.window}: {ma[-2]}\n"
+                f"当前K线最高价: {current_kline['high']} < MA{self.window}: {ma[-2]}\n"
+                f"前一根K线最高价: {prev_kline['high']} >= MA{self.window}: {ma[-3]}\n"))
+
+    async def flatten(self):
+        return await self.gateway.flatten(self.symbol)
+
+    async def _open(self, posSide, current_kline, prev_kline, conditions):
+        if not self.can_open():
+            return
+        tick_time = time.time()
+        current_price = await self.feed.price(self.symbol)
+        label = '开多单' if posSide == 'long' else '开空单'
+        message = (f"### {label}({self.name})\n时间: {pd.Timestamp.now()}\n价格: {current_price}\n"
+                   f"数量: {self.contract_amount}张")
+
+        # 开单通知附带详细的开单条件，CRITICAL 日志由 loguru sink 发送飞书通知
+        condition_message = (
+            f"{label}条件满足，详细条件如下：\n{conditions}"
+            f"前一根K线信息: 开盘价={prev_kline['open']}, 最高价={prev_kline['high']}, "
+            f"最低价={prev_kline['low']}, 收盘价={prev_kline['close']}"
+        )
+        logger.critical(f"{message}\n\n{condition_message}")
+        await self.enter('buy' if posSide == 'long' else 'sell', posSide, current_price, tick_time)
+
+    @abc.abstractmethod
+    async def enter(self, side, posSide, price, tick_time):
+        """开仓条件满足后下单"""
+
+
+class Ma25Strategy(MaCrossStrategy):
+    """ma60.py：MA25 穿越，限价开仓，止盈为固定点数，止损为过去144根K线的最低/最高价"""
+
+    name = 'ma25'
+    window = 25
+    stop_window = 144
+
+    def subscribe(self):
+        self.series = self.feed.subscribe(self.symbol, bars=self.bars, sma=(self.window,),
+                                          stops=(48, 96, 144, 288))
+
+    async def enter(self, side, posSide, price, tick_time):
+        # 开单前先确定止损和止盈价格
+        stop_loss_price = self.series.stops.price(self.stop_window, posSide)
+        take_profit_price = ma60.calculate_take_profit(price, posSide=posSide)
+
+        # 下限价单，未及时成交则转市价单
+        await self.gateway.fill_limit_order(self.symbol, side, self.contract_amount, price, self.leverage,
+                                            posSide=posSide, tick_time=tick_time)
+
+        # 设置止损和止盈（与 ma60.py 相同：止损单平仓并立即反向开单）
+        exit_side = 'sell' if side == 'buy' else 'buy'
+        await self.stop_loss_and_reverse(exit_side, stop_loss_price, posSide)
+        params = {'leverage': self.leverage, 'posSide': posSide}
+        await self.gateway.create_order(self.symbol, 'limit', exit_side, self.contract_amount, take_profit_price,
+                                        params)
+
+    async def stop_loss_and_reverse(self, side, stop_price, posSide):
+        """ma60.place_stop_loss_order：市价平仓后立即反向开单"""
+        logger.info(f"[{self.name}] Stop loss price: {stop_price}")
+        try:
+            await self.gateway.create_order(self.symbol, 'market', side, int(self.contract_amount), None,
+                                            {'leverage': self.leverage, 'posSide': posSide})
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed to close position: {e}")
+            return None
+        try:
+            reverse_side = 'buy' if side == 'sell' else 'sell'
+            reverse_posSide = 'short' if posSide == 'long' else 'long'
+            order = await self.gateway.create_order(self.symbol, 'market', reverse_side, int(self.contract_amount),
+                                                    None, {'leverage': self.leverage, 'posSide': reverse_posSide})
+            return order['id']
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed to place reverse order: {e}")
+            return None
+
+
+class Ma60Strategy(MaCrossStrategy):
+    """ma60_new.py：MA60 穿越，市价开仓并附带固定点数的止盈止损"""
+
+    name = 'ma60'
+    window = 60
+
+    async def enter(self, side, posSide, price, tick_time):
+        try:
+            await self.gateway.order_with_tp_sl(
+                self.symbol, side, self.contract_amount, price, self.leverage, posSide,
+                take_profit=ma60_new.calculate_take_profit(price, posSide=posSide),
+                stop_loss=ma60_new.calculate_stop_loss(price, posSide=posSide))
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed to place order with TP/SL: {e}")
+
+
+class ScannerStrategy(Strategy):
+    """new_client.py：全部USDT永续合约的两套EMA开仓条件，只做多"""
+
+    name = 'scanner'
+
+    def __init__(self, host, settings):
+        super().__init__(host, settings)
+        self.market_cache = host.market_cache
+        self.symbols = []
+        self.positions = {}  # 当前各币种持仓状态
+        self.entry_prices = {}  # 记录开仓价格
+        self.strategy_types = {}  # 记录开仓使用的策略类型
+        self._universe = None  # 最近一次应用的 market_cache.symbols
+
+    def subscribe(self):
+        self.update_universe()
+
+    def update_universe(self):
+        """应用后台刷新后的币种列表：新上线的加入，已下架且无持仓的移除"""
+        self._universe = latest = self.market_cache.symbols
+        current = set(self.symbols)
+        added = [s for s in latest if s not in current]
+        removed = [s for s in self.symbols if s not in set(latest) and self.positions[s] is None]
+        for symbol in added:
+            self.feed.subscribe(symbol, bars=new_client.limit, warmup=new_client.warmup_limit, emas=True)
+            self.positions[symbol] = None
+            self.entry_prices[symbol] = None
+            self.strategy_types[symbol] = None
+        for symbol in removed:
+            self.feed.unsubscribe(symbol)
+            del self.positions[symbol], self.entry_prices[symbol], self.strategy_types[symbol]
+        self.symbols = [s for s in self.symbols if s not in removed] + added
+        if self.symbols and (added or removed):
+            logger.info(f"[{self.name}] Universe: {len(self.symbols)} symbols, added {len(added)}, "
+                        f"removed {len(removed)}")
+
+    async def on_tick(self):
+        if self.market_cache.symbols is not self._universe:
+            # 新订阅的币种下一轮开始更新
+            self.update_universe()
+        if self.gateway.account is not None:
+            await self.sync_positions()
+        await asyncio.gather(*[self.process_symbol(symbol) for symbol in self.symbols])
+
+    async def sync_positions(self):
+        """用账户缓存校正内存中的持仓状态，交易所侧止损/止盈成交后清除记录"""
+        for symbol in self.symbols:
+            long_pos, _ = await self.gateway.positions(symbol)
+            if self.positions[symbol] == 'long' and long_pos is None:
+                logger.info(f"[{self.name}] Position for {symbol} closed on exchange")
+                self._clear(symbol)
+            elif self.positions[symbol] is None and long_pos == 'long':
+                # 非本策略开的仓位只阻止重复开仓，不做止盈管理
+                logger.warning(f"[{self.name}] Found untracked long position for {symbol}")
+                self.positions[symbol] = 'long'
+
+    async def process_symbol(self, symbol):
+        """处理单个交易对的逻辑"""
+        series = self.feed.series(symbol)
+        if not series.ready or series.frame is None:
+            return
+        df = series.frame
+        try:
+            # 检查止盈条件
+            if self.positions[symbol] == 'long':
+                if new_client.check_take_profit_condition(df, self.entry_prices[symbol],
+                                                          self.strategy_types[symbol]):
+                    await self.take_profit(symbol, df.iloc[-1]['close'])
+
+            # 检查开仓条件（先原策略，后新策略）
+            elif self.positions[symbol] is None:
+                strategy, misses = evaluate_entry(df)
+                logger.debug(f"[{self.name}] Entry conditions for {symbol}: {strategy}, misses: {misses}")
+                if strategy is not None:
+                    await self.enter_long(symbol, strategy)
+        except Exception as e:
+            logger.error(f"[{self.name}] Error processing {symbol}: {e}")
+
+    async def enter_long(self, symbol, strategy):
+        """按策略类型开多单：原策略 4%止盈/2%止损，新策略 5%止损"""
+        if not self.can_open():
+            return
+        current_price = await self.feed.price(symbol)
+        message = (f"### 开多单({new_client.STRATEGY_NAMES[strategy]})\n币对: {symbol}\n"
+                   f"时间: {pd.Timestamp.now()}\n价格: {current_price}\n数量: {self.contract_amount}张")
+        logger.critical(message)  # loguru sink 发送飞书通知
+
+        stop_loss_percent = 0.02 if strategy == 'original' else 0.05
+        take_profit = current_price * 1.04 if strategy == 'original' else None
+        try:
+            await self.gateway.order_with_tp_sl(symbol, 'buy', self.contract_amount, None, self.leverage, 'long',
+                                                take_profit=take_profit,
+                                                stop_loss=current_price * (1 - stop_loss_percent))
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed to place order with SL for {symbol}: {e}")
+            return
+        self.positions[symbol] = 'long'
+        self.entry_prices[symbol] = current_price
+        self.strategy_types[symbol] = strategy
+
+    async def take_profit(self, symbol, current_price):
+        """止盈平仓"""
+        message = (f"### 止盈平仓\n币对: {symbol}\n策略: {self.strategy_types[symbol]}\n"
+                   f"时间: {pd.Timestamp.now()}\n入场价: {self.entry_prices[symbol]}\n当前价: {current_price}")
+        logger.critical(message)  # loguru sink 发送飞书通知
+        try:
+            await self.gateway.create_order(symbol, 'market', 'sell', self.contract_amount, None, {'posSide': 'long'})
+        except Exception as e:
+            logger.error(f"[{self.name}] Failed to close position for {symbol}: {e}")
+            return
+        self._clear(symbol)
+
+    async def flatten(self):
+        closed = []
+        for symbol in [s for s in self.symbols if self.positions[s] == 'long']:
+            closed.extend(await self.gateway.flatten(symbol))
+            self._clear(symbol)
+        return closed
+
+    def _clear(self, symbol):
+        self.positions[symbol] = None
+        self.entry_prices[symbol] = None
+        self.strategy_types[symbol] = None
+
+
+STRATEGIES = {
+    'ma25': Ma25Strategy,
+    'ma60': Ma60Strategy,
+    'scanner': ScannerStrategy,
+}
@@ -0,0 +1,457 @@
+import time
+_started = time.perf_counter()  # 进程启动时间，用于统计首次检测耗时
+
+import asyncio
+
+import pandas as pd
+import toml
+from loguru import logger
+
+from bar_buffer import BarBuffer, OHLCV_FIELDS
+from bar_store import BarStore, closed_klines
+from ema_store import EmaStore
+from indicators import StreamingSMA, StopLossLevels
+from market_cache import MarketCache
+from market_loader import KlineLoader
+from metrics import StageTimer, instrument, record_scan
+from tracing import span
+from control import ControlChannel
+from notifier import FeishuNotifier
+from order_tracker import OrderTracker
+from rate_limit import RateLimiter
+
+
+class TickCache:
+    """同一轮内相同的请求只发一次，所有调用方等待同一个任务"""
+
+    def __init__(self):
+        self._tasks = {}
+
+    def clear(self):
+        self._tasks = {}
+
+    def get(self, key, factory):
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(factory())
+        return task
+
+
+class Series:
+    """一个币种的共享K线和增量指标，所有订阅的策略读取同一份数据"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.capacity = 0  # 保留的K线数量
+        self.warmup = 0  # 预热获取的K线数量
+        self.sma_windows = set()
+        self.stop_windows = set()
+        self.emas = False  # 是否维护 EmaStore（EMA列的 DataFrame）
+        self.subscribers = 0
+        self.bars = None  # BarBuffer：OHLCV 和 MA{n} 列，预热后创建
+        self.smas = {}
+        self.stops = None  # StopLossLevels，有订阅时创建
+        self.frame = None  # 带EMA列的 DataFrame
+        self.fresh = False  # 本轮是否更新成功
+
+    @property
+    def ready(self):
+        return self.fresh and self.bars is not None and len(self.bars) >= 3
+
+    def require(self, bars, warmup, sma, stops, emas):
+        """合并订阅要求，要求变化时下一轮重新预热"""
+        before = (self.capacity, self.warmup, set(self.sma_windows), set(self.stop_windows), self.emas)
+        self.capacity = max(self.capacity, bars)
+        self.warmup = max(self.warmup, warmup, bars)
+        self.sma_windows.update(sma)
+        self.stop_windows.update(stops)
+        self.emas = self.emas or emas
+        if before != (self.capacity, self.warmup, self.sma_windows, self.stop_windows, self.emas):
+            self.bars = None
+
+    def seed(self, klines):
+        """用历史K线初始化K线缓冲区和指标"""
+        windows = sorted(self.sma_windows)
+        self.smas = {window: StreamingSMA(window) for window in windows}
+        self.stops = StopLossLevels(sorted(self.stop_windows)) if self.stop_windows else None
+        self.bars = BarBuffer([*OHLCV_FIELDS, *(f'MA{window}' for window in windows)], self.capacity)
+        for kline in klines:
+            self.apply_kline(kline)
+
+    def apply_kline(self, kline):
+        """写入一根K线：新K线追加，同一根K线原地更新；返回是否追加了新K线"""
+        timestamp, open_, high, low, close, volume = kline[:6]
+        last = self.bars.last_timestamp
+        if last is None or timestamp > last:
+            values = [sma.append(close) for sma in self.smas.values()]
+            if self.stops is not None:
+                self.stops.append(low, high)
+            self.bars.append(timestamp, [open_, high, low, close, volume, *values])
+            return True
+        if timestamp == last:
+            columns = {f'MA{window}': sma.revise(close) for window, sma in self.smas.items()}
+            if self.stops is not None:
+                self.stops.revise(low, high)
+            self.bars.update_last(open=open_, high=high, low=low, close=close, volume=volume, **columns)
+        return False
+
+
+class MarketFeed:
+    """共享K线和行情：每轮每个币种只获取一次K线，最新价按需获取且每轮只请求一次"""
+
+    def __init__(self, exchange, limiter, interval='5m', delta_limit=100, ema_keep=200, store=None):
+        self.exchange = exchange
+        self.limiter = limiter
+        self.interval = interval
+        self.delta_limit = delta_limit  # 增量获取的最大K线数量，达到上限时视为缺口重新预热
+        self.interval_ms = exchange.parse_timeframe(interval) * 1000
+        self.ema_store = EmaStore(keep=ema_keep, interval_ms=self.interval_ms)
+        self.store = store
+        self.loader = KlineLoader(exchange, limiter, self.ema_store, interval, store=store)
+        self.requests = 0  # 累计K线和行情请求数
+        self._series = {}
+        self._tickers = TickCache()
+
+    def subscribe(self, symbol, bars=200, warmup=0, sma=(), stops=(), emas=False):
+        """订阅币种K线；多个策略订阅同一币种时共享一份数据，取各自要求的并集"""
+        series = self._series.get(symbol)
+        if series is None:
+            series = self._series[symbol] = Series(symbol)
+        series.require(bars, warmup, sma, stops, emas)
+        series.subscribers += 1
+        return series
+
+    def unsubscribe(self, symbol):
+        """取消订阅，没有订阅者时丢弃该币种的数据"""
+        series = self._series.get(symbol)
+        if series is None:
+            return
+        series.subscribers -= 1
+        if series.subscribers <= 0:
+            del self._series[symbol]
+            self.ema_store.reset(symbol)
+
+    def series(self, symbol):
+        return self._series[symbol]
+
+    @property
+    def symbols(self):
+        return list(self._series)
+
+    async def refresh(self):
+        """新一轮：并发更新全部订阅的币种，请求节奏由 limiter 控制"""
+        self._tickers.clear()
+        series_list = list(self._series.values())
+        results = await asyncio.gather(*[self._update(series) for series in series_list], return_exceptions=True)
+        for series, result in zip(series_list, results):
+            series.fresh = not isinstance(result, Exception)
+            if not series.fresh:
+                logger.error(f"Error updating {series.symbol}: {result}")
+
+    async def price(self, symbol):
+        """最新成交价，同一轮内多个策略共用一次 fetch_ticker"""
+        ticker = await self._tickers.get(symbol, lambda: self._fetch_ticker(symbol))
+        return float(ticker['last'])
+
+    async def _fetch_ticker(self, symbol):
+        self.requests += 1
+        return await self.limiter.call('market', self.exchange.fetch_ticker, symbol)
+
+    async def _update(self, series):
+        if series.bars is not None:
+            # 从最后一根K线（未收盘）开始增量获取
+            self.requests += 1
+            klines = await self.limiter.call('candles', self.exchange.fetch_ohlcv, series.symbol, self.interval,
+                                             since=series.bars.last_timestamp, limit=self.delta_limit)
+            if self.store is not None:
+                self.store.append(series.symbol, self.interval,
+                                  closed_klines(klines, self.interval_ms, self.exchange.milliseconds()))
+            if klines and len(klines) < self.delta_limit and klines[0][0] <= series.bars.last_timestamp:
+                for kline in klines:
+                    series.apply_kline(kline)
+                if not series.emas:
+                    return
+                frame = self.ema_store.update(series.symbol, klines)
+                if frame is not None:
+                    series.frame = frame
+                    return
+            if klines:
+                logger.warning(f"Gap detected in K-lines for {series.symbol}, warming up again")
+        # 首次、订阅要求变化或出现缺口时用深度历史预热
+        self.requests += 1
+        klines = await self.loader.fetch_history(series.symbol, series.warmup)
+        series.seed(klines)
+        if series.emas:
+            series.frame = self.ema_store.warm_up(series.symbol, klines)
+
+
+class OrderGateway:
+    """共享下单通道：所有策略的交易所调用经过同一个限速器，持仓查询每轮每个币种只请求一次"""
+
+    def __init__(self, exchange, limiter, account=None, tracker=None):
+        self.exchange = exchange
+        self.limiter = limiter
+        self.account = account  # 账户持仓和挂单缓存（account_stream 模式）
+        self.tracker = tracker  # 订单状态跟踪（account_stream 模式）
+        self._positions = TickCache()
+        self._loop = None
+
+    def new_tick(self):
+        self._positions.clear()
+
+    async def balance(self):
+        """账户 USDT 余额，失败时返回 None"""
+        try:
+            balance = await self.limiter.call('account', self.exchange.fetch_balance)
+            return balance['total'].get('USDT', 0)
+        except Exception as e:
+            logger.error(f"Failed to fetch USDT balance: {e}")
+            return None
+
+    async def set_leverage(self, leverage, symbol):
+        return await self.limiter.call('account', self.exchange.set_leverage, leverage, symbol)
+
+    async def positions(self, symbol):
+        """返回 (多单, 空单)，值为 'long'/'short' 或 None"""
+        if self.account is not None:
+            return self.account.position_sides(self.exchange.market_id(symbol))
+        return await self._positions.get(symbol, lambda: self._fetch_positions(symbol))
+
+    async def _fetch_positions(self, symbol):
+        positions = await self.limiter.call('account', self.exchange.fetch_positions, [symbol])
+        long_pos = short_pos = None
+        for pos in positions:
+            if pos['symbol'] == symbol and float(pos['contracts']) > 0:
+                if pos['side'] == 'long':
+                    long_pos = 'long'
+                elif pos['side'] == 'short':
+                    short_pos = 'short'
+        return long_pos, short_pos
+
+    async def create_order(self, symbol, order_type, side, amount, price=None, params=None):
+        order = await self.limiter.call('trade', self.exchange.create_order, symbol, order_type, side, amount,
+                                        price, params or {})
+        logger.info(f"Placed {side} {order_type} order for {amount} {symbol}: {order['id']}")
+        return order
+
+    async def order_with_tp_sl(self, symbol, side, amount, price=None, leverage=10, posSide='long',
+                               take_profit=None, stop_loss=None, order_type='market'):
+        """下单并附带交易所侧止盈/止损（市价触发）"""
+        params = {'leverage': leverage, 'posSide': posSide}
+        if stop_loss is not None:
+            params['stopLoss'] = {'triggerPrice': stop_loss, 'price': stop_loss, 'type': 'market'}
+        if take_profit is not None:
+            params['takeProfit'] = {'triggerPrice': take_profit, 'price': take_profit, 'type': 'market'}
+        order = await self.create_order(symbol, order_type, side, amount, price, params)
+        logger.info(f"Placed {side} order for {symbol} with stop loss at {stop_loss} and take profit at {take_profit}")
+        return order['id']
+
+    async def cancel_order(self, order_id, symbol):
+        await self.limiter.call('trade', self.exchange.cancel_order, order_id, symbol)
+        logger.info(f"Cancelled order: {order_id}")
+
+    async def fill_limit_order(self, symbol, side, amount, price, leverage=10, posSide='long', tick_time=None):
+        """下限价单，2秒内未完全成交则撤单并用市价单补足剩余数量"""
+        params = {'leverage': leverage, 'posSide': posSide}
+        order_id = (await self.create_order(symbol, 'limit', side, amount, price, params))['id']
+        if self.tracker is not None:
+            # 成交推送到达即返回，不再固定等待2秒
+            status = await asyncio.to_thread(self.tracker.wait, order_id, symbol, 2, tick_time)
+        else:
+            await asyncio.sleep(2)
+            status = await self._order_status(order_id, symbol)
+        if status['state'] != 'filled':
+            # 撤销限价单，下市价单
+            await self.cancel_order(order_id, symbol)
+            if self.tracker is not None:
+                # 以撤单后的最终成交数量为准
+                status = await asyncio.to_thread(self.tracker.wait, order_id, symbol, 2)
+            remaining = amount - status['filled']
+            if remaining > 0:
+                await self.create_order(symbol, 'market', side, remaining, None, params)
+        if self.tracker is not None:
+            self.tracker.forget(order_id)
+
+    async def flatten(self, symbol):
+        """撤销挂单并市价平掉该币种的全部持仓，返回平掉的持仓"""
+        for order in await self.limiter.call('trade', self.exchange.fetch_open_orders, symbol):
+            await self.cancel_order(order['id'], symbol)
+        closed = []
+        for pos in await self.limiter.call('account', self.exchange.fetch_positions, [symbol]):
+            contracts = float(pos['contracts'] or 0)
+            if pos['symbol'] == symbol and contracts > 0:
+                side = 'sell' if pos['side'] == 'long' else 'buy'
+                await self.create_order(symbol, 'market', side, contracts, None,
+                                        {'posSide': pos['side'], 'reduceOnly': True})
+                closed.append({'symbol': symbol, 'side': pos['side'], 'contracts': contracts})
+        return closed
+
+    async def _order_status(self, order_id, symbol):
+        order = await self.limiter.call('trade', self.exchange.fetch_order, order_id, symbol)
+        return {'state': 'filled' if order['status'] == 'closed' else order['status'],
+                'filled': float(order.get('filled') or 0)}
+
+    def fetch_order_blocking(self, order_id, symbol):
+        """供 OrderTracker 在线程中调用的同步查询，请求在事件循环中执行"""
+        future = asyncio.run_coroutine_threadsafe(
+            self.limiter.call('trade', self.exchange.fetch_order, order_id, symbol), self._loop)
+        return future.result()
+
+
+class Strategy:
+    """插件策略基类：subscribe 中订阅行情，每轮行情更新后调用 on_tick"""
+
+    name = ''
+
+    def __init__(self, host, settings):
+        self.host = host
+        self.feed = host.feed
+        self.gateway = host.gateway
+        self.settings = settings
+        self.leverage = settings['leverage']
+        self.contract_amount = settings['contract_amount']
+
+    def subscribe(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def on_tick(self):
+        pass
+
+    async def flatten(self):
+        """平掉本策略的持仓，返回平掉的内容"""
+        return []
+
+    def can_open(self):
+        """收到停止命令后不再开仓"""
+        return self.host.control.is_running()
+
+
+class StrategyHost:
+    """单进程多策略运行时：一个交易所连接、一份行情、一个下单通道"""
+
+    def __init__(self, exchange, limiter, feed, gateway, notifier, control, market_cache=None, tick_interval=5):
+        self.exchange = exchange
+        self.limiter = limiter
+        self.feed = feed
+        self.gateway = gateway
+        self.notifier = notifier
+        self.market_cache = market_cache  # 市场信息缓存，扫描策略从中选取币种
+        self.tick_interval = tick_interval
+        self.control = control  # 控制通道，接收 start/stop/flatten 命令
+        self.strategies = []
+
+    def add(self, strategy):
+        strategy.subscribe()
+        self.strategies.append(strategy)
+        return strategy
+
+    async def flatten(self):
+        """各策略平掉自己的持仓（控制通道 flatten 命令）"""
+        return {strategy.name: await strategy.flatten() for strategy in self.strategies}
+
+    async def run(self):
+        """每轮先统一更新行情，再依次交给各策略"""
+        self.gateway._loop = asyncio.get_running_loop()
+        for strategy in self.strategies:
+            await strategy.start()
+        first_evaluation = True
+        stages = StageTimer()  # 各阶段耗时，供 /metrics 使用
+        while True:
+            try:
+                # 执行控制通道的平仓请求；停止时等待命令，收到命令立即唤醒
+                await self.control.process_async(self.flatten)
+                if not self.control.is_running():
+                    await asyncio.to_thread(self.control.wait, 5)
+                    continue
+
+                started = time.monotonic()
+                stages.start()
+                self.gateway.new_tick()
+                await self.feed.refresh()
+                stages.mark('feed')
+                await asyncio.gather(*[self._on_tick(strategy) for strategy in self.strategies])
+                record_scan(len(self.feed.symbols), stages.mark('strategies'))
+                stages.finish()
+
+                if first_evaluation:
+                    logger.info(f"Time to first evaluation: {time.perf_counter() - _started:.2f}s")
+                    first_evaluation = False
+                await asyncio.to_thread(self.control.wait, max(0.0, self.tick_interval - (time.monotonic() - started)))
+            except Exception as e:
+                logger.error(f"Main loop error: {e}")
+                await asyncio.sleep(5)
+
+    async def _on_tick(self, strategy):
+        try:
+            with span('strategy', strategy=strategy.name):
+                await strategy.on_tick()
+        except Exception as e:
+            logger.error(f"[{strategy.name}] Error: {e}")
+
+
+async def main(config_path='config.toml'):
+    import ccxt.async_support as ccxt  # 延迟导入，导入本模块时不加载 ccxt
+    from new_client import select_symbols
+    from strategies import STRATEGIES
+
+    config = toml.load(config_path)
+    okx_config = config['okx']
+    trading_config = config['trading']
+    host_config = config.get('host', {})
+
+    notifier = FeishuNotifier(config['feishu']['webhook_url']).start()  # 后台发送，重复消息去重
+    logger.add("strategy.log", rotation="500MB", retention=3, level="INFO")
+    # 飞书通知只有这一条发送路径：策略用 logger.critical 记录完整的通知内容
+    logger.add(lambda msg: notifier.send(msg.record['message']), level="CRITICAL")
+
+    exchange = instrument(ccxt.okx({  # 交易所接口计时，供 /metrics 使用
+        'apiKey': okx_config['api_key'],
+        'secret': okx_config['api_secret'],
+        'password': okx_config['passphrase'],
+        'enableRateLimit': False,  # 由 RateLimiter 按接口类别限速
+    }))
+    limiter = RateLimiter()
+    bar_store = trading_config.get('bar_store', '')
+    feed = MarketFeed(exchange, limiter, store=BarStore(bar_store) if bar_store else None)
+    gateway = OrderGateway(exchange, limiter)
+    # 市场信息缓存：未过期时不下载 markets
+    market_cache = MarketCache(exchange, limiter, select_symbols, 'markets_cache_host.json',
+                               trading_config.get('markets_ttl', 3600))
+    control = ControlChannel('strategy_host').start()
+    host = StrategyHost(exchange, limiter, feed, gateway, notifier, control, market_cache,
+                        host_config.get('tick_interval', 5))
+    try:
+        await market_cache.load()
+        if trading_config.get('account_stream', False):
+            from account_cache import AccountCache
+            gateway.account = AccountCache(okx_config['api_key'], okx_config['api_secret'],
+                                           okx_config['passphrase']).start()
+            gateway.tracker = OrderTracker(gateway.account, gateway.fetch_order_blocking)
+
+        # 各策略的参数：[trading] 为默认值，[host.<策略名>] 覆盖
+        names = host_config.get('strategies', ['ma25', 'ma60', 'scanner'])
+        for name in names:
+            settings = {**trading_config, **host_config.get(name, {})}
+            host.add(STRATEGIES[name](host, settings))
+        logger.info(f"Shared feed: {len(feed.symbols)} symbols for strategies {names}")
+
+        usdt_balance = await gateway.balance()
+        start_message = "### 交易策略启动\n时间: {}\n策略: {}\n当前 USDT 余额: {}".format(
+            pd.Timestamp.now(), ', '.join(names), usdt_balance)
+        logger.critical(start_message)
+
+        refresher = asyncio.create_task(market_cache.refresh_forever())  # 后台检查上新/下架
+        try:
+            await host.run()
+        finally:
+            refresher.cancel()
+            await asyncio.gather(refresher, return_exceptions=True)
+    finally:
+        await exchange.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
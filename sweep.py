@@ -0,0 +1,136 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest import FEE_RATE, STRATEGIES, load_ohlcv, summarize
+
+# 各策略可调参数的默认扫描范围
+SPACES = {
+    'ma25': {
+        'window': list(range(10, 61, 5)),
+        'take_profit_points': list(range(500, 4001, 250)),
+        'stop_window': [48, 96, 144, 192, 288],
+    },
+    'ma60': {
+        'window': list(range(30, 121, 10)),
+        'take_profit_points': list(range(250, 2001, 250)),
+        'stop_loss_points': list(range(1000, 5001, 500)),
+    },
+    'scanner': {
+        'original_tp': [0.02, 0.03, 0.04, 0.05, 0.06],
+        'original_sl': [0.01, 0.015, 0.02, 0.03],
+        'new_tp': [0.10, 0.15, 0.20, 0.25, 0.30],
+        'new_sl': [0.03, 0.05, 0.07],
+    },
+}
+
+# 工作进程通过 fork 继承，指标数组只读共享，不复制到各进程
+_df = None
+_cache = None
+_strategy = None
+_fee = None
+
+
+def parse_values(text):
+    """解析参数取值：'10,20,30' 或 '起:止:步长'（含终点）"""
+    if ':' in text:
+        start, stop, step = (float(v) for v in text.split(':'))
+        values = np.arange(start, stop + step / 2, step)
+    else:
+        values = [float(v) for v in text.split(',')]
+    return [int(v) if float(v).is_integer() else round(float(v), 10) for v in values]
+
+
+def combinations(space, samples=None, seed=0):
+    """网格的全部组合，或不重复随机抽取 samples 个"""
+    names = list(space)
+    grid = list(itertools.product(*(space[name] for name in names)))
+    if samples is not None and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return [dict(zip(names, values)) for values in grid]
+
+
+def prepare(df, strategy, params_list):
+    """在父进程中预先计算所有组合用到的指标数组"""
+    cache = {}
+    seen = set()
+    for params in params_list:
+        # 只有指标相关的参数决定缓存内容，每种取值跑一次即可
+        key = tuple(sorted((k, v) for k, v in params.items() if k in ('window', 'stop_window')))
+        if key not in seen:
+            seen.add(key)
+            STRATEGIES[strategy](df, **params, cache=cache)
+    for value in cache.values():
+        for array in (value.values() if isinstance(value, dict) else [value]):
+            array.flags.writeable = False
+    return cache
+
+
+def _evaluate(params):
+    result = summarize(STRATEGIES[_strategy](_df, **params, fee=_fee, cache=_cache))
+    exits = result.pop('exits')
+    return {**params, **result, **{f'exit_{reason}': count for reason, count in exits.items()}}
+
+
+def sweep(df, strategy, params_list, workers=None, fee=FEE_RATE):
+    """用进程池评估全部参数组合，返回结果 DataFrame"""
+    global _df, _cache, _strategy, _fee
+    _df, _strategy, _fee = df, strategy, fee
+    _cache = prepare(df, strategy, params_list)
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        rows = [_evaluate(params) for params in params_list]
+    else:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            rows = pool.map(_evaluate, params_list, chunksize=max(1, len(params_list) // (workers * 8)))
+    results = pd.DataFrame(rows)
+    exits = [column for column in results if column.startswith('exit_')]
+    results[exits] = results[exits].fillna(0).astype(int)
+    return results
+
+
+def rank(results, metric='pnl'):
+    """按指标排序，max_drawdown 越小越好，其余越大越好"""
+    return results.sort_values(metric, ascending=metric == 'max_drawdown').reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行扫描策略参数')
+    parser.add_argument('path', help='5m K线文件（csv 或 parquet），指定 --symbol 时为 BarStore 目录')
+    parser.add_argument('--symbol', help='从 BarStore 读取的币种')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='ma25')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                        help="覆盖扫描范围，例如 window=10:60:5 或 stop_window=96,144")
+    parser.add_argument('--samples', type=int, help='随机抽取的组合数，默认跑完整网格')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--rank', default='pnl', choices=['pnl', 'return', 'win_rate', 'max_drawdown'])
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--report', default='sweep_report.csv')
+    args = parser.parse_args()
+
+    space = dict(SPACES[args.strategy])
+    for item in args.param:
+        name, values = item.split('=', 1)
+        if name not in space:
+            parser.error(f"unknown parameter for {args.strategy}: {name}")
+        space[name] = parse_values(values)
+
+    df = load_ohlcv(args.path, args.symbol)
+    params_list = combinations(space, args.samples, args.seed)
+    started = time.perf_counter()
+    results = rank(sweep(df, args.strategy, params_list, args.workers), args.rank)
+    elapsed = time.perf_counter() - started
+    results.to_csv(args.report, index=False, float_format='%.6g')
+    print(f"{args.strategy}: {len(params_list)} combinations on {len(df)} bars in {elapsed:.1f}s -> {args.report}")
+    print(results.head(args.top).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import queue
+import sys
+import threading
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeOkxServer:
+    """本地 OKX WebSocket 替身：应答 ping/login/subscribe，按频道推送数据，drop 断开全部连接"""
+
+    def __init__(self):
+        self.messages = queue.Queue()  # 客户端发来的消息（ping 为字符串，其余为解析后的 JSON）
+        self.connections = 0  # 累计连接数
+        self._channels = {}  # 连接 -> 已订阅的频道
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self.url = None
+
+    def start(self):
+        import websockets
+        started = threading.Event()
+
+        async def serve():
+            self._server = await websockets.serve(self._handle, '127.0.0.1', 0)
+            self.url = f"ws://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+            started.set()
+            await self._server.wait_closed()
+
+        threading.Thread(target=self._loop.run_until_complete, args=(serve(),), daemon=True).start()
+        started.wait(5)
+        return self
+
+    def stop(self):
+        # 不等待关闭握手完成，客户端已停止时最多要等 close_timeout
+        self._loop.call_soon_threadsafe(self._server.close)
+
+    async def _handle(self, ws):
+        self.connections += 1
+        self._channels[ws] = set()
+        try:
+            async for raw in ws:
+                if raw == 'ping':
+                    self.messages.put(raw)
+                    await ws.send('pong')
+                    continue
+                message = json.loads(raw)
+                if message.get('op') == 'login':
+                    await ws.send(json.dumps({'event': 'login', 'code': '0', 'msg': ''}))
+                elif message.get('op') == 'subscribe':
+                    for arg in message['args']:
+                        self._channels[ws].add(arg['channel'])
+                        await ws.send(json.dumps({'event': 'subscribe', 'arg': arg}))
+                self.messages.put(message)  # 订阅生效后才通知测试，之后的 push 不会丢
+        except Exception:
+            pass
+        finally:
+            self._channels.pop(ws, None)
+
+    def subscribed(self, timeout=5):
+        """等待下一条订阅请求，返回其中的频道名"""
+        while True:
+            message = self.messages.get(timeout=timeout)
+            if isinstance(message, dict) and message.get('op') == 'subscribe':
+                return sorted(arg['channel'] for arg in message['args'])
+
+    def push(self, channel, data):
+        """向订阅了 channel 的连接推送一条数据"""
+        async def send():
+            for ws, channels in list(self._channels.items()):
+                if channel in channels:
+                    await ws.send(json.dumps({'arg': {'channel': channel}, 'data': data}))
+        self._call(send())
+
+    def drop(self):
+        """断开当前全部连接，模拟网络中断"""
+        async def close():
+            for ws in list(self._channels):
+                await ws.close()
+        self._call(close())
+
+    def _call(self, coroutine):
+        asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(5)
+
+
+@pytest.fixture
+def okx_server():
+    server = FakeOkxServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,93 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from account_cache import AccountCache
+
+
+class Snapshots:
+    """REST 快照替身：返回当前设置的持仓和挂单，并记录调用次数"""
+
+    def __init__(self, positions=(), orders=()):
+        self.positions = list(positions)
+        self.orders = list(orders)
+        self.calls = 0
+        self.called = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.called.set()
+        return list(self.positions), list(self.orders)
+
+
+def position(pos, u_time, inst_id='BTC-USDT-SWAP', side='long'):
+    return {'instId': inst_id, 'posSide': side, 'pos': str(pos), 'avgPx': '100', 'uTime': str(u_time)}
+
+
+def order(ord_id, state, u_time, inst_id='BTC-USDT-SWAP'):
+    return {'ordId': ord_id, 'instId': inst_id, 'state': state, 'accFillSz': '0', 'uTime': str(u_time)}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def snapshots():
+    return Snapshots([position(1, 1000)], [order('1', 'live', 1000)])
+
+
+@pytest.fixture
+def cache(okx_server, snapshots):
+    cache = AccountCache('key', 'secret', 'pass', fetch_snapshot=snapshots, private_url=okx_server.url,
+                         reconnect_delay=0.05).start()
+    login = okx_server.messages.get(timeout=5)
+    assert login['op'] == 'login' and login['args'][0]['apiKey'] == 'key'
+    assert okx_server.subscribed() == ['orders', 'positions']
+    yield cache
+    cache.stop()
+
+
+def test_snapshot_then_pushes(okx_server, cache):
+    assert cache.position('BTC-USDT-SWAP') == 'long'
+    assert [item['ordId'] for item in cache.open_orders()] == ['1']
+    pushed = queue.Queue()
+    cache.add_order_listener(pushed.put)
+
+    okx_server.push('positions', [position(0, 2000)])
+    okx_server.push('orders', [order('1', 'filled', 2000), order('2', 'live', 2000)])
+    assert pushed.get(timeout=5)['ordId'] == '1'
+    assert pushed.get(timeout=5)['ordId'] == '2'
+    assert cache.position('BTC-USDT-SWAP') is None
+    assert [item['ordId'] for item in cache.open_orders()] == ['2']
+
+
+def test_older_push_does_not_overwrite_newer_state(okx_server, cache):
+    okx_server.push('positions', [position(3, 3000)])
+    okx_server.push('positions', [position(0, 2000)])  # 乱序到达的旧推送
+    okx_server.push('orders', [order('3', 'live', 3000)])
+    assert wait_for(lambda: cache.open_orders('BTC-USDT-SWAP')[-1]['ordId'] == '3')
+    assert cache.entry_price('BTC-USDT-SWAP') == 100.0
+    assert cache.position('BTC-USDT-SWAP') == 'long'
+
+
+def test_reconnect_logs_in_resubscribes_and_reconciles(okx_server, snapshots, cache):
+    assert snapshots.calls == 1
+    # 断线期间持仓已在交易所平掉，推送丢失
+    snapshots.positions = [position(0, 5000)]
+    snapshots.orders = []
+    snapshots.called.clear()
+    okx_server.drop()
+    assert okx_server.messages.get(timeout=5)['op'] == 'login'
+    assert okx_server.subscribed() == ['orders', 'positions']
+    assert snapshots.called.wait(5)
+    assert wait_for(lambda: cache.position('BTC-USDT-SWAP') is None)
+    assert cache.open_orders() == []
+    assert cache.mismatches == 2
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_buffer import BarBuffer, OHLCV_FIELDS
+
+
+def bar(i):
+    return [i + 0.1, i + 0.5, i - 0.5, i + 0.2, 10.0 * i]
+
+
+def filled(count, capacity=5):
+    buffer = BarBuffer(capacity=capacity)
+    for i in range(count):
+        buffer.append(i * 1000, bar(i))
+    return buffer
+
+
+@pytest.mark.parametrize('count', [0, 3, 5, 6, 12, 23])
+def test_wraparound_keeps_latest_bars_in_order(count):
+    buffer = filled(count)
+    kept = list(range(max(0, count - 5), count))
+    assert len(buffer) == len(kept)
+    assert buffer.timestamps.tolist() == [i * 1000 for i in kept]
+    for column, field in enumerate(OHLCV_FIELDS):
+        assert buffer[field].tolist() == [bar(i)[column] for i in kept]
+    if kept:
+        assert buffer.last_timestamp == kept[-1] * 1000
+        assert buffer.row(-1) == dict(zip(OHLCV_FIELDS, bar(kept[-1])))
+        assert buffer.row(0)['close'] == bar(kept[0])[3]
+    else:
+        assert buffer.last_timestamp is None
+
+
+def test_views_are_read_only_and_zero_copy():
+    buffer = filled(8)
+    close = buffer['close']
+    assert np.shares_memory(close, buffer._data)
+    assert np.shares_memory(buffer.timestamps, buffer._timestamps)
+    assert close.flags.c_contiguous
+    with pytest.raises(ValueError):
+        close[-1] = 0.0
+    with pytest.raises(ValueError):
+        buffer.timestamps[-1] = 0
+    # 视图直接看到原地更新
+    buffer.update_last(close=99.0)
+    assert close[-1] == 99.0
+
+
+def test_update_last_changes_only_last_bar():
+    buffer = filled(7)
+    before = {field: buffer[field].copy() for field in OHLCV_FIELDS}
+    buffer.update_last(high=50.0, close=49.0)
+    assert buffer['high'][-1] == 50.0 and buffer['close'][-1] == 49.0
+    assert buffer.last_timestamp == 6000
+    for field in OHLCV_FIELDS:
+        np.testing.assert_array_equal(buffer[field][:-1], before[field][:-1])
+    for field in ('open', 'low', 'volume'):
+        assert buffer[field][-1] == before[field][-1]
+
+    # 更新后的值在环形回绕后仍然正确（两个副本都已写入）
+    for i in range(7, 11):
+        buffer.append(i * 1000, bar(i))
+    assert buffer.timestamps.tolist() == [6000, 7000, 8000, 9000, 10000]
+    assert buffer['close'][0] == 49.0
+
+
+def test_from_frame_keeps_last_capacity_rows():
+    index = pd.to_datetime(np.arange(8) * 300000, unit='ms', utc=True).tz_convert('Asia/Shanghai')
+    df = pd.DataFrame([bar(i) + [i * 2.0] for i in range(8)], columns=[*OHLCV_FIELDS, 'MA25'],
+                      index=pd.Index(index, name='timestamp'))
+    buffer = BarBuffer.from_frame(df, capacity=5)
+    assert buffer.fields == [*OHLCV_FIELDS, 'MA25']
+    assert buffer.timestamps.tolist() == [i * 300000 for i in range(3, 8)]
+    assert buffer['MA25'].tolist() == [6.0, 8.0, 10.0, 12.0, 14.0]
@@ -0,0 +1,33 @@
+import threading
+import time
+
+from bar_clock import BarCloseScheduler
+from control import ControlChannel
+
+
+def scheduler(interval_ms=1000, settle_ms=300):
+    clock = BarCloseScheduler(interval_ms, lambda: time.time() * 1000, settle_ms=settle_ms)
+    assert clock.wait()  # 启动时立即返回一次
+    return clock
+
+
+def test_early_wakeup_does_not_skip_the_close():
+    clock = scheduler()
+    close = clock.next_close()
+    # 控制命令提前唤醒：返回 False，last_close 不变
+    assert not clock.wait(max_wait=5, sleep=lambda seconds: None)
+    assert clock.last_close == close - clock.interval_ms
+    # 收盘后、settle_ms 之内被唤醒，仍然等待同一根K线
+    time.sleep(max(0.0, (close - clock.now_ms()) / 1000 + 0.05))
+    assert clock.next_close() == close
+    assert clock.wait(max_wait=5)
+    assert clock.last_close == close
+
+
+def test_control_command_interrupts_wait(tmp_path):
+    control = ControlChannel('clock', str(tmp_path / 'clock.state'), str(tmp_path))
+    clock = scheduler(interval_ms=60000)
+    threading.Timer(0.2, control.handle, ('stop',)).start()
+    started = time.monotonic()
+    assert not clock.wait(max_wait=5, sleep=control.wait)
+    assert time.monotonic() - started < 2
@@ -0,0 +1,152 @@
+import asyncio
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from bar_store import BarStore, fetch_with_store
+from market_loader import KlineLoader
+
+INTERVAL_MS = 300000
+SYMBOL = 'BTC/USDT:USDT'
+
+
+def kline(ts):
+    price = float(ts // INTERVAL_MS % 1000)
+    return [ts, price, price + 1, price - 1, price + 0.5, 10.0]
+
+
+def klines(start, count):
+    return [kline((start + i) * INTERVAL_MS) for i in range(count)]
+
+
+class FakeExchange:
+    """交易所有从第 0 根到当前（第 bars-1 根，未收盘）的K线，每页最多 300 根"""
+
+    def __init__(self, bars):
+        self.now = bars * INTERVAL_MS - 1
+        self.history = klines(0, bars)
+        self.requests = []
+
+    def parse_timeframe(self, interval):
+        return INTERVAL_MS // 1000
+
+    def milliseconds(self):
+        return self.now
+
+    def fetch_ohlcv(self, symbol, interval, since=None, limit=None):
+        self.requests.append(since)
+        return [k for k in self.history if k[0] >= since][:min(limit, 300)]
+
+
+class AsyncExchange(FakeExchange):
+    async def fetch_ohlcv(self, symbol, interval, since=None, limit=None):
+        return FakeExchange.fetch_ohlcv(self, symbol, interval, since, limit)
+
+
+class Limiter:
+    async def call(self, category, func, *args, **kwargs):
+        return await func(*args, **kwargs)
+
+
+def timestamps(store):
+    return [k[0] // INTERVAL_MS for k in store.load(SYMBOL, '5m')]
+
+
+def test_append_keeps_only_newer_unique_bars(tmp_path):
+    store = BarStore(str(tmp_path))
+    assert store.append(SYMBOL, '5m', klines(10, 5)[::-1] + klines(12, 2)) == 5
+    assert store.append(SYMBOL, '5m', klines(8, 10)) == 3  # 只写入 15..17
+    assert timestamps(store) == list(range(10, 18))
+    assert store.load(SYMBOL, '5m', limit=2) == klines(16, 2)
+    assert store.load(SYMBOL, '5m', since=15 * INTERVAL_MS) == klines(15, 3)
+    assert store.first_timestamp(SYMBOL, '5m') == 10 * INTERVAL_MS
+    assert store.last_timestamp(SYMBOL, '5m') == 17 * INTERVAL_MS
+
+
+def test_interrupted_write_is_truncated(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append(SYMBOL, '5m', klines(0, 10))
+    path = store._dir(SYMBOL, '5m')
+    # 写入中断：部分列多出了数据，时间戳列还没写
+    for name, extra in (('open', 3), ('close', 2)):
+        with open(os.path.join(path, name), 'ab') as f:
+            f.write(np.full(extra, -1.0).tobytes())
+    assert store.load(SYMBOL, '5m') == klines(0, 10)
+    assert store.append(SYMBOL, '5m', klines(10, 5)) == 5
+    assert store.load(SYMBOL, '5m') == klines(0, 15)
+    sizes = {os.path.getsize(os.path.join(path, name)) for name in ('timestamp', 'open', 'close', 'volume')}
+    assert sizes == {15 * 8}
+
+
+def test_prepend_adds_older_bars(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append(SYMBOL, '5m', klines(100, 10))
+    mapped = store.load(SYMBOL, '5m')
+    assert store.prepend(SYMBOL, '5m', klines(90, 15)) == 10  # 与已保存部分重叠的不写入
+    assert store.load(SYMBOL, '5m') == klines(90, 20)
+    assert mapped == klines(100, 10)
+    assert store.append(SYMBOL, '5m', klines(110, 1)) == 1
+    assert timestamps(store) == list(range(90, 111))
+
+
+def _append_concurrently(root, start):
+    store = BarStore(root)
+    for i in range(0, 60, 3):
+        store.append(SYMBOL, '5m', klines(start + i, 6))
+        if i % 15 == 0:
+            store.prepend(SYMBOL, '5m', klines(start + i - 20, 10))
+
+
+def test_concurrent_writers_are_serialized(tmp_path):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_append_concurrently, args=(str(tmp_path), start))
+                 for start in (100, 102, 104, 106)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+    result = timestamps(BarStore(str(tmp_path)))
+    # 加锁后每次写入都基于最新的首尾时间戳：结果严格递增，各列长度一致，数据与时间戳对应
+    assert result == sorted(set(result))
+    assert BarStore(str(tmp_path)).load(SYMBOL, '5m') == [kline(ts * INTERVAL_MS) for ts in result]
+
+
+def test_fetch_with_store_fetches_tail_then_older_history(tmp_path):
+    store = BarStore(str(tmp_path))
+    exchange = FakeExchange(1000)
+    store.append(SYMBOL, '5m', klines(900, 50))  # 本地只有 900..949
+    bars = fetch_with_store(exchange, store, SYMBOL, '5m', 500)
+    assert [k[0] // INTERVAL_MS for k in bars] == list(range(500, 1000))
+    # 尾部从 950 开始，较早部分从 500 开始，不重复获取已保存的K线
+    assert exchange.requests[0] == 950 * INTERVAL_MS
+    assert 500 * INTERVAL_MS in exchange.requests
+    assert timestamps(store) == list(range(500, 999))  # 未收盘的第 999 根不保存
+
+    # 本地已足够时不再往前获取
+    exchange.requests.clear()
+    assert len(fetch_with_store(exchange, store, SYMBOL, '5m', 400)) == 400
+    assert exchange.requests == [999 * INTERVAL_MS]
+
+
+def test_fetch_history_pages_back_from_earliest_stored_bar(tmp_path):
+    store = BarStore(str(tmp_path))
+    exchange = AsyncExchange(2000)
+    store.append(SYMBOL, '5m', klines(1900, 99))
+    loader = KlineLoader(exchange, Limiter(), None, '5m', store=store)
+    bars = asyncio.run(loader.fetch_history(SYMBOL, 1500))
+    assert [k[0] // INTERVAL_MS for k in bars] == list(range(500, 2000))
+    assert timestamps(store) == list(range(500, 1999))
+
+
+@pytest.mark.parametrize('listed_at', [0, 700])
+def test_older_history_stops_at_listing(tmp_path, listed_at):
+    store = BarStore(str(tmp_path))
+    exchange = FakeExchange(1000)
+    exchange.history = exchange.history[listed_at:]
+    store.append(SYMBOL, '5m', klines(900, 50))
+    bars = fetch_with_store(exchange, store, SYMBOL, '5m', 500)
+    assert bars[0][0] // INTERVAL_MS == max(500, listed_at)
+    assert [k[0] for k in bars] == sorted({k[0] for k in bars})
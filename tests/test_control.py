@@ -0,0 +1,12 @@
+from control import ControlChannel
+
+
+def test_default_state_file_is_per_strategy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    ma25 = ControlChannel('ma60', directory=str(tmp_path))
+    ma60 = ControlChannel('ma60_new', directory=str(tmp_path))
+    assert ma25.state_file != ma60.state_file
+    ma25.handle('stop')
+    # 停止一个策略不影响另一个策略重启后的状态
+    assert not ControlChannel('ma60', directory=str(tmp_path)).is_running()
+    assert ControlChannel('ma60_new', directory=str(tmp_path)).is_running()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from backtest import ema
+from ema_store import EMA_LENGTHS, EmaStore
+
+INTERVAL_MS = 300000
+
+
+def history(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    return [[i * INTERVAL_MS, c * 0.999, c * 1.001, c * 0.998, c, 10.0] for i, c in enumerate(close)]
+
+
+def recompute(klines, keep):
+    """全量重算：最后 keep 根K线的各EMA列（NaN 与 EmaStore 一样置 0）"""
+    close = np.array([k[4] for k in klines])
+    columns = [np.nan_to_num(ema(close, length))[-keep:] for length in EMA_LENGTHS]
+    return np.column_stack(columns)
+
+
+def ema_columns(df):
+    return df[[f'EMA{length}' for length in EMA_LENGTHS]].to_numpy()
+
+
+def test_delta_folding_matches_full_recompute():
+    klines = history(900)
+    store = EmaStore(keep=200, interval_ms=INTERVAL_MS)
+    df = store.warm_up('BTC', klines[:400])
+    np.testing.assert_allclose(ema_columns(df), recompute(klines[:400], 200), rtol=1e-10)
+    assert store.last_closed('BTC') == klines[398][0]
+
+    end = 400
+    rng = np.random.default_rng(1)
+    while end < len(klines):
+        # 每批含 0~3 根新收盘K线和一根未收盘K线，批次与已有数据重叠一根
+        end = min(end + int(rng.integers(0, 4)), len(klines))
+        batch = klines[end - 5:end]
+        if rng.random() < 0.3:
+            # 未收盘K线的盘中价修正不能被折叠进状态
+            forming = list(batch[-1])
+            forming[4] *= 1.01
+            store.update('BTC', batch[:-1] + [forming])
+        df = store.update('BTC', batch)
+        assert df is not None and len(df) == 200
+        np.testing.assert_allclose(ema_columns(df), recompute(klines[:end], 200), rtol=1e-10)
+        end += 1
+
+    array = store.update('BTC', klines[-3:], frame=False)
+    assert array.shape == (200, len(store.columns))
+    np.testing.assert_allclose(array[:, 6:], recompute(klines, 200), rtol=1e-10)
+    assert array[-1, 0] == klines[-1][0]
+
+
+def test_short_history_pads_with_zero():
+    klines = history(100)
+    store = EmaStore(keep=200, interval_ms=INTERVAL_MS)
+    df = store.warm_up('NEW', klines)
+    assert len(df) == 100
+    assert (df['EMA150'] == 0).all()
+    np.testing.assert_allclose(ema_columns(df), recompute(klines, 100), rtol=1e-10)
+
+
+@pytest.mark.parametrize('batch', [
+    lambda k: [k[401], k[402]],  # 缺少第 400 根
+    lambda k: [k[401], k[400]],  # 乱序
+    lambda k: [k[397], k[398]],  # 没有新K线
+    lambda k: [],
+])
+def test_gap_or_out_of_order_resets_and_rewarms(batch):
+    klines = history(600)
+    store = EmaStore(keep=200, interval_ms=INTERVAL_MS)
+    store.warm_up('BTC', klines[:400])
+    assert store.update('BTC', batch(klines)) is None
+    assert not store.is_warm('BTC')
+
+    # 重新预热后继续增量更新，结果与全量重算一致
+    store.warm_up('BTC', klines[:500])
+    df = store.update('BTC', klines[498:520])
+    np.testing.assert_allclose(ema_columns(df), recompute(klines[:520], 200), rtol=1e-10)
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import RollingExtremum, StopLossLevels, StreamingSMA
+
+
+def random_closes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+
+
+def replay(window, closes, revisions=3, seed=1):
+    """模拟 update_klines：每根K线先追加，再用几次盘中价修正，最后修正为收盘价
+
+    返回每根K线收盘后的均线值。
+    """
+    rng = np.random.default_rng(seed)
+    sma = StreamingSMA(window)
+    values = []
+    for close in closes:
+        sma.append(close * (1 + rng.normal(0, 0.001)))
+        for _ in range(revisions):
+            sma.revise(close * (1 + rng.normal(0, 0.001)))
+        values.append(sma.revise(close))
+    return np.array(values)
+
+
+@pytest.mark.parametrize('window', [25, 60])
+def test_append_and_revise_match_rolling_mean(window):
+    closes = random_closes(2000)
+    expected = pd.Series(closes).rolling(window).mean().to_numpy()
+    # 2000 根K线、每根 5 次更新，期间多次触发 fsum 重算
+    np.testing.assert_allclose(replay(window, closes), expected, rtol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize('window', [25, 60])
+def test_seed_then_stream_matches_rolling_mean(window):
+    closes = random_closes(600, seed=2)
+    sma = StreamingSMA(window)
+    sma.seed(closes[:200])
+    values = [sma.append(close) for close in closes[200:]]
+    expected = pd.Series(closes).rolling(window).mean().to_numpy()[200:]
+    np.testing.assert_allclose(values, expected, rtol=1e-12)
+
+
+def test_value_after_resync_is_exact():
+    window = 25
+    closes = random_closes(window * 4, seed=3)
+    sma = StreamingSMA(window)
+    for close in closes:
+        sma.append(close)
+        sma.revise(close + 1e6)  # 大幅修正累积浮点误差
+        sma.revise(close)
+    assert sma._updates == 0  # 300 次更新，最后一次刚好触发 fsum 重算
+    assert sma.value == pytest.approx(np.mean(closes[-window:]), rel=1e-13)
+
+
+def test_nan_until_window_is_full():
+    sma = StreamingSMA(25)
+    values = [sma.append(close) for close in random_closes(25)]
+    assert all(np.isnan(values[:24]))
+    assert not np.isnan(values[24])
+
+
+def test_matches_pandas_ta_sma():
+    ta = pytest.importorskip('pandas_ta')
+    closes = random_closes(1000, seed=4)
+    for window in (25, 60):
+        expected = ta.sma(pd.Series(closes), length=window).to_numpy()
+        np.testing.assert_allclose(replay(window, closes), expected, rtol=1e-12, equal_nan=True)
+
+
+def random_bars(n, seed=5):
+    closes = random_closes(n, seed)
+    rng = np.random.default_rng(seed)
+    spread = np.abs(rng.normal(0, 0.002, n)) * closes
+    return closes - spread, closes + spread
+
+
+@pytest.mark.parametrize('window', [3, 48, 144])
+@pytest.mark.parametrize('mode', ['min', 'max'])
+def test_rolling_extremum_with_revisions_matches_pandas(window, mode):
+    values = random_closes(1500, seed=6)
+    rng = np.random.default_rng(7)
+    extremum = RollingExtremum(window, mode)
+    rolling = getattr(pd.Series(values).rolling(window), mode)().to_numpy()
+    closed = []
+    for i, value in enumerate(values):
+        # 盘中先出现极端值再回落，被挤出队列的旧K线必须恢复
+        extremum.append(value * (1 + rng.normal(0, 0.01)))
+        extremum.revise(value * 0.5 if mode == 'min' else value * 2)
+        forming = value * (1 + rng.normal(0, 0.01))
+        history = closed[-(window - 1):] + [forming]
+        expected = (min if mode == 'min' else max)(history) if i + 1 >= window else np.nan
+        np.testing.assert_equal(extremum.revise(forming), expected)
+        np.testing.assert_equal(extremum.revise(value), rolling[i])
+        closed.append(value)
+
+
+def test_rolling_extremum_seed_matches_streaming():
+    values = random_closes(400, seed=8)
+    seeded = RollingExtremum(96, 'max')
+    seeded.seed(values[:300])
+    streamed = RollingExtremum(96, 'max')
+    for value in values[:300]:
+        streamed.append(value)
+    for value in values[300:]:
+        assert seeded.append(value) == streamed.append(value)
+    assert seeded.value == values[-96:].max()
+
+
+def test_stop_loss_levels_match_rolling_low_high():
+    lows, highs = random_bars(800)
+    windows = (48, 96, 144, 288)
+    levels = StopLossLevels(windows)
+    levels.seed(lows[:400], highs[:400])
+    rng = np.random.default_rng(9)
+    for i in range(400, len(lows)):
+        levels.append(highs[i], lows[i])  # 新K线开盘时最高最低价未定
+        levels.revise(lows[i] * (1 - abs(rng.normal(0, 0.01))), highs[i])
+        levels.revise(lows[i], highs[i])
+        for window in windows:
+            assert levels.price(window, 'long') == lows[i - window + 1:i + 1].min()
+            assert levels.price(window, 'short') == highs[i - window + 1:i + 1].max()
+    expected_low = pd.Series(lows).rolling(144).min().iloc[-1]
+    expected_high = pd.Series(highs).rolling(144).max().iloc[-1]
+    assert (levels.price(), levels.price(144, 'short')) == (expected_low, expected_high)
+
+
+def test_stop_loss_levels_nan_before_window():
+    lows, highs = random_bars(100)
+    levels = StopLossLevels((48, 144))
+    levels.seed(lows, highs)
+    assert levels.price(48, 'long') == lows[-48:].min()
+    assert np.isnan(levels.price(144, 'short'))
@@ -0,0 +1,18 @@
+import io
+
+from loguru import logger
+
+from log_tailer import LogTailer, Subscription, strategy_format
+
+
+def test_strategy_format_is_matched_by_strategy_filter(tmp_path):
+    sink = io.StringIO()
+    handler = logger.add(sink, format=strategy_format('ma25'))
+    try:
+        logger.info("Current K-line")
+    finally:
+        logger.remove(handler)
+    # 脚本直接运行时模块名是 __main__，只能靠 [策略名] 过滤
+    record = LogTailer(str(tmp_path / 'strategy.log'), 'strategy')._record(sink.getvalue().splitlines()[0])
+    assert Subscription(strategy='ma25').accepts(record)
+    assert not Subscription(strategy='ma60').accepts(record)
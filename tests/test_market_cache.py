@@ -0,0 +1,153 @@
+import asyncio
+import json
+import time
+import types
+
+import pytest
+
+from market_cache import MarketCache
+from new_client import select_symbols
+from strategies import ScannerStrategy
+
+
+def market(base, active=True):
+    symbol = f'{base}/USDT:USDT'
+    return symbol, {'id': f'{base}-USDT-SWAP', 'symbol': symbol, 'type': 'swap', 'active': active,
+                    'contractSize': 0.01, 'precision': {'amount': 1}, 'limits': {}}
+
+
+class FakeExchange:
+    """只实现 MarketCache 用到的接口，记录 load_markets 次数"""
+
+    def __init__(self, bases):
+        self.listed = list(bases)
+        self.markets = {}
+        self.currencies = {'USDT': {'code': 'USDT'}}
+        self.loads = 0
+
+    async def load_markets(self, reload=False):
+        self.loads += 1
+        self.markets = dict(market(base) for base in self.listed)
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = markets
+        self.currencies = currencies
+
+    async def public_get_public_instruments(self, params):
+        return {'data': [{'instId': f'{base}-USDT-SWAP', 'state': 'live'} for base in self.listed]}
+
+
+class Limiter:
+    def __init__(self):
+        self.calls = []
+
+    async def call(self, category, func, *args, **kwargs):
+        self.calls.append(func.__name__)
+        return await func(*args, **kwargs)
+
+
+def new_cache(tmp_path, exchange, **kwargs):
+    return MarketCache(exchange, Limiter(), select_symbols, str(tmp_path / 'markets.json'), **kwargs)
+
+
+def test_load_uses_disk_cache_within_ttl(tmp_path):
+    exchange = FakeExchange(['BTC', 'ETH'])
+    assert asyncio.run(new_cache(tmp_path, exchange).load()) == ['BTC/USDT:USDT', 'ETH/USDT:USDT']
+    assert exchange.loads == 1
+
+    # 重启：缓存未过期，直接从磁盘读取并设置 markets
+    restarted = FakeExchange(['BTC', 'ETH', 'SOL'])
+    cache = new_cache(tmp_path, restarted)
+    assert asyncio.run(cache.load()) == ['BTC/USDT:USDT', 'ETH/USDT:USDT']
+    assert restarted.loads == 0
+    assert restarted.markets['ETH/USDT:USDT']['id'] == 'ETH-USDT-SWAP'
+    assert restarted.currencies == {'USDT': {'code': 'USDT'}}
+    assert cache.specs['BTC/USDT:USDT']['contractSize'] == 0.01
+
+
+def test_expired_or_unreadable_cache_is_refreshed(tmp_path):
+    exchange = FakeExchange(['BTC'])
+    asyncio.run(new_cache(tmp_path, exchange, ttl=3600).load())
+    path = tmp_path / 'markets.json'
+    data = json.loads(path.read_text())
+    data['saved_at'] = time.time() - 3601
+    path.write_text(json.dumps(data))
+
+    exchange.listed.append('SOL')
+    cache = new_cache(tmp_path, exchange, ttl=3600)
+    assert asyncio.run(cache.load()) == ['BTC/USDT:USDT', 'SOL/USDT:USDT']
+    assert exchange.loads == 2
+    assert json.loads(path.read_text())['symbols'] == cache.symbols
+
+    path.write_text('{"saved_at": ')  # 写了一半的文件
+    assert asyncio.run(new_cache(tmp_path, exchange).load()) == cache.symbols
+    assert exchange.loads == 3
+
+
+def test_refresh_forever_reloads_only_on_listing_change(tmp_path):
+    exchange = FakeExchange(['BTC', 'ETH'])
+    cache = new_cache(tmp_path, exchange, check_interval=0.01)
+
+    async def run():
+        await cache.load()
+        refresher = asyncio.create_task(cache.refresh_forever())
+        await asyncio.sleep(0.1)
+        assert exchange.loads == 1  # 合约列表没变，只查询了列表
+        exchange.listed = ['BTC', 'SOL']
+        for _ in range(100):
+            if exchange.loads == 2:
+                break
+            await asyncio.sleep(0.01)
+        refresher.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await refresher
+
+    asyncio.run(run())
+    assert exchange.loads == 2
+    assert cache.symbols == ['BTC/USDT:USDT', 'SOL/USDT:USDT']
+    assert 'public_get_public_instruments' in cache.limiter.calls
+
+
+class FakeFeed:
+    def __init__(self):
+        self.subscribed = []
+
+    def subscribe(self, symbol, **kwargs):
+        self.subscribed.append(symbol)
+
+    def unsubscribe(self, symbol):
+        self.subscribed.remove(symbol)
+
+    def series(self, symbol):
+        return types.SimpleNamespace(ready=False, frame=None)
+
+
+def test_listing_and_delisting_update_scanner_universe(tmp_path):
+    exchange = FakeExchange(['BTC', 'ETH', 'XRP'])
+    cache = new_cache(tmp_path, exchange)
+    asyncio.run(cache.load())
+    feed = FakeFeed()
+    host = types.SimpleNamespace(feed=feed, gateway=types.SimpleNamespace(account=None), market_cache=cache)
+    scanner = ScannerStrategy(host, {'leverage': 10, 'contract_amount': 1})
+    scanner.subscribe()
+    assert feed.subscribed == ['BTC/USDT:USDT', 'ETH/USDT:USDT', 'XRP/USDT:USDT']
+    scanner.positions['XRP/USDT:USDT'] = 'long'
+
+    # ETH 和 XRP 下架、SOL 上新；有持仓的 XRP 保留到平仓为止
+    exchange.listed = ['BTC', 'SOL']
+    asyncio.run(cache.refresh())
+    asyncio.run(scanner.on_tick())
+    assert scanner.symbols == ['BTC/USDT:USDT', 'XRP/USDT:USDT', 'SOL/USDT:USDT']
+    assert feed.subscribed == scanner.symbols
+    assert 'ETH/USDT:USDT' not in scanner.positions
+    assert scanner.positions['SOL/USDT:USDT'] is None
+
+    # 币种列表未变化时不重复处理；XRP 平仓后下一次更新移除
+    asyncio.run(scanner.on_tick())
+    assert feed.subscribed == scanner.symbols
+    scanner._clear('XRP/USDT:USDT')
+    asyncio.run(cache.refresh())
+    asyncio.run(scanner.on_tick())
+    assert scanner.symbols == ['BTC/USDT:USDT', 'SOL/USDT:USDT']
+    assert feed.subscribed == scanner.symbols
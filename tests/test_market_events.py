@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+import bench
+from bar_buffer import BarBuffer, OHLCV_FIELDS
+from control import ControlChannel
+from indicators import StreamingSMA, StopLossLevels
+import ma60
+import ma60_new
+from ws_feed import OkxMarketFeed
+
+
+class FakeFeed:
+    """按顺序一次性返回事件的 OkxMarketFeed 替身"""
+
+    def __init__(self, events):
+        self.events = list(events)
+
+    def drain(self, timeout):
+        events, self.events = self.events, []
+        return events
+
+
+def prepare(module, column):
+    """按 main 的方式准备缓冲区和增量指标"""
+    frame = bench.to_frame(bench.synthetic_ohlcv(300))
+    window = int(column[2:])
+    frame[column] = frame['close'].rolling(window).mean()
+    module.ma_engine = StreamingSMA(window=window)
+    module.ma_engine.seed(frame['close'])
+    if hasattr(module, 'stop_levels'):  # 只有 ma60 增量维护止损价
+        module.stop_levels = StopLossLevels(windows=(48, 96, 144, 288))
+        module.stop_levels.seed(frame['low'], frame['high'])
+    return BarBuffer.from_frame(frame, capacity=len(frame), fields=[*OHLCV_FIELDS, column])
+
+
+@pytest.mark.parametrize('module, column', [(ma60, 'MA25'), (ma60_new, 'MA60')])
+def test_ticker_after_confirmed_candle_is_ignored(module, column, monkeypatch):
+    monkeypatch.setattr(module, 'ma_engine', None)
+    if hasattr(module, 'stop_levels'):
+        monkeypatch.setattr(module, 'stop_levels', None)
+    bars = prepare(module, column)
+    last = bars.last_timestamp
+    kline = [last, 100.0, 101.0, 99.0, 100.5, 10.0]
+    monkeypatch.setattr(module, 'bar_confirmed', False)
+    monkeypatch.setattr(module, 'feed', FakeFeed([('candle', kline, True), ('ticker', 150.0)]))
+    module.apply_market_events(bars, 'BTC/USDT:USDT', '5m', timeout=0.1)
+    # 已收盘的K线保持交易所定稿的数据
+    assert bars['close'][-1] == 100.5
+    assert bars['high'][-1] == 101.0
+
+    # 下一根K线推送后，成交价重新写入最后一根K线
+    next_kline = [last + bench.INTERVAL_MS, 100.5, 100.5, 100.5, 100.5, 0.0]
+    module.feed = FakeFeed([('candle', next_kline, False)])
+    module.apply_market_events(bars, 'BTC/USDT:USDT', '5m', timeout=0.1)
+    module.feed = FakeFeed([('ticker', 102.0)])
+    module.apply_market_events(bars, 'BTC/USDT:USDT', '5m', timeout=0.1)
+    assert bars.last_timestamp == next_kline[0]
+    assert bars['close'][-1] == 102.0
+
+
+@pytest.mark.parametrize('module, column', [(ma60, 'MA25'), (ma60_new, 'MA60')])
+def test_control_command_interrupts_market_events(module, column, monkeypatch, tmp_path):
+    monkeypatch.setattr(module, 'ma_engine', None)
+    if hasattr(module, 'stop_levels'):
+        monkeypatch.setattr(module, 'stop_levels', None)
+    bars = prepare(module, column)
+    feed = OkxMarketFeed('BTC-USDT-SWAP')  # 不连接，只用事件队列
+    monkeypatch.setattr(module, 'feed', feed)
+    control = ControlChannel('events', str(tmp_path / 'events.state'), str(tmp_path)).on_command(feed.interrupt)
+    threading.Timer(0.2, control.handle, ('stop',)).start()
+    started = time.monotonic()
+    module.apply_market_events(bars, 'BTC/USDT:USDT', '5m', timeout=5)
+    assert time.monotonic() - started < 2
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+from loguru import logger
+
+import strategies
+
+
+class FakeFeed:
+    def subscribe(self, *args, **kwargs):
+        return None
+
+    async def price(self, symbol):
+        return 100.0
+
+
+class FakeControl:
+    def is_running(self):
+        return True
+
+
+class FakeHost:
+    feed = FakeFeed()
+    gateway = None
+    control = FakeControl()
+
+
+@pytest.fixture
+def alerts():
+    """CRITICAL 日志即飞书通知，与各脚本 setup 中的 sink 相同"""
+    sent = []
+    handler = logger.add(lambda msg: sent.append(msg.record['message']), level='CRITICAL')
+    yield sent
+    logger.remove(handler)
+
+
+@pytest.mark.parametrize('strategy_class', [strategies.Ma25Strategy, strategies.Ma60Strategy])
+def test_entry_alert_is_sent_once_with_conditions(strategy_class, alerts, monkeypatch):
+    strategy = strategy_class(FakeHost(), {'symbol': 'BTC/USDT', 'leverage': 10, 'contract_amount': 1})
+
+    async def enter(*args):
+        pass
+    monkeypatch.setattr(strategy, 'enter', enter)
+    kline = {'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5}
+    asyncio.run(strategy._open('long', kline, kline, '当前K线最低价: 0.5 >= MA: 0.4\n'))
+    assert len(alerts) == 1
+    assert alerts[0].startswith('### 开多单') and '当前K线最低价' in alerts[0]
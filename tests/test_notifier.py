@@ -0,0 +1,112 @@
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from notifier import FeishuNotifier
+
+
+@pytest.fixture
+def webhook():
+    """本地飞书 webhook 替身，收到的消息文本放入 server.texts；status 可改为返回错误"""
+    texts = queue.Queue()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            texts.put(payload['content']['text'])
+            self.send_response(server.status)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.texts = texts
+    server.status = 200
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def received(server):
+    texts = []
+    while True:
+        try:
+            texts.append(server.texts.get_nowait())
+        except queue.Empty:
+            return texts
+
+
+def test_single_message_is_sent_as_is(webhook):
+    notifier = FeishuNotifier(webhook.url, batch_window=0.05).start()
+    assert notifier.send('开多单')
+    assert webhook.texts.get(timeout=5) == '开多单'
+    notifier.close()
+
+
+def test_burst_is_batched_into_one_digest(webhook):
+    notifier = FeishuNotifier(webhook.url, batch_window=0.5).start()
+    for i in range(3):
+        notifier.send(f'消息{i}')
+    text = webhook.texts.get(timeout=5)
+    assert text.startswith('### 通知汇总（3条）')
+    assert all(f'消息{i}' in text for i in range(3))
+    notifier.close()
+    assert received(webhook) == []
+
+
+def test_max_batch_splits_digests(webhook):
+    notifier = FeishuNotifier(webhook.url, batch_window=1.0, max_batch=2).start()
+    for i in range(3):
+        notifier.send(f'消息{i}')
+    notifier.close()
+    texts = received(webhook)
+    assert texts[0].startswith('### 通知汇总（2条）')
+    assert texts[1:] == ['消息2']
+
+
+def test_duplicates_within_window_are_sent_once(webhook):
+    notifier = FeishuNotifier(webhook.url, batch_window=0.05, dedup_window=60).start()
+    notifier.send('止损触发')
+    assert webhook.texts.get(timeout=5) == '止损触发'
+    notifier.send('止损触发')
+    notifier.send('止盈触发')
+    assert webhook.texts.get(timeout=5) == '止盈触发'
+    notifier.close()
+    assert received(webhook) == []
+
+
+def test_duplicates_after_window_are_sent_again(webhook):
+    notifier = FeishuNotifier(webhook.url, batch_window=0.05, dedup_window=0.1).start()
+    notifier.send('止损触发')
+    assert webhook.texts.get(timeout=5) == '止损触发'
+    time.sleep(0.2)
+    notifier.send('止损触发')
+    assert webhook.texts.get(timeout=5) == '止损触发'
+    notifier.close()
+
+
+def test_http_error_does_not_stop_the_sender(webhook):
+    webhook.status = 500
+    notifier = FeishuNotifier(webhook.url, batch_window=0.05).start()
+    notifier.send('第一条')
+    assert webhook.texts.get(timeout=5) == '第一条'
+    webhook.status = 200
+    notifier.send('第二条')
+    assert webhook.texts.get(timeout=5) == '第二条'
+    notifier.close()
+
+
+def test_full_queue_drops_without_blocking(webhook):
+    notifier = FeishuNotifier(webhook.url, queue_size=2)  # 未启动，队列不会被取走
+    assert notifier.send('a') and notifier.send('b')
+    assert not notifier.send('c')
+    assert notifier.dropped == 1
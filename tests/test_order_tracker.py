@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+import ma60
+from account_cache import AccountCache
+from order_tracker import OrderTracker
+
+
+def order(ord_id, state, filled=0, fill_time=None):
+    return {'ordId': ord_id, 'instId': 'BTC-USDT-SWAP', 'state': state, 'accFillSz': str(filled),
+            'fillTime': str(fill_time) if fill_time else '', 'uTime': str(fill_time or 1000)}
+
+
+class FakeExchange:
+    """下单时先让服务端推送订单状态再返回；fetch_order 为 REST 兜底，记录调用"""
+
+    def __init__(self, server, tracker_received, pushes):
+        self.server = server
+        self.received = tracker_received
+        self.pushes = list(pushes)
+        self.fetched = []
+        self.canceled = []
+        self.market_orders = []
+        self.rest_order = None
+
+    def create_limit_buy_order(self, symbol, amount, price, params):
+        for item in self.pushes:
+            self.server.push('orders', [item])
+        # 等推送被处理后才返回下单结果，模拟推送先于 REST 响应到达
+        assert self.received.wait(5)
+        return {'id': '7'}
+
+    def create_market_buy_order(self, symbol, amount, params):
+        self.market_orders.append(amount)
+        return {'id': '8'}
+
+    def cancel_order(self, order_id, symbol):
+        self.canceled.append(order_id)
+
+    def fetch_order(self, order_id, symbol):
+        self.fetched.append(order_id)
+        return self.rest_order
+
+
+@pytest.fixture
+def account(okx_server):
+    account = AccountCache('key', 'secret', 'pass', fetch_snapshot=lambda: ([], []),
+                           private_url=okx_server.url, reconnect_delay=0.05).start()
+    okx_server.subscribed()
+    yield account
+    account.stop()
+
+
+def setup_ma60(monkeypatch, okx_server, account, pushes):
+    received = threading.Event()
+    exchange = FakeExchange(okx_server, received, pushes)
+    tracker = OrderTracker(account, exchange.fetch_order)
+    # 在 tracker 之后注册，事件置位时 tracker 已经收到推送
+    account.add_order_listener(lambda item: item['state'] in ('filled', 'partially_filled') and received.set())
+    monkeypatch.setattr(ma60, 'exchange', exchange)
+    monkeypatch.setattr(ma60, 'tracker', tracker)
+    return exchange, tracker
+
+
+def test_fill_pushed_before_create_order_returns(monkeypatch, okx_server, account):
+    tick_time = time.time()
+    fill_time = int(tick_time * 1000) + 35
+    exchange, tracker = setup_ma60(monkeypatch, okx_server, account, [order('7', 'filled', 1, fill_time)])
+    started = time.monotonic()
+    ma60.fill_limit_order('BTC/USDT:USDT', 'buy', 1, 100.0, tick_time=tick_time)
+    assert time.monotonic() - started < 1  # 不等满 2 秒
+    assert exchange.fetched == [] and exchange.canceled == [] and exchange.market_orders == []
+    assert list(tracker.latencies) == [pytest.approx(35, abs=1)]
+    assert '7' not in tracker._updates  # 处理完后不再跟踪
+
+
+def test_partial_fill_is_completed_with_market_order(monkeypatch, okx_server, account):
+    exchange, tracker = setup_ma60(monkeypatch, okx_server, account, [order('7', 'partially_filled', 0.4, 2000)])
+    # 撤单后的最终状态
+    exchange.cancel_order = lambda order_id, symbol: okx_server.push('orders', [order('7', 'canceled', 0.6, 2000)])
+    ma60.fill_limit_order('BTC/USDT:USDT', 'buy', 1, 100.0)
+    assert exchange.market_orders == [pytest.approx(0.4)]
+    assert exchange.fetched == []
+
+
+def test_rest_fallback_on_timeout(okx_server, account):
+    fetched = []
+
+    def fetch_order(order_id, symbol):
+        fetched.append((order_id, symbol))
+        return {'status': 'closed', 'filled': 2.0, 'info': {'fillTime': '5000'}}
+
+    tracker = OrderTracker(account, fetch_order)
+    started = time.monotonic()
+    status = tracker.wait('9', 'BTC/USDT:USDT', timeout=0.2, tick_time=4.9)
+    assert time.monotonic() - started >= 0.2
+    assert fetched == [('9', 'BTC/USDT:USDT')]
+    assert status == {'state': 'filled', 'filled': 2.0, 'fill_time': 5000}
+    assert list(tracker.latencies) == [pytest.approx(100)]
+
+
+@pytest.mark.parametrize('ccxt_order, state', [
+    ({'status': 'open', 'filled': 0, 'info': {}}, 'live'),
+    ({'status': 'open', 'filled': 0.5, 'info': {}}, 'partially_filled'),
+    ({'status': 'canceled', 'filled': 0.5, 'info': {}}, 'canceled'),
+])
+def test_rest_fallback_maps_ccxt_status(okx_server, account, ccxt_order, state):
+    tracker = OrderTracker(account, lambda order_id, symbol: ccxt_order)
+    status = tracker.wait('9', 'BTC/USDT:USDT', timeout=0.05)
+    assert status['state'] == state and status['fill_time'] is None
+
+
+def test_push_during_wait_returns_early(okx_server, account):
+    tracker = OrderTracker(account, lambda order_id, symbol: pytest.fail('REST fallback used'))
+    okx_server.push('orders', [order('11', 'live')])
+    threading.Timer(0.2, okx_server.push, ('orders', [order('11', 'filled', 1, 3000)])).start()
+    started = time.monotonic()
+    status = tracker.wait('11', 'BTC/USDT:USDT', timeout=5)
+    assert time.monotonic() - started < 2
+    assert status == {'state': 'filled', 'filled': 1.0, 'fill_time': 3000}
+
+
+def test_live_order_at_timeout_uses_pushed_state(okx_server, account):
+    tracker = OrderTracker(account, lambda order_id, symbol: pytest.fail('REST fallback used'))
+    okx_server.push('orders', [order('12', 'partially_filled', 0.3, 3000)])
+    deadline = time.monotonic() + 5
+    while '12' not in tracker._updates and time.monotonic() < deadline:
+        time.sleep(0.01)
+    status = tracker.wait('12', 'BTC/USDT:USDT', timeout=0.1)
+    assert status == {'state': 'partially_filled', 'filled': 0.3, 'fill_time': 3000}
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import new_client
+from panel import FIELDS, SymbolPanel
+from signals import evaluate_entry
+from test_signals import new_frame, original_frame, random_frame
+
+BARS = 200
+
+
+def rows(df):
+    """EmaStore 输出的数组：首列时间戳，其余按 FIELDS 排列"""
+    df = df.assign(volume=1.0)
+    return np.column_stack([np.arange(len(df)) * 300000.0, df[FIELDS].to_numpy(dtype=float)])
+
+
+def universe():
+    """不同K线数量（满窗口、回绕长度、新上线）和不同信号的币种"""
+    frames = {}
+    for n in (BARS, 250, 150, 106, 60, 53, 20, 2):
+        frames[f'R{n}'] = random_frame(n, n)
+        frames[f'O{n}'] = original_frame(n)
+        frames[f'N{n}'] = new_frame(n)
+        if n > 5:
+            frames[f'D{n}'] = new_frame(n, duplicate_at=5)
+    return frames
+
+
+@pytest.fixture
+def panel_and_frames():
+    frames = universe()
+    panel = SymbolPanel(list(frames), bars=BARS)
+    for symbol, df in frames.items():
+        panel.load(symbol, rows(df))
+    # 超过 bars 的历史只保留最近 bars 根
+    return panel, {symbol: df.tail(BARS).reset_index(drop=True) for symbol, df in frames.items()}
+
+
+def test_entries_match_evaluate_entry(panel_and_frames):
+    panel, frames = panel_and_frames
+    decisions = panel.evaluate_entries()
+    assert set(decisions) == set(frames)
+    for symbol, df in frames.items():
+        assert decisions[symbol] == evaluate_entry(df), symbol
+    # 满窗口的币种走批量路径，且各类信号都出现
+    fired = {symbol for symbol, (strategy, _) in decisions.items() if strategy}
+    assert {'O200', 'N200', 'O250', 'N250'} <= fired
+
+
+def test_take_profit_matches_per_symbol_check(panel_and_frames):
+    panel, frames = panel_and_frames
+    rng = np.random.default_rng(0)
+    entry_prices, strategy_types = {}, {}
+    for symbol, df in frames.items():
+        close, ema5 = df['close'].iloc[-1], df['EMA5'].iloc[-1]
+        strategy_types[symbol] = 'original' if rng.random() < 0.5 else 'new'
+        # 入场价落在止盈阈值两侧
+        entry_prices[symbol] = close / rng.choice([1.03, 1.05, 1.19, 1.21, 0.9])
+        if rng.random() < 0.2:
+            entry_prices[symbol] = None  # 无持仓
+    expected = sorted(symbol for symbol, price in entry_prices.items() if price
+                      and new_client.check_take_profit_condition(frames[symbol], price, strategy_types[symbol]))
+    assert expected
+    assert sorted(panel.take_profit_hits(entry_prices, strategy_types)) == expected
+
+
+def test_cleared_symbol_is_skipped(panel_and_frames):
+    panel, _ = panel_and_frames
+    panel.clear('O200')
+    assert 'O200' not in panel.evaluate_entries()
+    assert panel.take_profit_hits({'O200': 1.0}, {'O200': 'original'}) == []
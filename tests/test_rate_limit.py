@@ -0,0 +1,107 @@
+import asyncio
+import types
+
+import ccxt.async_support as ccxt
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """假时钟：asyncio.sleep 只推进时间并记录等待时长，时钟分辨率 1us"""
+    state = types.SimpleNamespace(now=0.0, sleeps=[])
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        state.sleeps.append(delay)
+        state.now += max(delay, 1e-6)
+        await real_sleep(0)
+
+    monkeypatch.setattr(rate_limit, 'time', types.SimpleNamespace(monotonic=lambda: state.now))
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    return state
+
+
+def test_bucket_refills_at_published_rate(clock):
+    bucket = TokenBucket(10, 2.0)  # 5 次/秒
+
+    def burst(count):
+        async def run():
+            for _ in range(count):
+                await bucket.acquire()
+        started = clock.now
+        asyncio.run(run())
+        return clock.now - started
+
+    assert burst(10) == 0  # 满桶可以直接突发
+    assert burst(20) == pytest.approx(20 / 5, abs=1e-4)
+    clock.now += 1.0
+    assert burst(5) == 0
+    clock.now += 100.0
+    assert burst(11) == pytest.approx(0.2, abs=1e-4)  # 令牌不超过容量
+
+
+def test_penalize_and_reward(clock):
+    bucket = TokenBucket(10, 2.0)
+    bucket.penalize()
+    assert bucket.tokens == 0 and bucket.rate == 2.5
+    for _ in range(5):
+        bucket.penalize()
+    assert bucket.rate == 5 / 8  # 最低为公布速率的 1/8
+    bucket.reward()
+    assert bucket.rate == pytest.approx(5 / 8 + 0.25)
+    for _ in range(100):
+        bucket.reward()
+    assert bucket.rate == 5.0
+
+    # 降速后按新速率补充令牌
+    bucket.penalize()
+    started = clock.now
+    asyncio.run(bucket.acquire())
+    assert clock.now - started == pytest.approx(1 / 2.5, abs=1e-4)
+
+
+class Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self, value):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return value
+
+
+def test_retries_rate_limit_errors_with_backoff(clock):
+    limiter = RateLimiter({'market': (10, 2.0)})
+    func = Flaky([ccxt.RateLimitExceeded('429'), ccxt.DDoSProtection('50011')])
+    assert asyncio.run(limiter.call('market', func, 'ok')) == 'ok'
+    assert func.calls == 3
+    assert limiter.rate_limited == 2
+    bucket = limiter.buckets['market']
+    # 第一次失败后速率 2.5，退避 1/2.5；第二次 1.25，退避 2/1.25；成功后恢复一步
+    assert clock.sleeps[0] == pytest.approx(1 / 2.5)
+    assert 2 / 1.25 in [pytest.approx(s) for s in clock.sleeps]
+    assert bucket.rate == pytest.approx(1.25 + 0.25)
+
+
+def test_gives_up_after_max_retries(clock):
+    limiter = RateLimiter({'trade': (60, 2.0)}, max_retries=2)
+    func = Flaky([ccxt.RateLimitExceeded('429')] * 5)
+    with pytest.raises(ccxt.RateLimitExceeded):
+        asyncio.run(limiter.call('trade', func, 'ok'))
+    assert func.calls == 3
+    assert limiter.rate_limited == 3
+
+
+def test_other_errors_are_not_retried(clock):
+    limiter = RateLimiter()
+    func = Flaky([ccxt.InsufficientFunds('51008')])
+    with pytest.raises(ccxt.InsufficientFunds):
+        asyncio.run(limiter.call('trade', func, 'ok'))
+    assert func.calls == 1
+    assert limiter.rate_limited == 0
+    assert limiter.buckets['trade'].rate == limiter.buckets['trade'].base_rate
@@ -0,0 +1,102 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+import shard
+
+ccxt = pytest.importorskip('ccxt.async_support')
+
+SETTINGS = {'interval': '5m', 'limit': 200, 'warmup_limit': 1000, 'delta_limit': 100}
+
+
+def swap_markets(symbols):
+    return {symbol: {'id': symbol.split('/')[0] + '-USDT-SWAP', 'symbol': symbol, 'base': symbol.split('/')[0],
+                     'quote': 'USDT', 'settle': 'USDT', 'type': 'swap', 'spot': False, 'swap': True,
+                     'contract': True} for symbol in symbols}
+
+
+class FakeLoader:
+    """代替 KlineLoader：像 ccxt 的请求一样先 load_markets，再返回固定的K线和EMA"""
+
+    def __init__(self, exchange, *args):
+        self.exchange = exchange
+
+    async def load(self, symbol, frame=True):
+        await self.exchange.load_markets()
+        self.exchange.market(symbol)  # 不在 markets 中时抛出 BadSymbol
+        close = np.linspace(100, 110, 200)
+        return np.column_stack([np.arange(200) * 300000.0, close, close + 1, close - 1, close, np.ones(200)]
+                               + [close] * 5)
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """分片进程 fork 时继承补丁：下载 markets 即失败"""
+    async def no_network(self, *args, **kwargs):
+        raise RuntimeError('markets downloaded in shard')
+    monkeypatch.setattr(ccxt.okx, 'fetch_markets', no_network)
+    monkeypatch.setattr(ccxt.okx, 'fetch_currencies', no_network)
+    monkeypatch.setattr(shard, 'KlineLoader', FakeLoader)
+
+
+def scan_all(pool, symbols):
+    """所有币种都按 100 入场持有，收盘价 110 触发原策略止盈；返回触发止盈的币种（即成功加载的币种）"""
+    entries = {symbol: 100.0 for symbol in symbols}
+    _, take_profit = asyncio.run(pool.scan(entries, {symbol: 'original' for symbol in symbols}))
+    return sorted(symbol for symbol, _ in take_profit)
+
+
+def test_shards_use_markets_from_settings(offline):
+    symbols = [f'S{i}/USDT:USDT' for i in range(6)]
+    pool = shard.ShardPool(symbols, 2, dict(SETTINGS, markets=swap_markets(symbols))).start()
+    try:
+        assert scan_all(pool, symbols) == sorted(symbols)
+    finally:
+        pool.stop()
+
+
+class CrashingLoader(FakeLoader):
+    """第一次加载 crash_symbol 时让分片进程直接退出，标记文件保证重启后不再退出"""
+
+    crash_symbol = None
+    marker = None
+
+    async def load(self, symbol, frame=True):
+        if symbol == self.crash_symbol and not self.marker.exists():
+            self.marker.touch()
+            os._exit(3)
+        return await super().load(symbol, frame)
+
+
+def test_scan_skips_and_restarts_dead_shard(offline, monkeypatch, tmp_path):
+    symbols = [f'S{i}/USDT:USDT' for i in range(6)]
+    pool = shard.ShardPool(symbols, 2, dict(SETTINGS, markets=swap_markets(symbols)), timeout=30)
+    monkeypatch.setattr(CrashingLoader, 'crash_symbol', pool.groups[0][0])
+    monkeypatch.setattr(CrashingLoader, 'marker', tmp_path / 'crashed')
+    monkeypatch.setattr(shard, 'KlineLoader', CrashingLoader)
+    pool.start()
+    try:
+        # 分片 0 退出：本轮只返回分片 1 的币种，不会一直阻塞
+        assert scan_all(pool, symbols) == sorted(pool.groups[1])
+        # 下一轮前重启，全部币种恢复
+        assert scan_all(pool, symbols) == sorted(symbols)
+        pool._processes[1].kill()
+        pool._processes[1].join()
+        assert scan_all(pool, symbols) == sorted(symbols)
+    finally:
+        pool.stop()
+
+
+def test_resize_sends_refreshed_markets(offline):
+    symbols = [f'S{i}/USDT:USDT' for i in range(6)]
+    pool = shard.ShardPool(symbols, 2, dict(SETTINGS, markets=swap_markets(symbols))).start()
+    try:
+        assert scan_all(pool, symbols) == sorted(symbols)
+        # 上新的币种不在分片启动时的 markets 中
+        listed = symbols[1:] + ['NEW/USDT:USDT']
+        pool.resize(listed, swap_markets(listed), None)
+        assert scan_all(pool, listed) == sorted(listed)
+    finally:
+        pool.stop()
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import new_client
+import signals
+
+EMAS = ['EMA5', 'EMA10', 'EMA24', 'EMA50', 'EMA150']
+
+
+def frame(open_, high, low, close, emas):
+    data = {'open': open_, 'high': high, 'low': low, 'close': close}
+    data.update(zip(EMAS, emas))
+    return pd.DataFrame({k: np.asarray(v, dtype=float) for k, v in data.items()})
+
+
+def random_frame(n, seed):
+    """小整数价格和均线：相等、新高和交叉都经常出现"""
+    rng = np.random.default_rng(seed)
+    close = rng.integers(95, 106, n).astype(float)
+    open_ = close + rng.integers(-3, 4, n)
+    high = np.maximum(open_, close) + rng.integers(0, 3, n)
+    low = np.minimum(open_, close) - rng.integers(0, 3, n)
+    emas = [rng.integers(95, 106, n) for _ in EMAS]
+    return frame(open_, high, low, close, emas)
+
+
+def original_frame(n, break_at=None):
+    """原策略触发：EMA150 一直在其他均线之上，倒数第二根K线从最小均线下方收到最大均线上方"""
+    ema150 = np.full(n, 200.0)
+    others = [np.full(n, 100.0 + k) for k in range(4)]
+    open_, close = np.full(n, 101.0), np.full(n, 102.0)
+    high, low = np.full(n, 150.0), np.full(n, 99.0)
+    open_[n - 2], close[n - 2] = 90.0, 110.0
+    if break_at is not None:
+        ema150[n - break_at] = 50.0  # 第 break_at 根（倒数）EMA150 跌到其他均线下方
+    return frame(open_, high, low, close, others + [ema150])
+
+
+def new_frame(n, duplicate_at=None, below_ema150=True):
+    """新策略触发：多头排列，倒数第二根K线开盘低于EMA5且收盘为53根新高，过去53根中唯一"""
+    close = np.linspace(100.0, 120.0, n)  # 每根都是新高
+    open_ = close + 50.0  # 开盘都高于 EMA5，不构成形态
+    ema5, ema10, ema24, ema50, ema150 = (np.full(n, v) for v in (150.0, 140.0, 130.0, 125.0, 90.0))
+    low = np.full(n, 95.0)
+    open_[n - 2] = 100.0
+    if duplicate_at is not None:
+        open_[n - duplicate_at] = 100.0  # 窗口内另一根K线也满足形态
+    if below_ema150:
+        low[max(0, n - 20)] = 80.0
+    high = np.maximum(open_, close) + 1.0
+    return frame(open_, high, low, close, [ema5, ema10, ema24, ema50, ema150])
+
+
+def assert_same_decision(df):
+    original = new_client.check_original_entry_conditions(df)
+    new = new_client.check_new_entry_conditions(df)
+    arrays = [df[c].to_numpy() for c in ('open', 'low', 'close', 'EMA5', 'EMA10', 'EMA24', 'EMA150')]
+    assert (signals.new_entry_miss(*arrays) is None) == new
+    strategy, misses = signals.evaluate_entry(df)
+    assert (misses['original'] is None) == original
+    assert strategy == ('original' if original else 'new' if new else None)
+    return strategy
+
+
+@pytest.mark.parametrize('n', [2, 3, 10, 52, 53, 54, 60, 104, 105, 106, 107, 200])
+@pytest.mark.parametrize('seed', range(5))
+def test_random_frames_match_row_loop(n, seed):
+    assert_same_decision(random_frame(n, seed))
+
+
+@pytest.mark.parametrize('n', [2, 3, 30, 52, 53, 54, 80, 200])
+@pytest.mark.parametrize('break_at', [None, 3, 20, 53])
+def test_original_signal_matches_row_loop(n, break_at):
+    if break_at is not None and break_at > n:
+        pytest.skip('frame shorter than break position')
+    strategy = assert_same_decision(original_frame(n, break_at))
+    if n >= 53 and break_at is None:
+        assert strategy == 'original'
+
+
+@pytest.mark.parametrize('n', [10, 40, 53, 54, 60, 104, 105, 106, 107, 120, 200])
+@pytest.mark.parametrize('duplicate_at, below', [(None, True), (None, False), (5, True), (54, True)])
+def test_new_signal_matches_row_loop(n, duplicate_at, below):
+    if duplicate_at is not None and duplicate_at > n:
+        pytest.skip('frame shorter than duplicate position')
+    strategy = assert_same_decision(new_frame(n, duplicate_at, below))
+    if n >= 107 and duplicate_at is None and below:
+        assert strategy == 'new'
@@ -0,0 +1,109 @@
+import asyncio
+from collections import Counter
+
+from control import ControlChannel
+from rate_limit import RateLimiter
+from strategy_host import MarketFeed, OrderGateway, Strategy, StrategyHost
+
+INTERVAL_MS = 300000
+SYMBOLS = ['BTC/USDT:USDT', 'ETH/USDT:USDT']
+
+
+class CountingExchange:
+    """按请求类型和币种计数的交易所替身；行情请求之间时间前进一根K线"""
+
+    def __init__(self):
+        self.now = 1000 * INTERVAL_MS + 1
+        self.calls = Counter()
+
+    def parse_timeframe(self, interval):
+        return INTERVAL_MS // 1000
+
+    def milliseconds(self):
+        return self.now
+
+    async def fetch_ohlcv(self, symbol, interval, since=None, limit=None):
+        self.calls['fetch_ohlcv', symbol] += 1
+        last = self.now // INTERVAL_MS
+        return [[i * INTERVAL_MS, 100.0 + i % 7, 101.0 + i % 7, 99.0 + i % 7, 100.5 + i % 7, 1.0]
+                for i in range(since // INTERVAL_MS, last + 1)][:limit]
+
+    async def fetch_ticker(self, symbol):
+        self.calls['fetch_ticker', symbol] += 1
+        return {'last': 101.0}
+
+    async def fetch_positions(self, symbols):
+        self.calls['fetch_positions', symbols[0]] += 1
+        return []
+
+
+class RecordingStrategy(Strategy):
+    """订阅全部币种，每轮读取K线、最新价和持仓"""
+
+    def __init__(self, host, name, **requirements):
+        super().__init__(host, {'leverage': 10, 'contract_amount': 1})
+        self.name = name
+        self.requirements = requirements
+        self.series = {}
+        self.seen = []  # 每轮看到的 (币种, 最后一根K线时间戳)
+
+    def subscribe(self):
+        self.series = {symbol: self.feed.subscribe(symbol, **self.requirements) for symbol in SYMBOLS}
+
+    async def on_tick(self):
+        for symbol, series in self.series.items():
+            assert series.ready
+            await self.feed.price(symbol)
+            await self.gateway.positions(symbol)
+            self.seen.append((symbol, series.bars.last_timestamp))
+
+
+class Clock(Strategy):
+    """每轮结束后交易所时间前进一根K线，达到指定轮数后阻塞主循环"""
+
+    name = 'clock'
+
+    def __init__(self, host, ticks):
+        super().__init__(host, {'leverage': 10, 'contract_amount': 1})
+        self.ticks = ticks
+        self.count = 0
+        self.done = asyncio.Event()
+
+    async def on_tick(self):
+        self.count += 1
+        if self.count == self.ticks:
+            self.done.set()
+            await asyncio.Event().wait()
+        self.host.exchange.now += INTERVAL_MS
+
+
+def test_strategies_share_one_fetch_per_tick(tmp_path):
+    exchange = CountingExchange()
+    limiter = RateLimiter()
+    feed = MarketFeed(exchange, limiter)
+    gateway = OrderGateway(exchange, limiter)
+    control = ControlChannel('host', str(tmp_path / 'host.state'), str(tmp_path))
+    host = StrategyHost(exchange, limiter, feed, gateway, None, control, tick_interval=0)
+    strategies = [host.add(RecordingStrategy(host, 'a', bars=200, sma=(25,))),
+                  host.add(RecordingStrategy(host, 'b', bars=100, sma=(60,), stops=(48,))),
+                  host.add(RecordingStrategy(host, 'c', bars=150))]
+    clock = host.add(Clock(host, ticks=4))
+
+    async def run():
+        task = asyncio.create_task(host.run())
+        await asyncio.wait_for(clock.done.wait(), 10)
+        await asyncio.sleep(0.1)  # 主循环停在 clock，其他策略完成最后一轮
+        task.cancel()
+
+    asyncio.run(run())
+    for symbol in SYMBOLS:
+        # 首轮按三个策略要求的并集（200 根）只预热一次，之后每轮一次增量请求
+        assert exchange.calls['fetch_ohlcv', symbol] == 4
+        # 三个策略每轮各读一次最新价和持仓，交易所每轮每个币种只收到一个请求
+        assert exchange.calls['fetch_ticker', symbol] == 4
+        assert exchange.calls['fetch_positions', symbol] == 4
+    assert strategies[0].seen == strategies[1].seen == strategies[2].seen
+    assert len(strategies[0].seen) == 4 * len(SYMBOLS)
+    assert len(set(strategies[0].seen)) == len(strategies[0].seen)  # 每轮都看到新K线
+    series = feed.series(SYMBOLS[0])
+    assert len(series.bars) == 200 and series.bars.fields[-2:] == ['MA25', 'MA60']
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from ws_feed import OkxMarketFeed, candle_channel
+
+
+def next_events(feed, count, timeout=5):
+    """最多等待 timeout 秒，收集至少 count 条事件"""
+    events = []
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        events.extend(feed.drain(deadline - time.monotonic()))
+    return events
+
+
+@pytest.fixture
+def feed(okx_server):
+    feed = OkxMarketFeed('BTC-USDT-SWAP', '5m', public_url=okx_server.url, business_url=okx_server.url,
+                         reconnect_delay=0.05, ping_interval=0.3).start()
+    # K线和行情两条连接都完成订阅
+    assert sorted(okx_server.subscribed() + okx_server.subscribed()) == ['candle5m', 'tickers']
+    yield feed
+    feed.stop()
+
+
+def test_candle_channel():
+    assert candle_channel('5m') == 'candle5m'
+    assert candle_channel('1h') == 'candle1H'
+
+
+def test_pushes_become_events(okx_server, feed):
+    okx_server.push('candle5m', [['1700000000000', '1', '2', '0.5', '1.5', '10', '0', '0', '0']])
+    okx_server.push('tickers', [{'instId': 'BTC-USDT-SWAP', 'last': '1.6'}])
+    okx_server.push('candle5m', [['1700000000000', '1', '2', '0.5', '1.7', '12', '0', '0', '1']])
+    events = next_events(feed, 3)
+    assert ('candle', [1700000000000, 1.0, 2.0, 0.5, 1.5, 10.0], False) in events
+    assert ('candle', [1700000000000, 1.0, 2.0, 0.5, 1.7, 12.0], True) in events
+    assert ('ticker', 1.6) in events
+    assert feed.fresh_price() == 1.6
+
+
+def test_reconnect_resubscribes_and_reports_gap(okx_server, feed):
+    okx_server.push('candle5m', [['1700000000000', '1', '2', '0.5', '1.5', '10', '0', '0', '0']])
+    assert next_events(feed, 1)[0][0] == 'candle'
+    okx_server.drop()
+    # 两条连接都重新订阅，K线连接恢复后推送缺口起点
+    assert sorted(okx_server.subscribed() + okx_server.subscribed()) == ['candle5m', 'tickers']
+    assert okx_server.connections == 4
+    assert ('gap', 1700000000000) in next_events(feed, 1)
+    # 重连后的推送照常转换为事件
+    okx_server.push('tickers', [{'instId': 'BTC-USDT-SWAP', 'last': '2.5'}])
+    assert ('ticker', 2.5) in next_events(feed, 1)
+
+
+def test_idle_connection_sends_ping(okx_server, feed):
+    while okx_server.messages.get(timeout=5) != 'ping':
+        pass
+    # 服务端的 pong 不会变成事件
+    assert feed.drain(0.1) == []
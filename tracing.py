@@ -0,0 +1,122 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+MAX_SPANS = 2000  # 每轮最多记录的 span 数，避免全币种扫描时无限增长
+MAX_PROFILE_SECONDS = 300
+
+_current = contextvars.ContextVar('trace', default=None)
+_profiling = threading.Lock()
+
+
+class Trace:
+    """一轮检测的耗时记录，span 为 (名称, 相对本轮开始的秒数, 耗时, 附加属性)"""
+
+    __slots__ = ('wall', 'started', 'duration', 'spans', 'truncated')
+
+    def __init__(self):
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.truncated = 0
+
+    def add(self, name, start, end, attrs=None):
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append((name, start - self.started, end - start, attrs))
+        else:
+            self.truncated += 1
+
+    def to_dict(self):
+        return {
+            'time': self.wall,
+            'duration': self.duration,
+            'spans': [{'name': name, 'offset': offset, 'duration': duration, **(attrs or {})}
+                      for name, offset, duration, attrs in self.spans],
+            'truncated': self.truncated,
+        }
+
+
+class Tracer:
+    """保存最近 size 轮的 Trace（环形缓冲）"""
+
+    def __init__(self, size=200):
+        self.traces = deque(maxlen=size)
+
+    def begin(self):
+        """开始新的一轮，之后同一上下文（含 gather 出的任务）中的 span 都记入这一轮"""
+        trace = Trace()
+        _current.set(trace)
+        return trace
+
+    def finish(self):
+        trace = _current.get()
+        if trace is None:
+            return None
+        trace.duration = time.perf_counter() - trace.started
+        self.traces.append(trace)
+        _current.set(None)
+        return trace
+
+    def recent(self, limit=50, min_duration=0.0):
+        """最近的 Trace（新的在前），只返回耗时不少于 min_duration 秒的"""
+        traces = [trace for trace in reversed(self.traces) if trace.duration >= min_duration]
+        return [trace.to_dict() for trace in traces[:limit]]
+
+
+tracer = Tracer()
+
+
+def record(name, start, end, **attrs):
+    """把一段已计时的操作记入当前这一轮（没有进行中的 Trace 时忽略）"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, start, end, attrs or None)
+
+
+@contextmanager
+def span(name, **attrs):
+    """记录 with 块的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter(), **attrs)
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def profile(seconds, interval=0.01, root=None):
+    """在当前线程中采样本进程所有其他线程的调用栈 seconds 秒
+
+    返回折叠栈文本（每行 "根;线程;外层函数;...;内层函数 次数"），可直接交给 flamegraph.pl 或 speedscope。
+    采样只读取 sys._current_frames，不注入被采样线程，开销与采样频率成正比。
+    """
+    seconds = min(float(seconds), MAX_PROFILE_SECONDS)
+    if not _profiling.acquire(blocking=False):
+        raise RuntimeError('profiler already running')
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                prefix = [root] if root else []
+                stacks[';'.join(prefix + [names.get(ident, str(ident))] + stack[::-1])] += 1
+            time.sleep(interval)
+    finally:
+        _profiling.release()
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
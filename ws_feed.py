@@ -0,0 +1,150 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+import websockets
+from loguru import logger
+
+OKX_PUBLIC_URL = 'wss://ws.okx.com:8443/ws/v5/public'
+OKX_BUSINESS_URL = 'wss://ws.okx.com:8443/ws/v5/business'
+
+
+def candle_channel(interval):
+    """ccxt 时间周期转换为 OKX K线频道名，例如 5m -> candle5m，1h -> candle1H"""
+    return 'candle' + (interval if interval.endswith('m') else interval.upper())
+
+
+class OkxMarketFeed:
+    """OKX K线和行情 WebSocket 推送
+
+    在后台线程中运行，推送转换为事件放入 events 队列：
+    ('candle', [ts, o, h, l, c, vol], 是否已收盘)、('ticker', 最新价)、('gap', 最后K线时间戳)，
+    以及 interrupt 放入的 ('wakeup',)。
+    断线后指数退避重连，K线连接恢复时推送 'gap' 事件，由策略主线程用 REST 补齐缺口。
+    """
+
+    def __init__(self, inst_id, interval='5m', public_url=OKX_PUBLIC_URL, business_url=OKX_BUSINESS_URL,
+                 reconnect_delay=1, max_reconnect_delay=30, ping_interval=25):
+        self.inst_id = inst_id
+        self.interval = interval
+        self.public_url = public_url
+        self.business_url = business_url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ping_interval = ping_interval
+        self.events = queue.Queue()
+        self.last_price = None
+        self.last_price_time = 0.0
+        self._last_candle_ts = None
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        """启动后台线程"""
+        self._thread = threading.Thread(target=self._run_thread, name=f'okx-feed-{self.inst_id}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止推送"""
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def interrupt(self):
+        """让阻塞在 drain 上的主线程立即返回（推送 ('wakeup',) 事件）"""
+        self.events.put(('wakeup',))
+
+    def drain(self, timeout=5):
+        """等待第一条事件（最多 timeout 秒），然后取出队列中全部事件"""
+        try:
+            events = [self.events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def fresh_price(self, max_age=5):
+        """最近 max_age 秒内推送的最新价，没有则返回 None"""
+        if self.last_price is not None and time.time() - self.last_price_time <= max_age:
+            return self.last_price
+        return None
+
+    def _run_thread(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self.run())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # gather 在第一个子任务取消时就返回，等其余任务（如正在关闭的连接）结束后再关闭事件循环
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    async def run(self):
+        """同时维护K线和行情两条连接"""
+        await asyncio.gather(
+            self._stream(self.business_url, {'channel': candle_channel(self.interval), 'instId': self.inst_id},
+                         self._on_candle, backfill=True),
+            self._stream(self.public_url, {'channel': 'tickers', 'instId': self.inst_id}, self._on_ticker),
+        )
+
+    async def _stream(self, url, arg, handler, backfill=False):
+        delay = self.reconnect_delay
+        connected_before = False
+        while True:
+            try:
+                async with websockets.connect(url, ping_interval=None) as ws:
+                    await ws.send(json.dumps({'op': 'subscribe', 'args': [arg]}))
+                    logger.info(f"Subscribed to {arg['channel']} for {self.inst_id}")
+                    if backfill and connected_before:
+                        # 重连后补齐断线期间的K线
+                        self.events.put(('gap', self._last_candle_ts))
+                    connected_before = True
+                    delay = self.reconnect_delay
+                    await self._receive(ws, handler)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket {url} disconnected: {e}, reconnecting in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _receive(self, ws, handler):
+        while True:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=self.ping_interval)
+            except asyncio.TimeoutError:
+                # OKX 要求 30 秒内无消息时发送 ping 保活
+                await ws.send('ping')
+                continue
+            if raw == 'pong':
+                continue
+            message = json.loads(raw)
+            if message.get('event') == 'error':
+                raise ConnectionError(f"Subscribe failed: {message.get('msg')}")
+            for item in message.get('data', []):
+                handler(item)
+
+    def _on_candle(self, item):
+        timestamp = int(item[0])
+        kline = [timestamp] + [float(value) for value in item[1:6]]
+        self._last_candle_ts = timestamp
+        self.events.put(('candle', kline, item[-1] == '1'))
+
+    def _on_ticker(self, item):
+        self.last_price = float(item['last'])
+        self.last_price_time = time.time()
+        self.events.put(('ticker', self.last_price))